@@ -8,12 +8,18 @@ class PklFileConventions:
     expected_return_pkl_filename: str = "expected_return_{expected_return_type}.pkl"
     expected_return_for_all_type_pkl_filename: str = "expected_return_all_type.pkl"
     optimization_for_all_type_pkl_filename: str = "optimization_all_type.pkl"
-    optimization_pkl_filename: str = "optimization_{optimization_type}_{expected_return_type}_{risk_return_type}.pkl"
+    result_store_filename: str = "optimization_results.sqlite"
     ending_pattern_for_risk_return_pkl_files: str = "covariance_{risk_return_type}.pkl"
     data_pkl_filename: str = "data.pkl"
     monte_carlo_pkl_filename: str = "monte_carlo_pkl_filename.pkl"
     short_listed_monte_carlo_pkl_filename: str = "short_listed_monte_pkl_filename.pkl"
     all_optimized_df_pkl_filename: str = "all_optimized_df.pkl"
+    cache_manifest_filename: str = "cache_manifest.json"
+    weight_bank_dirname: str = "weight_bank"
+    weight_bank_filename: str = "weight_bank_{fingerprint}.npy"
+    scenario_metrics_pkl_filename: str = "scenario_metrics.pkl"
+    efficient_frontiers_pkl_filename: str = "efficient_frontiers.pkl"
+    scenario_reduction_report_pkl_filename: str = "scenario_reduction_report.pkl"
 
 
 @dataclass
@@ -30,6 +36,39 @@ class HeaderConventions:
     optimizer_column: str = "Optimizer"
     cleaned_weights_column: str = "Cleaned Weights"
     ticker: str = "ticker"
+    samples_column: str = "Samples"
+    best_sharpe_ratio_column: str = "Best Sharpe Ratio"
+    min_annual_volatility_column: str = "Min Annual Volatility"
+    expected_terminal_wealth_column: str = "Expected Terminal Wealth"
+    median_terminal_wealth_column: str = "Median Terminal Wealth"
+    value_at_risk_column: str = "Value at Risk"
+    conditional_value_at_risk_column: str = "Conditional Value at Risk"
+    expected_max_drawdown_column: str = "Expected Max Drawdown"
+    tail_max_drawdown_column: str = "Tail Max Drawdown"
+    frontier_returns_column: str = "Frontier Returns"
+    frontier_volatilities_column: str = "Frontier Volatilities"
+    frontier_weights_column: str = "Frontier Weights"
+    iterations_column: str = "Iterations"
+    converged_column: str = "Converged"
+    max_weight_difference_column: str = "Max Weight Difference"
+    sharpe_ratio_difference_column: str = "Sharpe Ratio Difference"
+    cleaned_weights_match_column: str = "Cleaned Weights Match"
+    solver_column: str = "Solver"
+    solver_status_column: str = "Solver Status"
+    solver_iterations_column: str = "Solver Iterations"
+    compile_time_column: str = "Compile Time"
+    solve_time_column: str = "Solve Time"
+    turnover_column: str = "Turnover"
+    alias_of_column: str = "Alias Of"
+    risk_measure_column: str = "Risk Measure"
+    reduction_method_column: str = "Reduction Method"
+    scenarios_column: str = "Scenarios"
+    reduced_scenarios_column: str = "Reduced Scenarios"
+    full_solve_time_column: str = "Full Solve Time"
+    reduced_solve_time_column: str = "Reduced Solve Time"
+    full_objective_column: str = "Full Objective"
+    reduced_objective_column: str = "Reduced Objective"
+    objective_gap_column: str = "Objective Gap"
 
 
 @dataclass
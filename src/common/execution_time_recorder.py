@@ -1,3 +1,4 @@
+import threading
 import time
 import pandas as pd
 import logging
@@ -7,8 +8,11 @@ from tabulate import tabulate
 # Initialize the logger
 logger = logging.getLogger(__name__)
 
-# Initialize a global DataFrame to store results
-results_df = pd.DataFrame(columns=['Function', 'Module', 'Execution Time'])
+# Recorded execution times, one dictionary per call, the DataFrame is only built when asked for: concatenating a row
+# per call copies all the previous rows and decorated functions can be called thousands of times per run
+EXECUTION_TIME_COLUMNS = ['Function', 'Module', 'Execution Time']
+_results = []
+_results_lock = threading.Lock()
 
 
 class ExecutionTimeRecorder:
@@ -25,28 +29,20 @@ class ExecutionTimeRecorder:
             # Log the execution time
             logger.info(f"{self.module_name}: {func.__name__} took {exec_time:.4f} seconds")
 
-            # Append results to DataFrame using pd.concat()
-            global results_df
-
-            # Create a new DataFrame for the new row
-            new_row_df = pd.DataFrame([{
-                'Function': func.__name__,
-                'Module': self.module_name,
-                'Execution Time': exec_time
-            }])
-
-            # Filter out all-NA columns from new_row_df before concatenation
-            new_row_df_cleaned = new_row_df.dropna(axis=1, how='all')
-
-            # Concatenate the cleaned DataFrame
-            results_df = pd.concat([results_df, new_row_df_cleaned], ignore_index=True)
+            # Functions may be timed from several threads at once
+            with _results_lock:
+                _results.append({
+                    'Function': func.__name__,
+                    'Module': self.module_name,
+                    'Execution Time': exec_time
+                })
             return result
 
         return wrapper
 
     @staticmethod
     def print_results():
-        global results_df
+        results_df = ExecutionTimeRecorder.get_performance_dataframe()
         if not results_df.empty:
             print(tabulate(results_df, headers='keys', tablefmt='pretty'))
         else:
@@ -54,7 +50,15 @@ class ExecutionTimeRecorder:
 
     @staticmethod
     def get_performance_dataframe():
-        return results_df
+        with _results_lock:
+            return pd.DataFrame(_results, columns=EXECUTION_TIME_COLUMNS)
+
+    @staticmethod
+    def merge_results(other_results_df):
+        """Append execution times recorded elsewhere, e.g. in a worker process of a process pool."""
+        if other_results_df is not None and not other_results_df.empty:
+            with _results_lock:
+                _results.extend(other_results_df.to_dict('records'))
 #
 # # Example usage of the decorator
 # execution_logger = ExecutionTimeLogger(module_name='example_module')
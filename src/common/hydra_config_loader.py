@@ -1,5 +1,6 @@
 import logging
 import os
+import threading
 
 import hydra
 from hydra.core.global_hydra import GlobalHydra
@@ -9,6 +10,9 @@ from src.common.config_loader import BaseConfigLoader
 
 logger = logging.getLogger(__name__)
 
+# Hydra keeps a single global instance, stages running in parallel threads must not initialize it concurrently
+_hydra_lock = threading.Lock()
+
 
 class HydraConfigLoader(BaseConfigLoader):
     def __init__(self):
@@ -42,6 +46,7 @@ class HydraConfigLoader(BaseConfigLoader):
 def load_config(module_name):
     """Load the configuration for the returns module from its own config.yaml."""
     config_loader = HydraConfigLoader()
-    returns_cfg = config_loader.get_config(module_name)
+    with _hydra_lock:
+        returns_cfg = config_loader.get_config(module_name)
     logger.info(f"Loading configuration for the returns module_name={module_name} from config.yaml")
     return returns_cfg
@@ -0,0 +1,118 @@
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from src.common.utils import compute_fingerprint
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+class MarketDataContext:
+    """
+    Read-only, per-window view of the price data with lazily computed and memoized return statistics.
+
+    Every statistic is computed once, on first access, and shared by all the stages of the window
+    (expected returns, risk models, Monte Carlo, optimizers and performance metrics). The returned objects are
+    shared as well, so callers must copy them before modifying them.
+    """
+
+    def __init__(self, data: pd.DataFrame):
+        object.__setattr__(self, 'data', data)
+        object.__setattr__(self, '_cache', {})
+        # Stages of a window run in parallel threads, a statistic must only be computed once
+        object.__setattr__(self, '_lock', threading.RLock())
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"MarketDataContext is read-only, cannot set attribute=`{name}`")
+
+    def __reduce__(self):
+        # Only the data is sent to other processes, the statistics are recomputed there on first access
+        return MarketDataContext, (self.data,)
+
+    def _memoize(self, name, compute):
+        with self._lock:
+            if name not in self._cache:
+                self._cache[name] = compute()
+            return self._cache[name]
+
+    def memoize(self, name, compute):
+        """
+        Compute a window level object derived from the data once, e.g. the Riskfolio portfolio of the window, and
+        share it with every caller asking for the same name. The object is shared, callers must not modify it, and
+        the name must identify the inputs of compute by content (see `get_input_fingerprint`).
+        """
+        return self._memoize(name, compute)
+
+    @property
+    def fingerprint(self):
+        """Content fingerprint of the data, for the cache fingerprints of the window."""
+        return self._memoize('fingerprint', lambda: compute_fingerprint(self.data))
+
+    def get_input_fingerprint(self, component):
+        """
+        Content fingerprint of an input shared by several stages of the window, e.g. the expected returns or the
+        covariance given to every optimizer of a grid, hashed once per object. The memo only holds a weak reference
+        to the object and is dropped with it, so inputs are not kept alive and an id reused by a new object is hashed
+        again. Objects without weak references (e.g. dictionaries) are hashed on every call.
+        """
+        key = ('fingerprint', id(component))
+        try:
+            # Dropped when the object is deleted, before its id can be reused
+            reference = weakref.ref(component, lambda _: self._cache.pop(key, None))
+        except TypeError:
+            return compute_fingerprint(component)
+        with self._lock:
+            memo = self._cache.get(key)
+            if memo is None or memo[0]() is not component:
+                memo = self._cache[key] = (reference, compute_fingerprint(component))
+            return memo[1]
+
+    @property
+    def tickers(self):
+        return self.data.columns
+
+    @property
+    def simple_returns(self) -> pd.DataFrame:
+        """Daily simple returns, `data.pct_change().dropna()`."""
+        return self._memoize('simple_returns', lambda: self.data.pct_change().dropna())
+
+    @property
+    def log_returns(self) -> pd.DataFrame:
+        """
+        Daily log returns, `log(1 + data.pct_change())`.
+        Missing values are kept, the log statistics skip them ticker by ticker (pair by pair for the covariance).
+        """
+        return self._memoize('log_returns', lambda: np.log1p(self.data.pct_change()))
+
+    @property
+    def mean_returns(self) -> pd.Series:
+        """Mean of the daily simple returns of every ticker."""
+        return self._memoize('mean_returns', lambda: self.simple_returns.mean())
+
+    @property
+    def log_mean_returns(self) -> pd.Series:
+        """Mean of the daily log returns of every ticker."""
+        return self._memoize('log_mean_returns', lambda: self.log_returns.mean())
+
+    @property
+    def centered_returns(self) -> pd.DataFrame:
+        """Daily simple returns minus their mean."""
+        return self._memoize('centered_returns', lambda: self.simple_returns - self.mean_returns)
+
+    @property
+    def sample_covariance(self) -> pd.DataFrame:
+        """Daily sample covariance of the simple returns, same as `simple_returns.cov()`."""
+        return self._memoize('sample_covariance', lambda: self._covariance(self.centered_returns))
+
+    @property
+    def log_sample_covariance(self) -> pd.DataFrame:
+        """Daily sample covariance of the log returns, `log_returns.cov()`."""
+        return self._memoize('log_sample_covariance', lambda: self.log_returns.cov())
+
+    @staticmethod
+    def _covariance(centered_returns):
+        centered = centered_returns.to_numpy()
+        covariance = centered.T @ centered / (centered.shape[0] - 1)
+        return pd.DataFrame(covariance, index=centered_returns.columns, columns=centered_returns.columns)
@@ -0,0 +1,113 @@
+import logging
+import pickle
+import sqlite3
+import threading
+from pathlib import Path
+
+from src.common.conventions import PklFileConventions
+
+logger = logging.getLogger(__name__)
+
+# Result stores of the process, keyed by the path of their database
+_result_stores = {}
+_result_stores_lock = threading.Lock()
+
+
+class ResultStore:
+    """
+    SQLite store of the results of a window, one row per (expected return type, risk model, optimizer) key with the
+    input fingerprint and the pickled results, instead of one pickle file per key.
+
+    All the rows are read with a single query on the first lookup and kept in memory, the following lookups do not
+    touch the filesystem. New results are appended in batches, each batch in one transaction, so the store never holds
+    half of a batch.
+    """
+
+    def __init__(self, database_path):
+        self.database_path = Path(database_path)
+        self._rows = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.database_path, timeout=60)
+        connection.execute("CREATE TABLE IF NOT EXISTS results ("
+                           "expected_return_type TEXT NOT NULL, "
+                           "risk_model TEXT NOT NULL, "
+                           "optimizer TEXT NOT NULL, "
+                           "fingerprint TEXT NOT NULL, "
+                           "payload BLOB NOT NULL, "
+                           "PRIMARY KEY (expected_return_type, risk_model, optimizer))")
+        return connection
+
+    def _load_rows(self):
+        """{key: (fingerprint, pickled results)} of every row, read once."""
+        if self._rows is None:
+            self._rows = {}
+            if self.database_path.exists():
+                try:
+                    connection = self._connect()
+                    try:
+                        for expected_return_type, risk_model, optimizer, fingerprint, payload in connection.execute(
+                                "SELECT expected_return_type, risk_model, optimizer, fingerprint, payload "
+                                "FROM results"):
+                            self._rows[(expected_return_type, risk_model, optimizer)] = (fingerprint, payload)
+                    finally:
+                        connection.close()
+                except sqlite3.Error as e:
+                    logger.error(f"Error={e} while loading result store=`{self.database_path}`")
+        return self._rows
+
+    def get(self, key, fingerprint):
+        """
+        Results stored for the (expected return type, risk model, optimizer) key if they were computed from inputs
+        with the same fingerprint, otherwise None.
+        """
+        with self._lock:
+            fingerprint_and_payload = self._load_rows().get(key)
+        if fingerprint_and_payload is None:
+            return None
+        if fingerprint_and_payload[0] != fingerprint:
+            logger.info(f"Stored results of key={key} in `{self.database_path}` are stale, they will be recomputed")
+            return None
+        return pickle.loads(fingerprint_and_payload[1])
+
+    def load_all(self):
+        """
+        {key: (fingerprint, results)} of every row of the window with one read, for the callers looking up many keys,
+        e.g. a whole optimizer grid, which check the fingerprints in memory.
+        """
+        with self._lock:
+            rows = dict(self._load_rows())
+        return {key: (fingerprint, pickle.loads(payload)) for key, (fingerprint, payload) in rows.items()}
+
+    def put_many(self, entries):
+        """Append or replace the (key, fingerprint, results) entries in one transaction."""
+        rows = [(*key, fingerprint, pickle.dumps(results, protocol=pickle.HIGHEST_PROTOCOL))
+                for key, fingerprint, results in entries]
+        if not rows:
+            return
+        with self._lock:
+            try:
+                connection = self._connect()
+                try:
+                    # The connection context manager commits the batch, or rolls it back on error
+                    with connection:
+                        connection.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)", rows)
+                finally:
+                    connection.close()
+            except sqlite3.Error as e:
+                logger.error(f"Error={e} saving {len(rows)} results to result store=`{self.database_path}`")
+                return
+            stored_rows = self._load_rows()
+            for *key, fingerprint, payload in rows:
+                stored_rows[tuple(key)] = (fingerprint, payload)
+        logger.info(f"Saved {len(rows)} results to result store=`{self.database_path}`")
+
+
+def get_result_store(output_dir):
+    """Result store of the window directory, one per process."""
+    database_path = (Path(output_dir) / PklFileConventions.result_store_filename).resolve()
+    with _result_stores_lock:
+        if database_path not in _result_stores:
+            _result_stores[database_path] = ResultStore(database_path)
+        return _result_stores[database_path]
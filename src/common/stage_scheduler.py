@@ -0,0 +1,60 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+
+class StageScheduler:
+    """
+    Small dependency-aware scheduler for the stages of one pipeline window.
+
+    Every stage declares the stages it depends on, a stage is started as soon as all of its dependencies are
+    finished, so independent stages run concurrently and their results are joined where a later stage needs them.
+    The stage function is called with the results of its dependencies as keyword arguments named after the stages.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+        self.stages = {}
+
+    def add_stage(self, name, func, depends_on=()):
+        """
+        Register a stage, its dependencies must already be registered which keeps the graph acyclic.
+        """
+        if name in self.stages:
+            raise ValueError(f"Stage=`{name}` is already registered")
+        missing_stages = [dependency for dependency in depends_on if dependency not in self.stages]
+        if missing_stages:
+            raise ValueError(f"Stage=`{name}` depends on unknown stages={missing_stages}")
+        self.stages[name] = (func, tuple(depends_on))
+        return self
+
+    def run(self):
+        """
+        Run all the stages and return a dictionary with the result of every stage.
+        The first failing stage stops the scheduling of new stages and its exception is raised.
+        """
+        results = {}
+        pending_stages = dict(self.stages)
+        running_stages = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            try:
+                while pending_stages or running_stages:
+                    ready_stages = [name for name, (_, depends_on) in pending_stages.items()
+                                    if all(dependency in results for dependency in depends_on)]
+                    for name in ready_stages:
+                        func, depends_on = pending_stages.pop(name)
+                        logger.debug(f"Starting stage=`{name}`")
+                        kwargs = {dependency: results[dependency] for dependency in depends_on}
+                        running_stages[executor.submit(func, **kwargs)] = name
+
+                    finished, _ = wait(running_stages, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        name = running_stages.pop(future)
+                        results[name] = future.result()
+                        logger.debug(f"Finished stage=`{name}`")
+            except Exception:
+                for future in running_stages:
+                    future.cancel()
+                raise
+        return results
@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+
+MOCK_TICKERS = ["StockA", "StockB", "StockC", "StockD"]
+
+
+def mock_prices():
+    """250 business days of random walk prices of the 4 mock tickers, the same on every call."""
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(100 * np.exp(np.cumsum(rng.normal(0.0005, 0.01, (250, len(MOCK_TICKERS))), axis=0)),
+                        index=pd.bdate_range('2022-01-03', periods=250), columns=MOCK_TICKERS)
+
+
+def mock_market_data():
+    """
+    Mock inputs of the optimization stage: the prices, the annualized Mean and Median expected returns and the
+    annualized Sample and Diagonal covariance matrices of their daily returns.
+
+    :return: (data, expected_return_df, risk_return_dict)
+    """
+    data = mock_prices()
+    returns = data.pct_change().dropna()
+    expected_return_df = pd.DataFrame({"Mean": returns.mean() * 252, "Median": returns.median() * 252})
+    risk_return_dict = {"Sample": returns.cov() * 252,
+                        "Diagonal": pd.DataFrame(np.diag(returns.var() * 252), index=MOCK_TICKERS,
+                                                 columns=MOCK_TICKERS)}
+    return data, expected_return_df, risk_return_dict
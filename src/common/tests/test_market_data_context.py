@@ -0,0 +1,88 @@
+import gc
+import pickle
+import threading
+import time
+import unittest
+import weakref
+from unittest.mock import Mock
+
+import numpy as np
+import pandas as pd
+
+from src.common.market_data_context import MarketDataContext
+from src.common.tests.mock_market_data import mock_prices
+
+
+class TestMarketDataContext(unittest.TestCase):
+    def setUp(self):
+        self.data = mock_prices()
+        self.context = MarketDataContext(self.data)
+
+    def test_statistics_match_pandas(self):
+        returns = self.data.pct_change().dropna()
+        log_returns = np.log1p(self.data.pct_change())
+        pd.testing.assert_frame_equal(self.context.simple_returns, returns)
+        pd.testing.assert_series_equal(self.context.mean_returns, returns.mean())
+        pd.testing.assert_frame_equal(self.context.sample_covariance, returns.cov())
+        pd.testing.assert_series_equal(self.context.log_mean_returns, log_returns.mean())
+        pd.testing.assert_frame_equal(self.context.log_sample_covariance, log_returns.cov())
+
+    def test_statistics_are_memoized(self):
+        for name in ("simple_returns", "log_returns", "mean_returns", "log_mean_returns", "centered_returns",
+                     "sample_covariance", "log_sample_covariance", "fingerprint"):
+            with self.subTest(name=name):
+                self.assertIs(getattr(self.context, name), getattr(self.context, name))
+
+    def test_memoized_object_is_computed_once_across_threads(self):
+        # A slow computation, so that the threads ask for the object while it is being computed
+        compute = Mock(side_effect=lambda: time.sleep(0.05) or object())
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.context.memoize("portfolio", compute)))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        compute.assert_called_once()
+        self.assertEqual(len({id(result) for result in results}), 1)
+
+    def test_input_fingerprint_is_memoized_per_object(self):
+        mean_returns = self.context.mean_returns
+        self.assertEqual(self.context.get_input_fingerprint(mean_returns),
+                         self.context.get_input_fingerprint(mean_returns.copy()))
+        self.assertNotEqual(self.context.get_input_fingerprint(mean_returns),
+                            self.context.get_input_fingerprint(mean_returns * 2))
+
+    def test_input_fingerprint_does_not_keep_the_input_alive(self):
+        mean_returns = self.data.mean()
+        fingerprint = self.context.get_input_fingerprint(mean_returns)
+        reference = weakref.ref(mean_returns)
+        del mean_returns
+        gc.collect()
+        self.assertIsNone(reference())
+        self.assertNotIn(fingerprint, [memo[1] for memo in self.context._cache.values() if isinstance(memo, tuple)])
+        # Objects without weak references are hashed on every call
+        self.assertEqual(self.context.get_input_fingerprint({"StockA": 0.5}),
+                         self.context.get_input_fingerprint({"StockA": 0.5}))
+
+    def test_context_is_read_only(self):
+        with self.assertRaisesRegex(AttributeError, "read-only"):
+            self.context.data = self.data * 2
+        with self.assertRaises(AttributeError):
+            self.context.mean_returns = self.data.mean()
+        self.assertIs(self.context.data, self.data)
+
+    def test_pickle_carries_only_the_data(self):
+        self.context.sample_covariance
+        self.context.memoize("portfolio", object)
+        restored_context = pickle.loads(pickle.dumps(self.context))
+        self.assertEqual(restored_context._cache, {})
+        pd.testing.assert_frame_equal(restored_context.data, self.data)
+        # The statistics are recomputed on first access in the receiving process
+        pd.testing.assert_frame_equal(restored_context.sample_covariance, self.context.sample_covariance)
+        self.assertEqual(restored_context.fingerprint, self.context.fingerprint)
+        self.assertEqual(self.context.__reduce__(), (MarketDataContext, (self.data,)))
+
+
+if __name__ == '__main__':
+    unittest.main()
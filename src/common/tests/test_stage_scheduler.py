@@ -0,0 +1,75 @@
+import threading
+import time
+import unittest
+
+from src.common.stage_scheduler import StageScheduler
+
+
+class TestStageScheduler(unittest.TestCase):
+
+    def test_stage_starts_after_its_dependencies(self):
+        finished_stages = []
+        lock = threading.Lock()
+
+        def stage(name, delay):
+            def run(**kwargs):
+                time.sleep(delay)
+                with lock:
+                    finished_stages.append(name)
+                return name
+            return run
+
+        scheduler = StageScheduler(max_workers=3)
+        # The slowest stage is registered first, its dependent must still wait for it
+        scheduler.add_stage("data", stage("data", 0.05))
+        scheduler.add_stage("expected_returns", stage("expected_returns", 0.01), depends_on=("data",))
+        scheduler.add_stage("risk_models", stage("risk_models", 0.03), depends_on=("data",))
+        scheduler.add_stage("optimization", stage("optimization", 0), depends_on=("expected_returns", "risk_models"))
+        results = scheduler.run()
+
+        self.assertEqual(finished_stages, ["data", "expected_returns", "risk_models", "optimization"])
+        self.assertEqual(set(results), {"data", "expected_returns", "risk_models", "optimization"})
+
+    def test_independent_stages_run_concurrently(self):
+        barrier = threading.Barrier(2, timeout=5)
+        scheduler = StageScheduler(max_workers=2)
+        # Each stage waits for the other one, the run only finishes if both are running at the same time
+        scheduler.add_stage("expected_returns", lambda: barrier.wait())
+        scheduler.add_stage("risk_models", lambda: barrier.wait())
+        results = scheduler.run()
+        self.assertEqual(sorted(results.values()), [0, 1])
+
+    def test_stage_joins_the_results_of_its_dependencies(self):
+        scheduler = StageScheduler()
+        scheduler.add_stage("data", lambda: [1, 2, 3])
+        scheduler.add_stage("expected_returns", lambda data: sum(data) / len(data), depends_on=("data",))
+        scheduler.add_stage("risk_models", lambda data: max(data) - min(data), depends_on=("data",))
+        scheduler.add_stage("optimization", lambda expected_returns, risk_models: (expected_returns, risk_models),
+                            depends_on=("expected_returns", "risk_models"))
+        results = scheduler.run()
+        self.assertEqual(results["optimization"], (2, 2))
+
+    def test_failing_stage_stops_its_dependents(self):
+        dependent_calls = []
+
+        def fail():
+            raise ValueError("no data")
+
+        scheduler = StageScheduler()
+        scheduler.add_stage("data", fail)
+        scheduler.add_stage("expected_returns", lambda data: dependent_calls.append(data), depends_on=("data",))
+        with self.assertRaisesRegex(ValueError, "no data"):
+            scheduler.run()
+        self.assertEqual(dependent_calls, [])
+
+    def test_stages_must_be_registered_once_after_their_dependencies(self):
+        scheduler = StageScheduler()
+        scheduler.add_stage("data", lambda: None)
+        with self.assertRaisesRegex(ValueError, "already registered"):
+            scheduler.add_stage("data", lambda: None)
+        with self.assertRaisesRegex(ValueError, "unknown stages"):
+            scheduler.add_stage("optimization", lambda **kwargs: None, depends_on=("risk_models",))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import json
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.common.conventions import PklFileConventions
+from src.common.utils import compute_fingerprint, load_cache_manifest, load_data_from_cache, save_data_to_cache
+
+
+class TestComputeFingerprint(unittest.TestCase):
+    def setUp(self):
+        self.data = pd.DataFrame({"StockA": [100.0, 101.0, 102.0], "StockB": [50.0, 49.5, 51.0]},
+                                 index=pd.bdate_range('2022-01-03', periods=3))
+
+    def test_equal_inputs_have_the_same_fingerprint(self):
+        self.assertEqual(compute_fingerprint(self.data, "Mean", {"frequency": 252}),
+                         compute_fingerprint(self.data.copy(), "Mean", {"frequency": 252}))
+
+    def test_changed_input_changes_the_fingerprint(self):
+        fingerprint = compute_fingerprint(self.data, "Mean", {"frequency": 252})
+        changed_data = self.data.copy()
+        changed_data.iloc[-1, 0] = 103.0
+        changed_fingerprints = [compute_fingerprint(changed_data, "Mean", {"frequency": 252}),
+                                compute_fingerprint(self.data[["StockA"]], "Mean", {"frequency": 252}),
+                                compute_fingerprint(self.data, "Median", {"frequency": 252}),
+                                compute_fingerprint(self.data, "Mean", {"frequency": 12}),
+                                compute_fingerprint(self.data.to_numpy(), "Mean", {"frequency": 252})]
+        self.assertNotIn(fingerprint, changed_fingerprints)
+        self.assertEqual(len(set(changed_fingerprints)), len(changed_fingerprints))
+
+
+class TestDataCache(unittest.TestCase):
+    def setUp(self):
+        self.current_dir = Path(tempfile.mkdtemp())
+        self.pkl_filename = self.current_dir / "expected_return.pkl"
+        self.data = pd.DataFrame({"Mean": [0.1, 0.2]}, index=["StockA", "StockB"])
+
+    def tearDown(self):
+        shutil.rmtree(self.current_dir, ignore_errors=True)
+
+    def test_cache_is_read_for_the_same_inputs(self):
+        fingerprint = compute_fingerprint(self.data)
+        save_data_to_cache(self.pkl_filename, fingerprint, self.data)
+        pd.testing.assert_frame_equal(load_data_from_cache(self.pkl_filename, fingerprint), self.data)
+
+    def test_changed_input_is_recomputed(self):
+        save_data_to_cache(self.pkl_filename, compute_fingerprint(self.data), self.data)
+        changed_data = self.data * 2
+        # A stale cache file is not returned, so the caller recomputes and overwrites it
+        self.assertIsNone(load_data_from_cache(self.pkl_filename, compute_fingerprint(changed_data)))
+        save_data_to_cache(self.pkl_filename, compute_fingerprint(changed_data), changed_data)
+        pd.testing.assert_frame_equal(load_data_from_cache(self.pkl_filename, compute_fingerprint(changed_data)),
+                                      changed_data)
+        self.assertIsNone(load_data_from_cache(self.pkl_filename, compute_fingerprint(self.data)))
+
+    def test_pickle_without_fingerprint_is_recomputed(self):
+        # e.g. a pickle file written before the cache manifest existed
+        self.data.to_pickle(self.pkl_filename)
+        self.assertIsNone(load_data_from_cache(self.pkl_filename, compute_fingerprint(self.data)))
+        self.assertIsNone(load_data_from_cache(self.current_dir / "missing.pkl", compute_fingerprint(self.data)))
+
+    def test_manifest_survives_concurrent_writes(self):
+        fingerprints = {f"stage_{i}.pkl": compute_fingerprint(np.arange(i)) for i in range(32)}
+
+        def save(pkl_name):
+            save_data_to_cache(self.current_dir / pkl_name, fingerprints[pkl_name], pkl_name)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(save, fingerprints))
+
+        with open(self.current_dir / PklFileConventions.cache_manifest_filename) as f:
+            self.assertEqual(json.load(f), fingerprints)
+        self.assertEqual(load_cache_manifest(self.pkl_filename), fingerprints)
+        for pkl_name, fingerprint in fingerprints.items():
+            self.assertEqual(load_data_from_cache(self.current_dir / pkl_name, fingerprint), pkl_name)
+
+
+if __name__ == '__main__':
+    unittest.main()
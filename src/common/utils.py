@@ -1,14 +1,23 @@
 # Function to extract the dictionary from the string
 import ast
+import hashlib
+import json
 import logging
 import os
 import pickle
+import threading
 from pathlib import Path
 
-from src.common.conventions import GeneralConventions
+import numpy as np
+import pandas as pd
+
+from src.common.conventions import GeneralConventions, PklFileConventions
 
 logger = logging.getLogger(__name__)
 
+# The stages of a window may update the cache manifest of the window from several threads
+_cache_manifest_lock = threading.Lock()
+
 
 def extract_dict_from_string(weight_str):
     # Split at the first space and take the second part
@@ -64,3 +73,91 @@ def save_data_to_pickle(pkl_filename, dataframe):
         logger.info(f" data saved to filepath={pkl_filename}")
     except Exception as e:
         logger.error(f"Error={e} saving data to pickle file={pkl_filename}")
+
+
+def _update_fingerprint(hasher, component):
+    if isinstance(component, (pd.DataFrame, pd.Series)):
+        frame = component.to_frame() if isinstance(component, pd.Series) else component
+        # Object columns (e.g. weights dictionaries) are not hashable by pandas, hash their string representation
+        if (frame.dtypes == object).any():
+            frame = frame.apply(lambda column: column.astype(str) if column.dtype == object else column)
+        hasher.update(repr((type(component).__name__, list(frame.columns), frame.shape)).encode())
+        hasher.update(pd.util.hash_pandas_object(frame, index=True).values.tobytes())
+    elif isinstance(component, np.ndarray):
+        hasher.update(repr((component.dtype.str, component.shape)).encode())
+        hasher.update(np.ascontiguousarray(component).tobytes())
+    elif isinstance(component, dict):
+        hasher.update(b"dict")
+        for key in sorted(component, key=str):
+            _update_fingerprint(hasher, key)
+            _update_fingerprint(hasher, component[key])
+    elif isinstance(component, (list, tuple)):
+        hasher.update(type(component).__name__.encode())
+        for item in component:
+            _update_fingerprint(hasher, item)
+    else:
+        hasher.update(repr(component).encode())
+    hasher.update(b"|")
+
+
+def compute_fingerprint(*components):
+    """
+    Compute a content fingerprint (sha256 hex digest) of the inputs of a stage, e.g. the input data, tickers,
+    dates, method name and parameters. Two calls return the same fingerprint only if all the components are equal.
+    """
+    hasher = hashlib.sha256()
+    for component in components:
+        _update_fingerprint(hasher, component)
+    return hasher.hexdigest()
+
+
+def _get_cache_manifest_path(pkl_filename):
+    return Path(pkl_filename).parent / PklFileConventions.cache_manifest_filename
+
+
+def load_cache_manifest(pkl_filename):
+    """
+    Load the cache manifest of the window directory holding the pickle file, {pickle file name: fingerprint}.
+    """
+    manifest_path = _get_cache_manifest_path(pkl_filename)
+    if not manifest_path.exists():
+        return {}
+    try:
+        with open(manifest_path, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"Error={e} while loading cache manifest={manifest_path}")
+        return {}
+
+
+def load_data_from_cache(pkl_filename, fingerprint):
+    """
+    Load a cached pickle file only if the cache manifest of its directory records the same input fingerprint,
+    stale results (e.g. computed for other tickers or parameters) are ignored and recomputed.
+    """
+    if not os.path.exists(pkl_filename):
+        return None
+    cached_fingerprint = load_cache_manifest(pkl_filename).get(Path(pkl_filename).name)
+    if cached_fingerprint != fingerprint:
+        logger.info(f"Cache file=`{pkl_filename}` is stale or has no fingerprint, it will be recomputed")
+        return None
+    return load_data_from_pickle(pkl_filename)
+
+
+def save_data_to_cache(pkl_filename, fingerprint, data):
+    """
+    Save data to a pickle file and record its input fingerprint in the cache manifest of its directory.
+    """
+    save_data_to_pickle(pkl_filename, data)
+    manifest_path = _get_cache_manifest_path(pkl_filename)
+    with _cache_manifest_lock:
+        manifest = load_cache_manifest(pkl_filename)
+        manifest[Path(pkl_filename).name] = fingerprint
+        try:
+            # Write to a temporary file first so that the manifest is never left half written
+            tmp_manifest_path = manifest_path.with_suffix('.tmp')
+            with open(tmp_manifest_path, 'w') as f:
+                json.dump(manifest, f, indent=2, sort_keys=True)
+            os.replace(tmp_manifest_path, manifest_path)
+        except Exception as e:
+            logger.error(f"Error={e} updating cache manifest={manifest_path}")
@@ -1,8 +1,9 @@
 import os
-import pandas as pd
 import logging
 from abc import ABC, abstractmethod
 
+from src.common.utils import compute_fingerprint, load_data_from_cache, save_data_to_cache
+
 logger = logging.getLogger(__name__)
 
 
@@ -17,14 +18,17 @@ class BaseDownloader(ABC):
 
     def get_data(self, tickers, start_date, end_date):
         pkl_filepath = self.get_pkl_file_name()
-        if os.path.exists(pkl_filepath):
+        # The cached data is only reused for the same source, tickers and dates
+        fingerprint = compute_fingerprint(self.__class__.__name__, self.asset_class, sorted(list(tickers)),
+                                          str(start_date), str(end_date))
+        df = load_data_from_cache(pkl_filepath, fingerprint)
+        if df is not None:
             logger.info(f"Loading cached data from {pkl_filepath}")
-            return pd.read_pickle(pkl_filepath)
-        else:
-            logger.info(f"Downloading data for {self.asset_class} and saving to {pkl_filepath}")
-            df = self.download_data(tickers, start_date, end_date)
-            df.to_pickle(pkl_filepath)
             return df
+        logger.info(f"Downloading data for {self.asset_class} and saving to {pkl_filepath}")
+        df = self.download_data(tickers, start_date, end_date)
+        save_data_to_cache(pkl_filepath, fingerprint, df)
+        return df
 
     @abstractmethod
     def download_data(self, tickers, start_date, end_date):
@@ -7,8 +7,8 @@ from pypfopt import risk_models, BlackLittermanModel, black_litterman
 
 
 class BlackLittermanReturn(ExpectedReturnBase):
-    def __init__(self, data):
-        super().__init__(data)
+    def __init__(self, data, market_data_context=None):
+        super().__init__(data, market_data_context)
         self.delta = None
         self.mcaps = {}
         self.covariance_matrix = None
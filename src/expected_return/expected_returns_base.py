@@ -4,13 +4,16 @@ from abc import ABC, abstractmethod
 import pandas as pd
 
 from src.common.conventions import PklFileConventions, HeaderConventions
-from src.common.utils import load_data_from_pickle, save_data_to_pickle
+from src.common.market_data_context import MarketDataContext
+from src.common.utils import compute_fingerprint, load_data_from_cache, save_data_to_cache
 
 
 # Base class for expected returns
 class ExpectedReturnBase(ABC):
-    def __init__(self, data):
+    def __init__(self, data, market_data_context=None):
         self.data = data
+        # Return statistics shared by all the stages of the window
+        self.market_data_context = market_data_context if market_data_context is not None else MarketDataContext(data)
         self.cache_file = None
 
     def _generate_cache_filename(self, output_dir):
@@ -22,15 +25,16 @@ class ExpectedReturnBase(ABC):
         self.cache_file = os.path.join(output_dir, expected_return_pkl_filename)
 
     def calculate_expected_return(self, output_dir):
-        # Check if cache exists
+        # Check if cache exists for the same data
         self._generate_cache_filename(output_dir)
-        cached_result = load_data_from_pickle(self.cache_file)
+        fingerprint = compute_fingerprint(self.data, self.__class__.__name__)
+        cached_result = load_data_from_cache(self.cache_file, fingerprint)
         if cached_result is not None:
             return cached_result
 
         # If no cache, calculate and cache the result
         result = self._calculate_expected_return()
-        # save_data_to_pickle({self.cache_file}, result)
+        save_data_to_cache(self.cache_file, fingerprint, result)
         return result
 
     def _convert_to_dataframe(self, expected_returns):
@@ -1,10 +1,11 @@
 from src.common.execution_time_recorder import ExecutionTimeRecorder
+from src.common.market_data_context import TRADING_DAYS_PER_YEAR
 from src.expected_return.expected_returns_base import ExpectedReturnBase
 
 
 class FamaFrenchReturn(ExpectedReturnBase):
-    def __init__(self, data):
-        super().__init__(data)
+    def __init__(self, data, market_data_context=None):
+        super().__init__(data, market_data_context)
         self.risk_free_rate = 0.02  # Example risk-free rate (4%) for demonstration purposes
         self.SMB = 0.02  # Example SMB factor (2%)
         self.HML = 0.01  # Example HML factor (1%)
@@ -17,16 +18,9 @@ class FamaFrenchReturn(ExpectedReturnBase):
         Calculate the annualized market return from the data DataFrame.
         :return: Dictionary of annualized returns for each ticker
         """
-        annualized_returns = {}
-        for ticker in self.tickers:
-            # Calculate daily returns
-            daily_returns = self.data[ticker].pct_change()
-            # Drop NaN values
-            daily_returns = daily_returns.dropna()
-            # Annualized the return (assuming 252 trading days)
-            annualized_return = daily_returns.mean() * 252
-            annualized_returns[ticker] = annualized_return
-        return annualized_returns
+        # Annualized the mean daily return (assuming 252 trading days)
+        annualized_returns = self.market_data_context.mean_returns * TRADING_DAYS_PER_YEAR
+        return {ticker: annualized_returns[ticker] for ticker in self.tickers}
 
     @ExecutionTimeRecorder(module_name=__name__)  # Use __name__ to get the module name
     def _calculate_expected_return(self):
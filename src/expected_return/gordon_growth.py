@@ -3,8 +3,8 @@ import yfinance as yf
 
 
 class GordonGrowthReturn(ExpectedReturnBase):
-    def __init__(self, data):
-        super().__init__(data)
+    def __init__(self, data, market_data_context=None):
+        super().__init__(data, market_data_context)
         self.tickers = data.columns
         self.data = {}
         self.fetch_data()
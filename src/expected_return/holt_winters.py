@@ -5,8 +5,8 @@ from src.expected_return.expected_returns_base import ExpectedReturnBase
 
 
 class HoltWintersReturn(ExpectedReturnBase):
-    def __init__(self, data):
-        super().__init__(data)
+    def __init__(self, data, market_data_context=None):
+        super().__init__(data, market_data_context)
         self.data = data
 
     @ExecutionTimeRecorder(module_name=__name__)  # Use __name__ to get the module name
@@ -17,7 +17,7 @@ class HoltWintersReturn(ExpectedReturnBase):
         """
         expected_returns = {}
         # Calculate percentage returns
-        returns = self.data.pct_change().dropna()
+        returns = self.market_data_context.simple_returns
 
         for ticker in returns.columns:
             series = returns[ticker]
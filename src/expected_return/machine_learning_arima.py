@@ -6,8 +6,8 @@ from src.expected_return.expected_returns_base import ExpectedReturnBase
 
 
 class ARIMAReturn(ExpectedReturnBase):
-    def __init__(self, data):
-        super().__init__(data)
+    def __init__(self, data, market_data_context=None):
+        super().__init__(data, market_data_context)
         self.data = data
         self.data.index = pd.to_datetime(data.index)
         self.data = data.asfreq('B')  # Business day frequency
@@ -6,8 +6,8 @@ from src.expected_return.expected_returns_base import ExpectedReturnBase
 
 
 class LinearRegressionReturn(ExpectedReturnBase):
-    def __init__(self, data):
-        super().__init__(data)
+    def __init__(self, data, market_data_context=None):
+        super().__init__(data, market_data_context)
         self.data = data
         # self.expected_returns = self.calculate_expected_return()
 
@@ -19,11 +19,12 @@ class LinearRegressionReturn(ExpectedReturnBase):
         """
         expected_returns = {}
         tickers = self.data.columns
+        all_returns = self.market_data_context.simple_returns
 
         # Iterate over each ticker
         for ticker in tickers:
-            # Calculate daily returns
-            returns = self.data[ticker].pct_change().dropna()
+            # Daily returns
+            returns = all_returns[ticker]
 
             # Prepare time steps as features (X) and returns as target (y)
             X = np.arange(len(returns)).reshape(-1, 1)  # Time steps (0, 1, 2, ...) as features
@@ -7,6 +7,7 @@ import pandas as pd
 from src.common.conventions import PklFileConventions
 from src.common.execution_time_recorder import ExecutionTimeRecorder
 from src.common.hydra_config_loader import load_config
+from src.common.market_data_context import MarketDataContext
 from src.expected_return.arithmetic_mean_historical_return import ArithmeticMeanHistoricalReturn
 from src.expected_return.black_litterman import BlackLittermanReturn
 from src.expected_return.cagr_mean_historical_return import CAGRMeanHistoricalReturn
@@ -34,10 +35,10 @@ def update_returns_dataframe(df_returns, return_type, return_values):
 
 
 @ExecutionTimeRecorder(module_name=__name__)  # Use __name__ t
-def calculate_all_returns(data, output_dir, enabled_methods):
+def calculate_all_returns(data, output_dir, enabled_methods, market_data_context=None):
     """Calculate all the different returns (mean, ema, capm, etc.) using a loop."""
     # Create a mapping of return types to their respective classes
-    return_calculators = get_expected_return_enabled_classes(data)
+    return_calculators = get_expected_return_enabled_classes(data, market_data_context)
     # Initialize an empty DataFrame to store returns
     df_returns = pd.DataFrame()
     # Loop through each return type and add to the DataFrame
@@ -53,20 +54,22 @@ def calculate_all_returns(data, output_dir, enabled_methods):
     return df_returns
 
 
-def get_expected_return_enabled_classes(data):
+def get_expected_return_enabled_classes(data, market_data_context=None):
+    if market_data_context is None:
+        market_data_context = MarketDataContext(data)
     return_calculators = {
-        'ARIMA': ARIMAReturn(data),
-        'ArithmeticMeanHistorical': ArithmeticMeanHistoricalReturn(data),
-        'BlackLitterman': BlackLittermanReturn(data),
-        'CAPM': CAPMReturn(data),
-        'CAGRMeanHistorical': CAGRMeanHistoricalReturn(data),
-        'EMAHistorical': EMAHistoricalReturn(data),
-        'FamaFrench': FamaFrenchReturn(data),
-        'GordonGrowth': GordonGrowthReturn(data),
-        'HoltWinters': HoltWintersReturn(data),
-        'LinearRegression': LinearRegressionReturn(data),
-        'RiskParity': RiskParityReturn(data),
-        'TWRR': TWRRReturn(data)
+        'ARIMA': ARIMAReturn(data, market_data_context),
+        'ArithmeticMeanHistorical': ArithmeticMeanHistoricalReturn(data, market_data_context),
+        'BlackLitterman': BlackLittermanReturn(data, market_data_context),
+        'CAPM': CAPMReturn(data, market_data_context),
+        'CAGRMeanHistorical': CAGRMeanHistoricalReturn(data, market_data_context),
+        'EMAHistorical': EMAHistoricalReturn(data, market_data_context),
+        'FamaFrench': FamaFrenchReturn(data, market_data_context),
+        'GordonGrowth': GordonGrowthReturn(data, market_data_context),
+        'HoltWinters': HoltWintersReturn(data, market_data_context),
+        'LinearRegression': LinearRegressionReturn(data, market_data_context),
+        'RiskParity': RiskParityReturn(data, market_data_context),
+        'TWRR': TWRRReturn(data, market_data_context)
     }
     return return_calculators
 
@@ -80,9 +83,9 @@ def get_enabled_methods():
 
 
 @ExecutionTimeRecorder(module_name=__name__)  # Use __name__ t
-def calculate_or_get_all_return(data: pd.DataFrame, current_dir: Path, enabled_methods=None):
+def calculate_or_get_all_return(data: pd.DataFrame, current_dir: Path, enabled_methods=None, market_data_context=None):
     logger.info("Calculating or getting all returns...for the month {}".format(current_dir))
     if enabled_methods is None:
         # If enabled_methods is not provided, load it from the config file
         enabled_methods = get_enabled_methods()
-    return calculate_all_returns(data, current_dir, enabled_methods)
+    return calculate_all_returns(data, current_dir, enabled_methods, market_data_context)
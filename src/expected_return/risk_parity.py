@@ -1,21 +1,20 @@
 import numpy as np
 
 from src.common.execution_time_recorder import ExecutionTimeRecorder
+from src.common.market_data_context import TRADING_DAYS_PER_YEAR
 from src.expected_return.expected_returns_base import ExpectedReturnBase
 
 
 class RiskParityReturn(ExpectedReturnBase):
-    def __init__(self, data):
-        self.data = data
+    def __init__(self, data, market_data_context=None):
+        super().__init__(data, market_data_context)
 
     def calculate_covariance_matrix(self):
         """
         Calculate the covariance matrix of asset returns.
         :return: Covariance matrix
         """
-        returns = self.data.pct_change().dropna()
-        covariance_matrix = returns.cov()
-        return covariance_matrix
+        return self.market_data_context.sample_covariance
 
     def calculate_risk_contributions(self, covariance_matrix):
         """
@@ -58,5 +57,5 @@ class RiskParityReturn(ExpectedReturnBase):
         weights = self.calculate_weights_based_on_risk(risk_contributions)
 
         # Calculate expected return based on these weights
-        returns = self.data.pct_change().dropna().mean() * 252  # Annualize returns
+        returns = self.market_data_context.mean_returns * TRADING_DAYS_PER_YEAR  # Annualize returns
         return self._convert_to_dataframe(returns)
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+
+from src.common.conventions import HeaderConventions
+
+
+def efficient_envelope(volatilities, returns):
+    """
+    Positions of the points on the upper-left convex envelope of a (volatility, return) cloud, from the min
+    volatility point to the max return point, i.e. the efficient frontier of the cloud.
+
+    The points are sorted once by volatility, the ones that do not improve the return of all the less volatile points
+    are dropped (they cannot be efficient) and a monotone chain keeps the concave part of the remaining points,
+    so the cost is O(P log P).
+    """
+    volatilities = np.asarray(volatilities, dtype=float)
+    returns = np.asarray(returns, dtype=float)
+    candidates = np.flatnonzero(np.isfinite(volatilities) & np.isfinite(returns))
+    if len(candidates) == 0:
+        return candidates
+    # Volatility ascending, then return descending so that the best return of equal volatilities comes first
+    candidates = candidates[np.lexsort((-returns[candidates], volatilities[candidates]))]
+    sorted_returns = returns[candidates]
+    previous_best_returns = np.maximum.accumulate(np.concatenate([[-np.inf], sorted_returns[:-1]]))
+    candidates = candidates[sorted_returns > previous_best_returns]
+
+    hull = []
+    for candidate in candidates:
+        while len(hull) >= 2:
+            origin, middle = hull[-2], hull[-1]
+            cross = ((volatilities[middle] - volatilities[origin]) * (returns[candidate] - returns[origin]) -
+                     (returns[middle] - returns[origin]) * (volatilities[candidate] - volatilities[origin]))
+            # The middle point is below the segment from origin to candidate, it is not on the envelope
+            if cross < 0:
+                break
+            hull.pop()
+        hull.append(candidate)
+    return np.asarray(hull, dtype=np.int64)
+
+
+class FrontierEnvelopeTracker:
+    """
+    Efficient envelope and binned density of the Monte Carlo cloud, updated chunk by chunk.
+
+    The envelope of the union of two clouds is the envelope of their envelopes, so only the envelope points (with
+    their weights and metrics) are kept between chunks. The density counts the portfolios in a fixed grid over
+    volatility and expected return.
+    """
+
+    def __init__(self, volatility_range, return_range, bins):
+        self.volatility_edges = np.linspace(volatility_range[0], volatility_range[1], bins + 1)
+        self.return_edges = np.linspace(return_range[0], return_range[1], bins + 1)
+        self.density = np.zeros((bins, bins), dtype=np.int64)
+        self.positions = np.empty(0, dtype=np.int64)
+        self.weights = None
+        self.metrics = {}
+
+    def update(self, weights, metrics, first_position=0):
+        """Add a chunk of portfolios, metrics holds one (chunk,) array per metric."""
+        volatilities = metrics[HeaderConventions.annual_volatility_column]
+        returns = metrics[HeaderConventions.expected_annual_return_column]
+        valid = np.isfinite(volatilities) & np.isfinite(returns)
+        self.density += np.histogram2d(volatilities[valid], returns[valid],
+                                       bins=(self.volatility_edges, self.return_edges))[0].astype(np.int64)
+        envelope = efficient_envelope(volatilities, returns)
+        self._merge(first_position + envelope, np.asarray(weights[envelope]),
+                    {name: values[envelope] for name, values in metrics.items()})
+
+    def merge(self, other):
+        """Merge the envelope and density of another tracker over the same grid, e.g. the tracker of a worker."""
+        self.density += other.density
+        if other.weights is not None:
+            self._merge(other.positions, other.weights, other.metrics)
+
+    def _merge(self, positions, weights, metrics):
+        if self.weights is not None:
+            positions = np.concatenate([self.positions, positions])
+            weights = np.concatenate([self.weights, weights])
+            metrics = {name: np.concatenate([self.metrics[name], values]) for name, values in metrics.items()}
+        envelope = efficient_envelope(metrics[HeaderConventions.annual_volatility_column],
+                                      metrics[HeaderConventions.expected_annual_return_column])
+        self.positions = positions[envelope]
+        self.weights = weights[envelope]
+        self.metrics = {name: values[envelope] for name, values in metrics.items()}
+
+    def get_frontier_df(self):
+        """Envelope points from the min volatility to the max return, indexed by their position in the stream."""
+        return pd.DataFrame(self.metrics, index=self.positions)
+
+    def get_density_df(self):
+        """Number of portfolios per bin, indexed by the expected return and with a column per volatility bin center."""
+        volatility_centers = (self.volatility_edges[:-1] + self.volatility_edges[1:]) / 2
+        return_centers = (self.return_edges[:-1] + self.return_edges[1:]) / 2
+        return pd.DataFrame(self.density.T,
+                            index=pd.Index(return_centers, name=HeaderConventions.expected_annual_return_column),
+                            columns=pd.Index(volatility_centers, name=HeaderConventions.annual_volatility_column))
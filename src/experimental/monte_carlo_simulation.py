@@ -1,79 +1,463 @@
 import logging
+import multiprocessing
 import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 
 import numpy as np
 import pandas as pd
-from tqdm import tqdm
+from omegaconf import OmegaConf
 
 from src.common.conventions import PklFileConventions, HeaderConventions
 from src.common.execution_time_recorder import ExecutionTimeRecorder
+from src.common.hydra_config_loader import load_config
+from src.common.market_data_context import MarketDataContext, TRADING_DAYS_PER_YEAR
+from src.common.utils import compute_fingerprint, load_data_from_cache, save_data_to_cache
+from src.experimental.frontier_envelope import FrontierEnvelopeTracker
+from src.experimental.portfolio_top_k_tracker import PortfolioTopKTracker
+from src.experimental.simplex_samplers import SIMPLEX_SAMPLERS, UNIFORM_SAMPLER, SimplexConstraints, get_sobol_seed, \
+    sample_simplex
+from src.experimental.weight_bank import WeightBank
 
 logger = logging.getLogger(__name__)
 
 
+def _evaluate_portfolios(weights, annual_mean_returns, annual_covariance, custom_metrics):
+    """
+    Expected return, volatility, Sharpe ratio and the custom metrics of every portfolio (row) of weights,
+    evaluated with matrix products against the annualized mean and covariance of the log returns.
+    """
+    ret_arr = weights @ annual_mean_returns
+    vol_arr = np.sqrt(np.einsum('ij,ij->i', weights @ annual_covariance, weights))
+    metrics = {
+        HeaderConventions.expected_annual_return_column: ret_arr,
+        HeaderConventions.annual_volatility_column: vol_arr,
+        HeaderConventions.sharpe_ratio_column: ret_arr / vol_arr}
+    for name, (metric, _) in custom_metrics.items():
+        metrics[name] = np.asarray(metric(weights, ret_arr, vol_arr), dtype=float)
+    return metrics
+
+
+def _simulate_chunk(first_position, size, seed_sequence, number_of_symbols, annual_mean_returns, annual_covariance,
+                    custom_metrics, criteria, top_k, reservoir_size, sampler, sobol_seed, constraints, weight_bank_path,
+                    envelope_grid):
+    """
+    Simulate one chunk of the stream and return the top_k trackers of every criterion, the reservoir tracker and the
+    frontier envelope tracker (built over envelope_grid=(volatility_range, return_range, bins)).
+    Runs in a worker process in parallel mode, so every argument must be picklable.
+
+    With a seed_sequence, the chunk draws from its own Generator, otherwise from the global np.random.
+    With a weight_bank_path, the weights of the chunk are read from the weight bank instead of being drawn.
+    """
+    random_state = np.random.default_rng(seed_sequence) if seed_sequence is not None else np.random
+    if weight_bank_path is not None:
+        weights = np.load(weight_bank_path, mmap_mode='r')[first_position:first_position + size]
+    else:
+        weights = sample_simplex(sampler, random_state, size, number_of_symbols, first_position, sobol_seed,
+                                 constraints)
+    metrics = _evaluate_portfolios(weights, annual_mean_returns, annual_covariance, custom_metrics)
+
+    trackers = {criterion: PortfolioTopKTracker(top_k, maximize) for criterion, maximize in criteria.items()}
+    for criterion, tracker in trackers.items():
+        tracker.update(metrics[criterion], weights, metrics, first_position)
+
+    # Reservoir sampling: every portfolio gets a uniform random key and the smallest keys are kept, which is a
+    # uniform sample without replacement of the whole stream. The keys are independent of the weights; without a
+    # seed_sequence they come from their own generator so that the global weights stream is left untouched.
+    reservoir = None
+    if reservoir_size:
+        keys_rng = random_state if seed_sequence is not None else np.random.default_rng(first_position)
+        reservoir = PortfolioTopKTracker(reservoir_size, maximize=False)
+        reservoir.update(keys_rng.random(size), weights, metrics, first_position)
+
+    envelope = FrontierEnvelopeTracker(*envelope_grid)
+    envelope.update(weights, metrics, first_position)
+    return trackers, reservoir, envelope
+
+
 # Monte Carlo Simulation Class
 class MonteCarloSimulation:
-    def __init__(self, data, output_dir, num_of_portfolios=20000):
+    # Chunk size of the adaptive simulation when no chunk_size is given
+    default_adaptive_chunk_size = 2 ** 12
+
+    def __init__(self, data, output_dir, num_of_portfolios=20000, market_data_context=None, chunk_size=None,
+                 top_k=1, custom_metrics=None, reservoir_size=0, seed=None, n_jobs=1, sampler=UNIFORM_SAMPLER,
+                 weight_bank_dir=None, tolerance=None, patience=3, density_bins=50, persist_cloud=True,
+                 weight_bounds=(0, 1), cardinality=None):
+        """
+        :param chunk_size: When smaller than num_of_portfolios, the portfolios are streamed in chunks of chunk_size
+                           and only the top_k portfolios of every criterion (and the reservoir sample) are kept,
+                           memory then stays constant whatever the number of portfolios.
+        :param top_k: Number of best portfolios kept per criterion in streaming mode.
+        :param custom_metrics: Dictionary of name -> (metric, maximize), `metric(weights, expected_annual_returns,
+                               annual_volatilities)` returns one value per portfolio of a chunk, it becomes a
+                               column of simulations_df and a criterion of its own in streaming mode.
+        :param reservoir_size: Size of the uniform sample of all the portfolios kept in streaming mode (e.g. to plot
+                               the cloud of portfolios), 0 disables it.
+        :param seed: Seed of the `np.random.SeedSequence` that every chunk gets its own Generator from. Without a
+                     seed and with n_jobs=1 the global `np.random` is used, as before.
+        :param n_jobs: Number of worker processes the chunks are simulated on in streaming mode. The chunks do not
+                       depend on n_jobs, so the results are the same for any n_jobs. Without a seed, a fresh one is
+                       drawn and recorded in `seed`.
+        :param sampler: How the weights are drawn on the simplex, one of `uniform` (historical), `dirichlet` or
+                        `sobol`, see `simplex_samplers.sample_simplex`.
+        :param weight_bank_dir: Directory of the shared `WeightBank`, the weights are then generated once for all the
+                                windows with the same tickers, sampler, seed and number of portfolios and read from
+                                a memory-mapped file. It requires a seed.
+        :param tolerance: Enables the adaptive sample size: the portfolios are simulated in chunks (of chunk_size, or
+                          default_adaptive_chunk_size) and the simulation stops once the best Sharpe ratio and the min
+                          volatility changed by at most tolerance (relative change) over patience consecutive chunks.
+                          num_of_portfolios is then the hard cap, the number of portfolios used is in samples_used.
+        :param patience: Number of consecutive stable chunks before stopping.
+        :param density_bins: Number of volatility and expected return bins of the density grid of the cloud.
+        :param persist_cloud: When False and without streaming, the cached pickle only keeps the best portfolios of
+                              every criterion and the frontier envelope instead of every simulated portfolio.
+        :param weight_bounds: (lower, upper) bounds of every weight, or one pair per asset, as for the pypfopt
+                              optimizers, e.g. (-1, 1) to compare with `PyPortfolioOptFrontierWithShortPosition`.
+        :param cardinality: Number of assets held by every portfolio, None holds all of them. The weights are mapped
+                            onto the constraints without rejection, see `simplex_samplers.SimplexConstraints`.
+        """
+        if sampler not in SIMPLEX_SAMPLERS:
+            raise ValueError(f"Unknown sampler=`{sampler}`, supported samplers are {SIMPLEX_SAMPLERS}")
         self.tickers = data.columns
         self.data = data
         self.num_of_portfolios = num_of_portfolios
-        self.log_return = np.log(1 + data.pct_change())
+        self.market_data_context = market_data_context if market_data_context is not None else MarketDataContext(data)
+        self.log_return = self.market_data_context.log_returns
         self.number_of_symbols = len(self.tickers)
+        if tolerance is not None and (chunk_size is None or chunk_size >= num_of_portfolios):
+            chunk_size = min(self.default_adaptive_chunk_size, num_of_portfolios)
+        self.chunk_size = chunk_size
+        self.tolerance = tolerance
+        self.patience = patience
+        self.top_k = top_k
+        self.custom_metrics = custom_metrics or {}
+        self.reservoir_size = reservoir_size
+        self.n_jobs = n_jobs
+        if seed is None and n_jobs > 1:
+            # Parallel runs always use independent streams, the entropy of the fresh seed is kept for audit
+            seed = np.random.SeedSequence().entropy
+        self.seed = seed
+        self.sampler = sampler
+        self.constraints = SimplexConstraints(self.number_of_symbols, weight_bounds, cardinality)
+        self.weight_bank = WeightBank(weight_bank_dir, self.tickers, num_of_portfolios, seed, sampler,
+                                      self.constraints) if weight_bank_dir is not None else None
         self.simulations_df = None
+        # Dense (portfolios x number_of_symbols) array, row i holds the weights of the portfolio of row i of
+        # simulations_df
+        self.weights = None
+        # Uniform sample of all the simulated portfolios, only filled in streaming mode
+        self.reservoir_df = None
+        self.reservoir_weights = None
+        # Best Sharpe ratio and min volatility against the number of simulated portfolios
+        self.convergence_df = None
+        # Number of portfolios actually simulated, below num_of_portfolios when the adaptive simulation stopped early
+        self.samples_used = None
+        # Upper-left efficient envelope of the cloud and the number of portfolios per (return, volatility) bin
+        self.density_bins = density_bins
+        self.persist_cloud = persist_cloud
+        self.frontier_df = None
+        self.frontier_weights = None
+        self.density_df = None
         self.output_dir = output_dir
         self.pkl_filepath = os.path.join(output_dir, PklFileConventions.monte_carlo_pkl_filename)
 
+    @property
+    def streaming(self):
+        return self.chunk_size is not None and self.chunk_size < self.num_of_portfolios
+
     def run_simulation(self, rerun=False):
         """
         Runs the Monte Carlo simulation to generate portfolio weights,
         returns, volatilities, and Sharpe ratios.
         """
 
-        # Check if rerun is required or simulation pickle file exists
-        if not rerun and os.path.exists(self.pkl_filepath):
+        # Check if rerun is required or simulation pickle file exists for the same inputs
+        fingerprint = compute_fingerprint(self.data, self.num_of_portfolios, HeaderConventions.weights_column,
+                                          self.chunk_size if self.streaming else None, self.top_k,
+                                          sorted(self.custom_metrics), self.reservoir_size, self.seed,
+                                          self.sampler, self.weight_bank is not None, self.tolerance, self.patience,
+                                          self.density_bins, self.persist_cloud, self.constraints)
+        cached_simulation = None if rerun else load_data_from_cache(self.pkl_filepath, fingerprint)
+        if cached_simulation is not None:
             logger.info(
                 "Using previous Monte Carlo Simulation for Portfolio Optimization number of portfolios={}".format(
                     self.num_of_portfolios))
-            self.simulations_df = pd.read_pickle(self.pkl_filepath)
+            self.simulations_df = cached_simulation['simulations_df']
+            self.weights = cached_simulation['weights']
+            if self.weights is None:
+                self.weights = self.weight_bank.get_weights()
+            self.reservoir_df = cached_simulation['reservoir_df']
+            self.reservoir_weights = cached_simulation['reservoir_weights']
+            self.convergence_df = cached_simulation['convergence_df']
+            self.samples_used = cached_simulation['samples_used']
+            self.frontier_df = cached_simulation['frontier_df']
+            self.frontier_weights = cached_simulation['frontier_weights']
+            self.density_df = cached_simulation['density_df']
         else:
             logger.info(
-                "Running Monte Carlo Simulation for Portfolio Optimization number of portfolios={}".format(
-                    self.num_of_portfolios))
+                "Running Monte Carlo Simulation for Portfolio Optimization number of portfolios={},seed={}".format(
+                    self.num_of_portfolios, self.seed))
             self._run_simulation_now()
-            self.simulations_df.to_pickle(self.pkl_filepath)
+            logger.info(f"Monte Carlo Simulation used {self.samples_used} portfolios for output_dir={self.output_dir}")
+            stored_simulations_df, stored_weights = self._get_persisted_cloud()
+            save_data_to_cache(self.pkl_filepath, fingerprint,
+                               {'simulations_df': stored_simulations_df, 'weights': stored_weights,
+                                'frontier_df': self.frontier_df, 'frontier_weights': self.frontier_weights,
+                                'density_df': self.density_df,
+                                'reservoir_df': self.reservoir_df, 'reservoir_weights': self.reservoir_weights,
+                                'convergence_df': self.convergence_df, 'samples_used': self.samples_used,
+                                'seed': self.seed})
+
+    def _get_persisted_cloud(self):
+        """simulations_df and weights as stored in the cached pickle."""
+        if self.streaming:
+            # Only the tracked portfolios are in memory
+            return self.simulations_df, self.weights
+        if not self.persist_cloud:
+            rows = set(self.frontier_df.index)
+            for criterion, maximize in self._get_criteria().items():
+                scores = self.simulations_df[criterion].to_numpy()
+                rows.update(np.argsort(-scores if maximize else scores, kind='stable')[:self.top_k].tolist())
+            rows = np.sort(np.fromiter(rows, dtype=np.int64))
+            return self.simulations_df.iloc[rows], np.asarray(self.weights[rows])
+        # The weights of all the portfolios are not duplicated in the window when they are in the weight bank
+        return self.simulations_df, None if self.weight_bank is not None else self.weights
+
+    def _get_envelope_grid(self, annual_mean_returns, annual_covariance):
+        """
+        Bounds of the density grid: the expected return of a long-only portfolio is between the lowest and the
+        highest expected return of the assets, and its volatility is at most the highest volatility of the assets.
+        With short positions, the expected return is between the extremes reachable within the weight bounds and the
+        volatility is at most the sum of the largest absolute weight times the volatility of every asset.
+        """
+        asset_volatilities = np.sqrt(np.diag(annual_covariance))
+        if self.constraints.is_long_only:
+            max_volatility = float(np.nanmax(asset_volatilities))
+            return_range = (float(np.nanmin(annual_mean_returns)), float(np.nanmax(annual_mean_returns)))
+        else:
+            largest_weights = np.maximum(np.abs(self.constraints.lower), np.abs(self.constraints.upper))
+            max_volatility = float(np.nansum(largest_weights * asset_volatilities))
+            return_range = self.constraints.get_return_range(annual_mean_returns)
+        volatility_range = (0.0, max(max_volatility, 1e-12))
+        if return_range[1] <= return_range[0]:
+            return_range = (return_range[0] - 1e-12, return_range[0] + 1e-12)
+        return volatility_range, return_range, self.density_bins
+
+    def _set_envelope(self, envelope):
+        self.frontier_df = envelope.get_frontier_df()
+        self.frontier_weights = envelope.weights
+        self.density_df = envelope.get_density_df()
+
+    def _get_seed_sequences(self, number_of_chunks):
+        """One independent SeedSequence per chunk, or None for every chunk to draw from the global np.random."""
+        if self.seed is None:
+            return [None] * number_of_chunks
+        return np.random.SeedSequence(self.seed).spawn(number_of_chunks)
 
     def _run_simulation_now(self):
-        """Private method to run the Monte Carlo simulation."""
-        all_weights = np.zeros((self.num_of_portfolios, self.number_of_symbols))
-        ret_arr = np.zeros(self.num_of_portfolios)
-        vol_arr = np.zeros(self.num_of_portfolios)
-        sharpe_arr = np.zeros(self.num_of_portfolios)
-        weights_dicts = []
-        # Monte Carlo simulations
-        for ind in tqdm(range(self.num_of_portfolios), desc="Simulating Portfolios", ncols=100):
-            weights = np.random.random(self.number_of_symbols)
-            weights /= np.sum(weights)
-
-            # Store the weights
-            all_weights[ind, :] = weights
-
-            # Create a dictionary for tickers and their weights
-            weights_dict = {self.tickers[i]: weights[i] for i in range(self.number_of_symbols)}
-            weights_dicts.append(weights_dict)  # Store the dictionary in the list
-
-            # Calculate expected return, volatility, and Sharpe ratio
-            ret_arr[ind] = np.sum((self.log_return.mean() * weights) * 252)
-            vol_arr[ind] = np.sqrt(np.dot(weights.T, np.dot(self.log_return.cov() * 252, weights)))
-            sharpe_arr[ind] = ret_arr[ind] / vol_arr[ind]
-
-        weights_df = pd.DataFrame(weights_dicts)
+        """
+        Private method to run the Monte Carlo simulation.
+        Without streaming, all the portfolios are drawn at once as a (num_of_portfolios x number_of_symbols) weight
+        matrix and all of them are kept.
+        """
+        # Annualized statistics of the log returns are the same for every portfolio
+        annual_mean_returns = self.market_data_context.log_mean_returns.values * TRADING_DAYS_PER_YEAR
+        annual_covariance = self.market_data_context.log_sample_covariance.values * TRADING_DAYS_PER_YEAR
+
+        if self.streaming:
+            self._run_streaming_simulation(annual_mean_returns, annual_covariance)
+            return
+
+        if self.n_jobs > 1:
+            logger.warning(f"n_jobs={self.n_jobs} is ignored, the simulation only runs in parallel in streaming mode "
+                           f"(chunk_size smaller than num_of_portfolios)")
+        seed_sequence = self._get_seed_sequences(1)[0]
+        random_state = np.random.default_rng(seed_sequence) if seed_sequence is not None else np.random
+        # Store the weights as a dense array, dictionaries are only built for the selected portfolios
+        if self.weight_bank is not None:
+            self.weights = self.weight_bank.get_weights()
+        else:
+            self.weights = sample_simplex(self.sampler, random_state, self.num_of_portfolios, self.number_of_symbols,
+                                          sobol_seed=get_sobol_seed(self.sampler, self.seed),
+                                          constraints=self.constraints)
         # Create a DataFrame to store the results
-        self.simulations_df = pd.DataFrame({
-            HeaderConventions.expected_annual_return_column: ret_arr,
-            HeaderConventions.annual_volatility_column: vol_arr,
-            HeaderConventions.sharpe_ratio_column: sharpe_arr})
+        metrics = _evaluate_portfolios(self.weights, annual_mean_returns, annual_covariance, self.custom_metrics)
+        self.simulations_df = pd.DataFrame(metrics)
+        envelope = FrontierEnvelopeTracker(*self._get_envelope_grid(annual_mean_returns, annual_covariance))
+        envelope.update(self.weights, metrics)
+        self._set_envelope(envelope)
+
+        self.samples_used = self.num_of_portfolios
+        # Running best portfolios at every power of 2 of the number of portfolios
+        samples = np.unique(np.append(2 ** np.arange(int(np.log2(self.num_of_portfolios)) + 1),
+                                      self.num_of_portfolios))
+        best_sharpe_ratios = np.fmax.accumulate(self.simulations_df[HeaderConventions.sharpe_ratio_column].values)
+        min_volatilities = np.fmin.accumulate(self.simulations_df[HeaderConventions.annual_volatility_column].values)
+        self.convergence_df = self._create_convergence_df(samples, best_sharpe_ratios[samples - 1],
+                                                          min_volatilities[samples - 1])
+
+    @staticmethod
+    def _create_convergence_df(samples, best_sharpe_ratios, min_volatilities):
+        return pd.DataFrame({
+            HeaderConventions.samples_column: samples,
+            HeaderConventions.best_sharpe_ratio_column: best_sharpe_ratios,
+            HeaderConventions.min_annual_volatility_column: min_volatilities})
+
+    def _get_criteria(self):
+        """Criterion -> maximize, for every criterion tracked in streaming mode."""
+        criteria = {HeaderConventions.sharpe_ratio_column: True, HeaderConventions.annual_volatility_column: False}
+        criteria.update({name: maximize for name, (_, maximize) in self.custom_metrics.items()})
+        return criteria
+
+    def _run_streaming_simulation(self, annual_mean_returns, annual_covariance):
+        """
+        Stream the portfolios in chunks of chunk_size, only the top_k portfolios of every criterion and the
+        reservoir sample are kept.
+
+        The chunks are simulated one after another, or on n_jobs worker processes, and their trackers are always
+        merged in chunk order, so the result only depends on the seed and the chunk size. Without a seed, the weights
+        are drawn from the global np.random in the same order as without streaming.
+        """
+        first_positions = list(range(0, self.num_of_portfolios, self.chunk_size))
+        sizes = [min(self.chunk_size, self.num_of_portfolios - first_position) for first_position in first_positions]
+        number_of_chunks = len(first_positions)
+        # The bank is generated here once, the chunks only memory-map it
+        weight_bank_path = None
+        if self.weight_bank is not None:
+            self.weight_bank.get_weights()
+            weight_bank_path = self.weight_bank.path
+        chunk_arguments = (first_positions,
+                           sizes,
+                           self._get_seed_sequences(number_of_chunks),
+                           [self.number_of_symbols] * number_of_chunks,
+                           [annual_mean_returns] * number_of_chunks,
+                           [annual_covariance] * number_of_chunks,
+                           [self.custom_metrics] * number_of_chunks,
+                           [self._get_criteria()] * number_of_chunks,
+                           [self.top_k] * number_of_chunks,
+                           [self.reservoir_size] * number_of_chunks,
+                           [self.sampler] * number_of_chunks,
+                           [get_sobol_seed(self.sampler, self.seed)] * number_of_chunks,
+                           [self.constraints] * number_of_chunks,
+                           [weight_bank_path] * number_of_chunks,
+                           [self._get_envelope_grid(annual_mean_returns, annual_covariance)] * number_of_chunks)
+
+        trackers, reservoir, envelope = None, None, None
+        best_sharpe_ratios, min_volatilities = [], []
+        for chunk_results in self._iterate_chunk_results(list(zip(*chunk_arguments))):
+            trackers, reservoir, envelope = self._merge_chunk(trackers, reservoir, envelope, *chunk_results)
+            best_sharpe_ratios.append(np.nanmax(trackers[HeaderConventions.sharpe_ratio_column].scores))
+            min_volatilities.append(np.nanmin(trackers[HeaderConventions.annual_volatility_column].scores))
+            if self._has_converged(best_sharpe_ratios, min_volatilities):
+                break
+        self._set_envelope(envelope)
+        number_of_chunks_used = len(best_sharpe_ratios)
+        self.samples_used = int(np.sum(sizes[:number_of_chunks_used]))
+        self.convergence_df = self._create_convergence_df(np.cumsum(sizes[:number_of_chunks_used]),
+                                                          best_sharpe_ratios, min_volatilities)
+
+        # simulations_df holds every tracked portfolio once, indexed by its position in the stream
+        positions, rows = np.unique(np.concatenate([tracker.positions for tracker in trackers.values()]),
+                                    return_index=True)
+        tracked_weights = np.concatenate([tracker.weights for tracker in trackers.values()])
+        tracked_metrics = {name: np.concatenate([tracker.metrics[name] for tracker in trackers.values()])
+                           for name in next(iter(trackers.values())).metrics}
+        self.weights = tracked_weights[rows]
+        self.simulations_df = pd.DataFrame({name: values[rows] for name, values in tracked_metrics.items()},
+                                           index=positions)
+        if reservoir:
+            order = np.argsort(reservoir.positions)
+            self.reservoir_weights = reservoir.weights[order]
+            self.reservoir_df = pd.DataFrame({name: values[order] for name, values in reservoir.metrics.items()},
+                                             index=reservoir.positions[order])
+        logger.info(f"Streamed {self.samples_used} of at most {self.num_of_portfolios} portfolios in "
+                    f"{number_of_chunks_used} chunks of {self.chunk_size} on n_jobs={self.n_jobs}, "
+                    f"kept {len(self.simulations_df)} portfolios")
+
+    def _iterate_chunk_results(self, chunks):
+        """
+        Yield the results of the chunks in chunk order, computing them lazily so that the simulation can stop early.
+        In parallel mode, at most 2 * n_jobs chunks are submitted ahead of the one being merged.
+        """
+        if self.n_jobs <= 1:
+            for chunk in chunks:
+                yield _simulate_chunk(*chunk)
+            return
+
+        # The simulation runs in a stage thread next to other stages, spawned workers do not inherit their locks
+        with ProcessPoolExecutor(max_workers=self.n_jobs, mp_context=multiprocessing.get_context('spawn')) as executor:
+            pending_futures = deque()
+            next_chunk = 0
+            try:
+                while next_chunk < len(chunks) or pending_futures:
+                    while next_chunk < len(chunks) and len(pending_futures) < 2 * self.n_jobs:
+                        pending_futures.append(executor.submit(_simulate_chunk, *chunks[next_chunk]))
+                        next_chunk += 1
+                    yield pending_futures.popleft().result()
+            finally:
+                # Chunks submitted ahead are not needed when the simulation stopped early
+                for future in pending_futures:
+                    future.cancel()
 
-        self.simulations_df[HeaderConventions.weights_column] = weights_dicts
+    def _has_converged(self, best_sharpe_ratios, min_volatilities):
+        """
+        Adaptive stopping: the best Sharpe ratio and the min volatility changed by at most tolerance (relative change)
+        over each of the last patience chunks.
+        """
+        if self.tolerance is None or len(best_sharpe_ratios) <= self.patience:
+            return False
+        for values in (best_sharpe_ratios, min_volatilities):
+            recent_values = np.asarray(values[-(self.patience + 1):])
+            relative_changes = np.abs(np.diff(recent_values)) / np.maximum(np.abs(recent_values[:-1]), 1e-12)
+            if not (relative_changes <= self.tolerance).all():
+                return False
+        return True
+
+    @staticmethod
+    def _merge_chunk(trackers, reservoir, envelope, chunk_trackers, chunk_reservoir, chunk_envelope):
+        if trackers is None:
+            return chunk_trackers, chunk_reservoir, chunk_envelope
+        for criterion, tracker in trackers.items():
+            tracker.merge(chunk_trackers[criterion])
+        if reservoir:
+            reservoir.merge(chunk_reservoir)
+        envelope.merge(chunk_envelope)
+        return trackers, reservoir, envelope
+
+    def get_convergence_report(self):
+        """
+        Best Sharpe ratio and min volatility found against the number of simulated portfolios, at every power of 2
+        (or at every chunk in streaming mode), to compare how fast the samplers converge.
+        """
+        if self.convergence_df is None:
+            raise ValueError("Run the simulation first by calling run_simulation().")
+        return self.convergence_df
+
+    def get_frontier_portfolios(self):
+        """
+        Portfolios on the upper-left efficient envelope of the cloud, from the min volatility to the max return, with
+        their weights, e.g. to compare the cloud with the frontier of the optimizers.
+        """
+        if self.frontier_df is None:
+            raise ValueError("Run the simulation first by calling run_simulation().")
+        frontier_portfolios_df = self.frontier_df.copy()
+        frontier_portfolios_df[HeaderConventions.weights_column] = [dict(zip(self.tickers, weights))
+                                                                     for weights in self.frontier_weights]
+        return frontier_portfolios_df
+
+    def get_top_portfolios(self, criterion=HeaderConventions.sharpe_ratio_column, maximize=True, k=None):
+        """The k best portfolios (top_k by default) for a criterion, with their weights, from the best one."""
+        if self.simulations_df is None:
+            raise ValueError("Run the simulation first by calling run_simulation().")
+        k = self.top_k if k is None else k
+        scores = self.simulations_df[criterion].to_numpy()
+        order = np.argsort(-scores if maximize else scores, kind='stable')[:k]
+        top_portfolios_df = self.simulations_df.iloc[order].copy()
+        top_portfolios_df[HeaderConventions.weights_column] = [dict(zip(self.tickers, self.weights[row]))
+                                                                for row in order]
+        return top_portfolios_df
 
     def _get_portfolio_by(self, criterion=HeaderConventions.sharpe_ratio_column, maximize=True):
         """Helper function to retrieve a portfolio by a specific criterion (e.g., max Sharpe or min volatility)."""
@@ -82,13 +466,14 @@ class MonteCarloSimulation:
 
         title: str = None
         if maximize:
-            idx = self.simulations_df[criterion].idxmax()
+            row = self.simulations_df[criterion].reset_index(drop=True).idxmax()
             title = "monte_carlo_max_sharpe_ratio"
         else:
-            idx = self.simulations_df[criterion].idxmin()
+            row = self.simulations_df[criterion].reset_index(drop=True).idxmin()
             title = "monte_carlo_min_annual_volatility"
 
-        selected_portfolio = self.simulations_df.loc[idx].copy()
+        selected_portfolio = self.simulations_df.iloc[row].astype(object)
+        selected_portfolio[HeaderConventions.weights_column] = dict(zip(self.tickers, self.weights[row]))
         selected_portfolio[HeaderConventions.expected_return_column] = title
         selected_portfolio[HeaderConventions.risk_model_column] = title
         selected_portfolio[HeaderConventions.optimizer_column] = title
@@ -109,12 +494,32 @@ class MonteCarloSimulation:
 
 
 @ExecutionTimeRecorder(module_name=__name__)
-def run_monte_carlo_simulation(output_dir, data):
+def run_monte_carlo_simulation(output_dir, data, market_data_context=None):
     """
     Run the Monte Carlo simulation and append the results to the results DataFrame.
+    The simulation parameters (number of portfolios, streaming chunk size, ...) come from config.yaml.
     """
+    module_name = os.path.basename(os.path.dirname(__file__))
+    monte_carlo_cfg = load_config(module_name).monte_carlo
+    weight_bank_dir = Path(output_dir).parent / PklFileConventions.weight_bank_dirname \
+        if monte_carlo_cfg.weight_bank else None
     monte_carlo_df = pd.DataFrame()
-    monte_carlo_simulation = MonteCarloSimulation(data, output_dir)
+    monte_carlo_simulation = MonteCarloSimulation(data, output_dir,
+                                                  num_of_portfolios=monte_carlo_cfg.num_of_portfolios,
+                                                  market_data_context=market_data_context,
+                                                  chunk_size=monte_carlo_cfg.chunk_size,
+                                                  top_k=monte_carlo_cfg.top_k,
+                                                  reservoir_size=monte_carlo_cfg.reservoir_size,
+                                                  seed=monte_carlo_cfg.seed,
+                                                  n_jobs=monte_carlo_cfg.n_jobs,
+                                                  sampler=monte_carlo_cfg.sampler,
+                                                  weight_bank_dir=weight_bank_dir,
+                                                  tolerance=monte_carlo_cfg.tolerance,
+                                                  patience=monte_carlo_cfg.patience,
+                                                  density_bins=monte_carlo_cfg.density_bins,
+                                                  persist_cloud=monte_carlo_cfg.persist_cloud,
+                                                  weight_bounds=OmegaConf.to_object(monte_carlo_cfg.weight_bounds),
+                                                  cardinality=monte_carlo_cfg.cardinality)
     max_sharpe_ratio, min_volatility = monte_carlo_simulation.run_monte_carlo_simulation()
     monte_carlo_df = pd.concat([monte_carlo_df, max_sharpe_ratio], ignore_index=True)
     monte_carlo_df = pd.concat([monte_carlo_df, min_volatility], ignore_index=True)
@@ -0,0 +1,66 @@
+import numpy as np
+
+
+class PortfolioTopKTracker:
+    """
+    Keep the k best portfolios seen so far for one score, while portfolios are streamed chunk by chunk.
+
+    Every chunk is first reduced to its own k best portfolios with `np.argpartition` and then merged with the
+    current k best ones, so memory only depends on k and not on the number of simulated portfolios.
+    Along with the score, the tracker keeps the position of every portfolio in the stream, its weights and all
+    of its metrics.
+    """
+
+    def __init__(self, k, maximize=True):
+        if k < 1:
+            raise ValueError(f"k must be at least 1, got k={k}")
+        self.k = k
+        self.maximize = maximize
+        self.scores = np.empty(0)
+        self.positions = np.empty(0, dtype=np.int64)
+        self.weights = None
+        self.metrics = {}
+
+    def _best(self, scores, k):
+        """Positions of the k best scores, NaN scores are never selected before a valid one."""
+        keys = -scores if self.maximize else scores
+        keys = np.where(np.isnan(keys), np.inf, keys)
+        if k >= len(keys):
+            return np.arange(len(keys))
+        return np.argpartition(keys, k - 1)[:k]
+
+    def update(self, scores, weights, metrics, first_position=0):
+        """
+        Merge a chunk of portfolios.
+
+        :param scores: (chunk,) array with the score to rank the portfolios by.
+        :param weights: (chunk, assets) array with the weights of the portfolios.
+        :param metrics: Dictionary of (chunk,) arrays with the metrics of the portfolios.
+        :param first_position: Position of the first portfolio of the chunk in the whole stream.
+        """
+        best = self._best(scores, self.k)
+        self._merge(scores[best], first_position + best, weights[best],
+                    {name: values[best] for name, values in metrics.items()})
+
+    def merge(self, other):
+        """Merge the portfolios tracked by another tracker of the same score, e.g. the tracker of a worker."""
+        if other.weights is not None:
+            self._merge(other.scores, other.positions, other.weights, other.metrics)
+
+    def _merge(self, scores, positions, weights, metrics):
+        if self.weights is not None:
+            scores = np.concatenate([self.scores, scores])
+            positions = np.concatenate([self.positions, positions])
+            weights = np.concatenate([self.weights, weights])
+            metrics = {name: np.concatenate([self.metrics[name], values]) for name, values in metrics.items()}
+
+        keep = self._best(scores, self.k)
+        self.scores = scores[keep]
+        self.positions = positions[keep]
+        self.weights = weights[keep]
+        self.metrics = {name: values[keep] for name, values in metrics.items()}
+
+    def sorted_order(self):
+        """Order of the tracked portfolios from the best to the worst score."""
+        keys = -self.scores if self.maximize else self.scores
+        return np.argsort(np.where(np.isnan(keys), np.inf, keys), kind='stable')
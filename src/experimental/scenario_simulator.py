@@ -0,0 +1,197 @@
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.common.conventions import HeaderConventions, PklFileConventions
+from src.common.execution_time_recorder import ExecutionTimeRecorder
+from src.common.hydra_config_loader import load_config
+from src.common.market_data_context import MarketDataContext, TRADING_DAYS_PER_YEAR
+from src.common.utils import compute_fingerprint, load_data_from_cache, save_data_to_cache
+
+logger = logging.getLogger(__name__)
+
+GBM_METHOD = 'gbm'
+BLOCK_BOOTSTRAP_METHOD = 'block_bootstrap'
+SCENARIO_METHODS = (GBM_METHOD, BLOCK_BOOTSTRAP_METHOD)
+SCENARIO_METRIC_COLUMNS = [HeaderConventions.expected_terminal_wealth_column,
+                           HeaderConventions.median_terminal_wealth_column,
+                           HeaderConventions.value_at_risk_column,
+                           HeaderConventions.conditional_value_at_risk_column,
+                           HeaderConventions.expected_max_drawdown_column,
+                           HeaderConventions.tail_max_drawdown_column]
+
+
+def cholesky_factor(covariance, epsilon=1e-10):
+    """
+    Lower triangular factor L of the covariance (L @ L.T = covariance). A covariance that is not positive definite is
+    repaired by clipping its eigenvalues at epsilon.
+    """
+    try:
+        return np.linalg.cholesky(covariance)
+    except np.linalg.LinAlgError:
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        repaired_covariance = (eigenvectors * np.clip(eigenvalues, epsilon, None)) @ eigenvectors.T
+        return np.linalg.cholesky((repaired_covariance + repaired_covariance.T) / 2)
+
+
+def stationary_bootstrap_indices(rng, number_of_observations, num_of_scenarios, horizon, block_size):
+    """
+    Indices of the historical days of every (scenario, day), drawn with the stationary block bootstrap of Politis and
+    Romano: every day starts a new block at a random day with probability 1 / block_size, otherwise it continues the
+    block with the next historical day (wrapping around), so the blocks have a geometric length of mean block_size.
+    """
+    new_block = rng.random((num_of_scenarios, horizon)) < 1.0 / block_size
+    new_block[:, 0] = True
+    block_starts = rng.integers(0, number_of_observations, size=(num_of_scenarios, horizon))
+    days = np.arange(horizon)
+    # Day at which the block of every (scenario, day) started
+    block_start_days = np.maximum.accumulate(np.where(new_block, days, 0), axis=1)
+    start_indices = np.take_along_axis(block_starts, block_start_days, axis=1)
+    return (start_indices + days - block_start_days) % number_of_observations
+
+
+class ScenarioSimulator:
+    """
+    Simulate forward daily return paths of the assets of a window and evaluate portfolios against them.
+
+    - `gbm`: geometric Brownian motion, the daily log returns are drawn from a normal distribution with the historical
+      mean and covariance of the log returns, correlated with the Cholesky factor of the covariance.
+    - `block_bootstrap`: stationary block bootstrap of the historical daily returns, which keeps their fat tails,
+      volatility clustering and cross-sectional dependence.
+
+    The portfolios are evaluated as buy and hold portfolios in one batched tensor operation per chunk of portfolios:
+    the wealth paths are `cumprod(1 + returns) @ weights.T` for all the scenarios and portfolios of the chunk.
+    """
+
+    def __init__(self, data, num_of_scenarios=1000, horizon=TRADING_DAYS_PER_YEAR, method=GBM_METHOD, block_size=20,
+                 seed=None, confidence_level=0.95, portfolio_chunk_size=32, market_data_context=None):
+        if method not in SCENARIO_METHODS:
+            raise ValueError(f"Unknown method=`{method}`, supported methods are {SCENARIO_METHODS}")
+        self.tickers = data.columns
+        self.data = data
+        self.num_of_scenarios = num_of_scenarios
+        self.horizon = horizon
+        self.method = method
+        self.block_size = block_size
+        self.seed = seed
+        self.confidence_level = confidence_level
+        self.portfolio_chunk_size = portfolio_chunk_size
+        self.market_data_context = market_data_context if market_data_context is not None else MarketDataContext(data)
+        self.asset_growth = None
+        # (scenarios x portfolios) terminal wealth of every evaluated portfolio for an initial wealth of 1
+        self.terminal_wealth = None
+
+    def simulate_returns(self):
+        """(scenarios x horizon x assets) daily simple returns."""
+        rng = np.random.default_rng(self.seed)
+        if self.method == GBM_METHOD:
+            log_mean_returns = self.market_data_context.log_mean_returns.to_numpy()
+            factor = cholesky_factor(self.market_data_context.log_sample_covariance.to_numpy())
+            shocks = rng.standard_normal((self.num_of_scenarios, self.horizon, len(self.tickers)))
+            return np.expm1(log_mean_returns + shocks @ factor.T)
+
+        historical_returns = self.market_data_context.simple_returns.to_numpy()
+        indices = stationary_bootstrap_indices(rng, len(historical_returns), self.num_of_scenarios, self.horizon,
+                                               self.block_size)
+        return historical_returns[indices]
+
+    def _get_asset_growth(self):
+        """(scenarios x horizon x assets) growth of 1 invested in every asset, simulated once."""
+        if self.asset_growth is None:
+            self.asset_growth = np.cumprod(1 + self.simulate_returns(), axis=1)
+        return self.asset_growth
+
+    def evaluate_portfolios(self, weights):
+        """
+        Evaluate the portfolios (rows of the (portfolios x assets) weights) against the simulated paths.
+
+        :return: DataFrame with one row per portfolio: expected and median terminal wealth, value at risk and
+                 conditional value at risk of the terminal return, expected and tail max drawdown.
+        """
+        weights = np.asarray(weights, dtype=float)
+        asset_growth = self._get_asset_growth()
+        tail_probability = 1 - self.confidence_level
+        terminal_wealth = np.empty((self.num_of_scenarios, len(weights)))
+        max_drawdowns = np.empty((self.num_of_scenarios, len(weights)))
+        for first_portfolio in range(0, len(weights), self.portfolio_chunk_size):
+            chunk = slice(first_portfolio, first_portfolio + self.portfolio_chunk_size)
+            # (scenarios x horizon x portfolios) wealth paths of the chunk, starting from a wealth of 1
+            wealth = asset_growth @ weights[chunk].T
+            terminal_wealth[:, chunk] = wealth[:, -1, :]
+            running_peaks = np.maximum(np.maximum.accumulate(wealth, axis=1), 1.0)
+            max_drawdowns[:, chunk] = (1 - wealth / running_peaks).max(axis=1)
+        self.terminal_wealth = terminal_wealth
+
+        terminal_returns = terminal_wealth - 1
+        value_at_risk = -np.quantile(terminal_returns, tail_probability, axis=0)
+        tail = terminal_returns <= -value_at_risk
+        conditional_value_at_risk = -(np.where(tail, terminal_returns, 0).sum(axis=0) / tail.sum(axis=0))
+        return pd.DataFrame({
+            HeaderConventions.expected_terminal_wealth_column: terminal_wealth.mean(axis=0),
+            HeaderConventions.median_terminal_wealth_column: np.median(terminal_wealth, axis=0),
+            HeaderConventions.value_at_risk_column: value_at_risk,
+            HeaderConventions.conditional_value_at_risk_column: conditional_value_at_risk,
+            HeaderConventions.expected_max_drawdown_column: max_drawdowns.mean(axis=0),
+            HeaderConventions.tail_max_drawdown_column: np.quantile(max_drawdowns, self.confidence_level, axis=0)})
+
+    def get_weights_matrix(self, portfolios_df):
+        """
+        (portfolios x assets) weights of the Weights column, aligned to the tickers of the data. A missing ticker has a
+        weight of 0, a row without a weights dictionary (e.g. a failed optimization) is a row of NaN.
+        """
+        weights = np.full((len(portfolios_df), len(self.tickers)), np.nan)
+        ticker_positions = {ticker: position for position, ticker in enumerate(self.tickers)}
+        for row, portfolio_weights in enumerate(portfolios_df[HeaderConventions.weights_column]):
+            if isinstance(portfolio_weights, dict):
+                weights[row] = 0.0
+                for ticker, weight in portfolio_weights.items():
+                    if ticker in ticker_positions and weight is not None:
+                        weights[row, ticker_positions[ticker]] = weight
+        return weights
+
+    def evaluate_optimized_portfolios(self, all_optimized_df):
+        """Scenario metrics of every portfolio of all_optimized_df, next to its return, risk and optimizer type."""
+        weights = self.get_weights_matrix(all_optimized_df)
+        valid = ~np.isnan(weights).any(axis=1)
+        metrics_df = pd.DataFrame(np.nan, index=all_optimized_df.index, columns=SCENARIO_METRIC_COLUMNS)
+        if valid.any():
+            metrics_df.loc[valid] = self.evaluate_portfolios(weights[valid]).to_numpy()
+        id_columns = [HeaderConventions.expected_return_column, HeaderConventions.risk_model_column,
+                      HeaderConventions.optimizer_column]
+        return pd.concat([all_optimized_df[id_columns].astype(str), metrics_df], axis=1)
+
+
+@ExecutionTimeRecorder(module_name=__name__)
+def run_scenario_simulation(output_dir, data, all_optimized_df, market_data_context=None):
+    """
+    Evaluate all the optimized portfolios of the window against simulated forward paths, when enabled in the
+    `scenario_simulation` section of config.yaml. Returns None when disabled.
+    """
+    module_name = os.path.basename(os.path.dirname(__file__))
+    scenario_cfg = load_config(module_name).scenario_simulation
+    if not scenario_cfg.enabled:
+        return None
+
+    pkl_filepath = os.path.join(output_dir, PklFileConventions.scenario_metrics_pkl_filename)
+    fingerprint = compute_fingerprint(data, all_optimized_df, dict(scenario_cfg))
+    scenario_metrics_df = load_data_from_cache(pkl_filepath, fingerprint)
+    if scenario_metrics_df is not None:
+        logger.info(f"Using previous scenario simulation from {pkl_filepath}")
+        return scenario_metrics_df
+
+    logger.info(f"Simulating {scenario_cfg.num_of_scenarios} scenarios with method={scenario_cfg.method} "
+                f"for {len(all_optimized_df)} portfolios in output_dir={output_dir}")
+    scenario_simulator = ScenarioSimulator(data,
+                                           num_of_scenarios=scenario_cfg.num_of_scenarios,
+                                           horizon=scenario_cfg.horizon,
+                                           method=scenario_cfg.method,
+                                           block_size=scenario_cfg.block_size,
+                                           seed=scenario_cfg.seed,
+                                           confidence_level=scenario_cfg.confidence_level,
+                                           portfolio_chunk_size=scenario_cfg.portfolio_chunk_size,
+                                           market_data_context=market_data_context)
+    scenario_metrics_df = scenario_simulator.evaluate_optimized_portfolios(all_optimized_df)
+    save_data_to_cache(pkl_filepath, fingerprint, scenario_metrics_df)
+    return scenario_metrics_df
@@ -0,0 +1,155 @@
+import warnings
+
+import numpy as np
+from scipy.stats import qmc
+
+UNIFORM_SAMPLER = 'uniform'
+DIRICHLET_SAMPLER = 'dirichlet'
+SOBOL_SAMPLER = 'sobol'
+SIMPLEX_SAMPLERS = (UNIFORM_SAMPLER, DIRICHLET_SAMPLER, SOBOL_SAMPLER)
+
+
+def get_sobol_seed(sampler, seed):
+    """
+    Scrambling seed of the Sobol sequence, shared by all the chunks so that they continue the same sequence.
+    It is derived from the seed, without a seed it is drawn from the global np.random.
+    """
+    if sampler != SOBOL_SAMPLER:
+        return None
+    if seed is None:
+        return np.random.randint(2 ** 31 - 1)
+    return int(np.random.SeedSequence(seed).generate_state(1)[0])
+
+
+class SimplexConstraints:
+    """
+    Bounds and cardinality of the sampled portfolios, the same weight_bounds as the pypfopt optimizers: one
+    (lower, upper) pair for all the assets or one pair per asset. With a cardinality, every portfolio holds exactly
+    cardinality assets and the bounds apply to the held assets, the other ones have a weight of 0.
+
+    The constraints are applied to weights already drawn on the simplex, without rejection, so the cost does not
+    depend on how tight they are:
+
+    - cardinality: a random subset of assets per portfolio (the cardinality smallest of uniform keys, with
+      `np.argpartition`), the weights of the other assets are set to 0 and every row is normalized again.
+    - bounds: the weights are mapped onto `lower + (1 - sum(lower)) * weights`, which meets the lower bounds, then the
+      weight above the upper bounds is capped and redistributed proportionally to the room left below the upper
+      bounds. The room left is at least the capped weight whenever `sum(upper) >= 1`, so one pass is enough.
+    """
+
+    def __init__(self, number_of_symbols, weight_bounds=(0, 1), cardinality=None):
+        bounds = np.asarray(weight_bounds, dtype=float)
+        if bounds.shape == (2,):
+            bounds = np.tile(bounds, (number_of_symbols, 1))
+        if bounds.shape != (number_of_symbols, 2):
+            raise ValueError(f"weight_bounds={weight_bounds} must be one (lower, upper) pair or one pair per asset "
+                             f"for {number_of_symbols} assets")
+        self.lower = bounds[:, 0]
+        self.upper = bounds[:, 1]
+        if cardinality is not None and not 1 <= cardinality <= number_of_symbols:
+            raise ValueError(f"cardinality={cardinality} must be between 1 and the number of assets "
+                             f"{number_of_symbols}")
+        self.cardinality = cardinality if cardinality is not None and cardinality < number_of_symbols else None
+        self._check_feasibility()
+
+    def _check_feasibility(self):
+        """Every subset of held assets must admit weights summing to 1 within the bounds."""
+        if (self.lower > self.upper).any():
+            raise ValueError(f"Lower bounds={self.lower} above the upper bounds={self.upper}")
+        held_assets = self.cardinality or len(self.lower)
+        # The worst subsets hold the assets with the largest lower bounds or with the smallest upper bounds
+        if np.sort(self.lower)[::-1][:held_assets].sum() > 1 or np.sort(self.upper)[:held_assets].sum() < 1:
+            raise ValueError(f"weight_bounds lower={self.lower}, upper={self.upper} with cardinality="
+                             f"{self.cardinality} cannot be met by weights summing to 1")
+
+    @property
+    def is_long_only(self):
+        return bool((self.lower >= 0).all())
+
+    @property
+    def is_unconstrained(self):
+        """The long-only simplex already meets the constraints."""
+        return self.cardinality is None and bool((self.lower == 0).all() and (self.upper >= 1).all())
+
+    def apply(self, weights, random_state):
+        """Map the (portfolios x assets) weights on the simplex onto the constrained set, in place when possible."""
+        if self.is_unconstrained:
+            return weights
+        lower = np.broadcast_to(self.lower, weights.shape)
+        upper = np.broadcast_to(self.upper, weights.shape)
+        held = np.ones(weights.shape, dtype=bool)
+        if self.cardinality is not None:
+            keys = random_state.random(weights.shape)
+            held_assets = np.argpartition(keys, self.cardinality - 1, axis=1)[:, :self.cardinality]
+            held = np.zeros(weights.shape, dtype=bool)
+            np.put_along_axis(held, held_assets, True, axis=1)
+            weights = np.where(held, weights, 0.0)
+            weights /= weights.sum(axis=1, keepdims=True)
+            lower = np.where(held, lower, 0.0)
+            upper = np.where(held, upper, 0.0)
+
+        weights = lower + (1 - lower.sum(axis=1, keepdims=True)) * weights
+        excess = np.maximum(weights - upper, 0.0).sum(axis=1, keepdims=True)
+        weights = np.minimum(weights, upper)
+        room = np.where(held, upper - weights, 0.0)
+        total_room = room.sum(axis=1, keepdims=True)
+        weights += excess * np.divide(room, total_room, out=np.zeros_like(room), where=total_room > 0)
+        return weights
+
+    def get_return_range(self, mean_returns):
+        """
+        Lowest and highest expected return of a portfolio within the bounds: start from the lower bounds and fill the
+        rest of the budget up to the upper bounds, from the highest (or lowest) expected return.
+        """
+        extremes = []
+        for order in (np.argsort(mean_returns), np.argsort(mean_returns)[::-1]):
+            weights = self.lower.copy()
+            budget = 1 - weights.sum()
+            for asset in order:
+                added = min(self.upper[asset] - self.lower[asset], budget)
+                weights[asset] += added
+                budget -= added
+            extremes.append(float(weights @ mean_returns))
+        return extremes[0], extremes[1]
+
+    def __repr__(self):
+        # Part of the fingerprint of the cached simulations
+        return f"SimplexConstraints(lower={self.lower.tolist()}, upper={self.upper.tolist()}, " \
+               f"cardinality={self.cardinality})"
+
+
+def sample_simplex(sampler, random_state, num_of_portfolios, number_of_symbols, first_position=0, sobol_seed=None,
+                   constraints=None):
+    """
+    Draw long-only weights (one portfolio per row, every row sums to 1).
+
+    - `uniform`: uniform numbers normalized by their sum, the historical sampler. It is not uniform on the simplex,
+      the portfolios concentrate around the equal weights portfolio.
+    - `dirichlet`: flat Dirichlet, i.e. uniform on the simplex, from normalized exponential numbers.
+    - `sobol`: scrambled Sobol points mapped onto the simplex with the same exponential transform, the points are
+      low discrepancy so the simplex is covered more evenly than with random points. The sequence is defined by
+      sobol_seed and the chunk starting at first_position continues it, so chunks give the same points as one run.
+
+    :param random_state: `numpy.random.Generator` or the global `np.random`, used by `uniform` and `dirichlet`, and
+                         to draw the held assets of every portfolio under a cardinality constraint.
+    :param constraints: Optional `SimplexConstraints` the weights are mapped onto.
+    """
+    if sampler == UNIFORM_SAMPLER:
+        weights = random_state.random((num_of_portfolios, number_of_symbols))
+    elif sampler == DIRICHLET_SAMPLER:
+        weights = -np.log1p(-random_state.random((num_of_portfolios, number_of_symbols)))
+    elif sampler == SOBOL_SAMPLER:
+        sobol = qmc.Sobol(d=number_of_symbols, scramble=True, seed=sobol_seed)
+        with warnings.catch_warnings():
+            # Chunks are not powers of 2, the balance of the whole sequence is kept by fast forwarding
+            warnings.simplefilter('ignore', UserWarning)
+            if first_position:
+                sobol.fast_forward(first_position)
+            points = sobol.random(num_of_portfolios)
+        weights = -np.log1p(-points)
+    else:
+        raise ValueError(f"Unknown sampler=`{sampler}`, supported samplers are {SIMPLEX_SAMPLERS}")
+    weights /= weights.sum(axis=1, keepdims=True)
+    if constraints is not None:
+        weights = constraints.apply(weights, random_state)
+    return weights
@@ -1,4 +1,5 @@
 import os
+import shutil
 import unittest
 import pandas as pd
 import numpy as np
@@ -36,6 +37,172 @@ class TestMonteCarloSimulation(unittest.TestCase):
         self.assertTrue(os.path.exists(simulation.pkl_filepath))
         self.assertGreater(len(simulation.simulations_df), 0)
 
+    def test_simulation_matches_portfolio_by_portfolio_calculation(self):
+        # Test the batched returns and volatilities against a direct calculation for a few portfolios
+        simulation = MonteCarloSimulation(self.data.abs() + 1, self.test_output_dir, num_of_portfolios=1000)
+        simulation.run_simulation(rerun=True)
+        self.assertEqual(simulation.weights.shape, (1000, 3))
+        np.testing.assert_allclose(simulation.weights.sum(axis=1), 1.0)
+
+        log_return = np.log(1 + (self.data.abs() + 1).pct_change())
+        for ind in (0, 500, 999):
+            weights = simulation.weights[ind]
+            expected_return = np.sum(log_return.mean() * weights * 252)
+            volatility = np.sqrt(np.dot(weights.T, np.dot(log_return.cov() * 252, weights)))
+            row = simulation.simulations_df.iloc[ind]
+            self.assertAlmostEqual(row[HeaderConventions.expected_annual_return_column], expected_return)
+            self.assertAlmostEqual(row[HeaderConventions.annual_volatility_column], volatility)
+
+    def test_streaming_simulation_keeps_the_same_best_portfolios(self):
+        # Test that streaming in chunks selects the same portfolios as keeping every portfolio in memory
+        data = self.data.abs() + 1
+        np.random.seed(7)
+        simulation = MonteCarloSimulation(data, self.test_output_dir, num_of_portfolios=5000)
+        simulation.run_simulation(rerun=True)
+        np.random.seed(7)
+        streaming_simulation = MonteCarloSimulation(data, self.test_output_dir, num_of_portfolios=5000,
+                                                    chunk_size=300, top_k=3, reservoir_size=100)
+        streaming_simulation.run_simulation(rerun=True)
+
+        self.assertLessEqual(len(streaming_simulation.simulations_df), 6)
+        self.assertEqual(streaming_simulation.reservoir_weights.shape, (100, 3))
+        pd.testing.assert_frame_equal(simulation.get_max_sharpe_ratio(), streaming_simulation.get_max_sharpe_ratio())
+        pd.testing.assert_frame_equal(simulation.get_min_volatility(), streaming_simulation.get_min_volatility())
+        np.testing.assert_allclose(
+            simulation.get_top_portfolios(k=3)[HeaderConventions.sharpe_ratio_column].to_numpy(dtype=float),
+            streaming_simulation.get_top_portfolios()[HeaderConventions.sharpe_ratio_column].to_numpy(dtype=float))
+
+    def test_parallel_simulation_is_reproducible(self):
+        # Test that a seeded simulation gives the same results whatever the number of worker processes
+        data = self.data.abs() + 1
+        simulations = [MonteCarloSimulation(data, self.test_output_dir, num_of_portfolios=4000, chunk_size=500,
+                                            top_k=3, reservoir_size=50, seed=2024, n_jobs=n_jobs)
+                       for n_jobs in (1, 2)]
+        for simulation in simulations:
+            simulation.run_simulation(rerun=True)
+
+        pd.testing.assert_frame_equal(simulations[0].simulations_df, simulations[1].simulations_df)
+        np.testing.assert_array_equal(simulations[0].weights, simulations[1].weights)
+        np.testing.assert_array_equal(simulations[0].reservoir_weights, simulations[1].reservoir_weights)
+
+    def test_samplers_and_convergence_report(self):
+        # Test that every sampler draws long-only weights on the simplex and reports a monotone convergence
+        data = self.data.abs() + 1
+        for sampler in ("uniform", "dirichlet", "sobol"):
+            simulation = MonteCarloSimulation(data, self.test_output_dir, num_of_portfolios=1024, seed=3,
+                                              sampler=sampler)
+            simulation.run_simulation(rerun=True)
+            self.assertTrue((simulation.weights >= 0).all())
+            np.testing.assert_allclose(simulation.weights.sum(axis=1), 1.0)
+            report = simulation.get_convergence_report()
+            self.assertEqual(report[HeaderConventions.samples_column].iloc[-1], 1024)
+            self.assertTrue(report[HeaderConventions.best_sharpe_ratio_column].is_monotonic_increasing)
+
+        # Sobol chunks continue the same sequence, streaming finds the same best portfolio
+        streaming_simulation = MonteCarloSimulation(data, self.test_output_dir, num_of_portfolios=1024, seed=3,
+                                                    sampler="sobol", chunk_size=100)
+        streaming_simulation.run_simulation(rerun=True)
+        pd.testing.assert_frame_equal(simulation.get_max_sharpe_ratio(), streaming_simulation.get_max_sharpe_ratio())
+
+        with self.assertRaises(ValueError):
+            MonteCarloSimulation(data, self.test_output_dir, sampler="halton")
+
+    def test_weight_bank_is_shared_across_windows(self):
+        # Test that two windows with the same tickers read the same memory-mapped weights from the bank
+        data = self.data.abs() + 1
+        bank_dir = os.path.join(self.test_output_dir, "weight_bank")
+        try:
+            windows = [MonteCarloSimulation(window_data, self.test_output_dir, num_of_portfolios=2000, seed=11,
+                                            weight_bank_dir=bank_dir) for window_data in (data.iloc[:60], data)]
+            for simulation in windows:
+                simulation.run_simulation(rerun=True)
+
+            self.assertEqual(len(os.listdir(bank_dir)), 1)
+            self.assertIsInstance(windows[0].weights, np.memmap)
+            np.testing.assert_array_equal(windows[0].weights, windows[1].weights)
+
+            # Streaming over the bank selects the same portfolio as evaluating the whole bank
+            streaming_simulation = MonteCarloSimulation(data, self.test_output_dir, num_of_portfolios=2000, seed=11,
+                                                        weight_bank_dir=bank_dir, chunk_size=300)
+            streaming_simulation.run_simulation(rerun=True)
+            pd.testing.assert_frame_equal(windows[1].get_max_sharpe_ratio(),
+                                          streaming_simulation.get_max_sharpe_ratio())
+        finally:
+            shutil.rmtree(bank_dir, ignore_errors=True)
+
+    def test_adaptive_simulation_stops_when_stable(self):
+        # Test that the adaptive simulation stops before the hard cap and reports the portfolios it used
+        data = self.data.abs() + 1
+        simulation = MonteCarloSimulation(data, self.test_output_dir, num_of_portfolios=100000, chunk_size=1000,
+                                          seed=5, tolerance=1e-2, patience=2)
+        simulation.run_simulation(rerun=True)
+        self.assertLess(simulation.samples_used, 100000)
+        self.assertEqual(simulation.samples_used % 1000, 0)
+        self.assertEqual(simulation.get_convergence_report()[HeaderConventions.samples_column].iloc[-1],
+                         simulation.samples_used)
+
+        # Without tolerance every portfolio is simulated
+        simulation = MonteCarloSimulation(data, self.test_output_dir, num_of_portfolios=3000, seed=5)
+        simulation.run_simulation(rerun=True)
+        self.assertEqual(simulation.samples_used, 3000)
+
+    def test_frontier_envelope_and_density(self):
+        # Test that the envelope bounds the cloud from above and that only it is persisted without the cloud
+        data = self.data.abs() + 1
+        np.random.seed(9)
+        simulation = MonteCarloSimulation(data, self.test_output_dir, num_of_portfolios=5000, density_bins=20)
+        simulation.run_simulation(rerun=True)
+        frontier_df = simulation.frontier_df
+        volatilities = frontier_df[HeaderConventions.annual_volatility_column].to_numpy()
+        returns = frontier_df[HeaderConventions.expected_annual_return_column].to_numpy()
+        self.assertTrue((np.diff(volatilities) > 0).all() and (np.diff(returns) > 0).all())
+        cloud_volatilities = simulation.simulations_df[HeaderConventions.annual_volatility_column].to_numpy()
+        cloud_returns = simulation.simulations_df[HeaderConventions.expected_annual_return_column].to_numpy()
+        inside = cloud_volatilities <= volatilities[-1]
+        self.assertTrue((cloud_returns[inside] <= np.interp(cloud_volatilities[inside], volatilities, returns)
+                         + 1e-12).all())
+        self.assertEqual(simulation.density_df.to_numpy().sum(), 5000)
+        self.assertEqual(simulation.density_df.shape, (20, 20))
+
+        # Streaming gives the same envelope and density
+        np.random.seed(9)
+        streaming_simulation = MonteCarloSimulation(data, self.test_output_dir, num_of_portfolios=5000,
+                                                    density_bins=20, chunk_size=700, persist_cloud=False)
+        streaming_simulation.run_simulation(rerun=True)
+        pd.testing.assert_frame_equal(frontier_df, streaming_simulation.frontier_df)
+        pd.testing.assert_frame_equal(simulation.density_df, streaming_simulation.density_df)
+
+        # Without the cloud, the pickle only holds the best and the envelope portfolios
+        simulation = MonteCarloSimulation(data, self.test_output_dir, num_of_portfolios=5000, density_bins=20,
+                                          seed=1, persist_cloud=False)
+        simulation.run_simulation(rerun=True)
+        cached_simulation = MonteCarloSimulation(data, self.test_output_dir, num_of_portfolios=5000, density_bins=20,
+                                                 seed=1, persist_cloud=False)
+        cached_simulation.run_simulation()
+        self.assertLessEqual(len(cached_simulation.simulations_df), len(simulation.frontier_df) + 2)
+        pd.testing.assert_frame_equal(simulation.get_max_sharpe_ratio(), cached_simulation.get_max_sharpe_ratio())
+        pd.testing.assert_frame_equal(simulation.get_min_volatility(), cached_simulation.get_min_volatility())
+
+    def test_constrained_sampling(self):
+        # Test that the bounds and the cardinality are met by every portfolio, without rejection
+        data = self.data.abs() + 1
+        for weight_bounds, cardinality in (((-1, 1), None), ((0.1, 0.5), None), ((0, 0.6), 2)):
+            simulation = MonteCarloSimulation(data, self.test_output_dir, num_of_portfolios=2000, seed=3,
+                                              weight_bounds=weight_bounds, cardinality=cardinality)
+            simulation.run_simulation(rerun=True)
+            weights = simulation.weights
+            np.testing.assert_allclose(weights.sum(axis=1), 1.0)
+            held = weights != 0
+            self.assertTrue((weights[held] >= weight_bounds[0] - 1e-12).all())
+            self.assertTrue((weights <= weight_bounds[1] + 1e-12).all())
+            self.assertTrue((held.sum(axis=1) == (cardinality or 3)).all())
+            self.assertEqual(simulation.density_df.to_numpy().sum(), 2000)
+
+        with self.assertRaises(ValueError):
+            MonteCarloSimulation(data, self.test_output_dir, weight_bounds=(0, 0.3))
+        with self.assertRaises(ValueError):
+            MonteCarloSimulation(data, self.test_output_dir, weight_bounds=(0, 0.6), cardinality=1)
+
     def test_max_sharpe_ratio(self):
         # Test retrieving the max Sharpe ratio portfolio
         simulation = MonteCarloSimulation(self.data, self.test_output_dir, num_of_portfolios=1000)
@@ -43,6 +210,7 @@ class TestMonteCarloSimulation(unittest.TestCase):
         max_sharpe_portfolio = simulation.get_max_sharpe_ratio()
         self.assertIn(HeaderConventions.sharpe_ratio_column, max_sharpe_portfolio.columns)
         self.assertEqual(len(max_sharpe_portfolio), 1)
+        self.assertEqual(set(max_sharpe_portfolio[HeaderConventions.weights_column].iloc[0]), set(self.data.columns))
 
     def test_min_volatility(self):
         # Test retrieving the min volatility portfolio
@@ -0,0 +1,52 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from src.common.conventions import HeaderConventions
+from src.experimental.scenario_simulator import ScenarioSimulator, stationary_bootstrap_indices
+
+
+class TestScenarioSimulator(unittest.TestCase):
+    def setUp(self):
+        # Generate synthetic prices for testing
+        np.random.seed(42)
+        self.data = pd.DataFrame(100 * np.exp(np.cumsum(0.01 * np.random.randn(300, 3), axis=0)),
+                                 columns=["StockA", "StockB", "StockC"])
+        self.optimized_df = pd.DataFrame({
+            HeaderConventions.expected_return_column: ["MeanHistoricalReturn", "CAPM", "MeanHistoricalReturn"],
+            HeaderConventions.risk_model_column: ["SampleCovariance", "SampleCovariance", "LedoitWolf"],
+            HeaderConventions.optimizer_column: ["MaxSharpe", "MinVolatility", "MaxSharpe"],
+            HeaderConventions.weights_column: [{"StockA": 1.0}, "Optimization failed",
+                                               {"StockA": 0.2, "StockB": 0.3, "StockC": 0.5}]})
+
+    def test_batched_evaluation_matches_single_portfolio_paths(self):
+        # Test the batched wealth paths against the path of each portfolio, for both methods
+        for method in ("gbm", "block_bootstrap"):
+            simulator = ScenarioSimulator(self.data, num_of_scenarios=200, horizon=60, method=method, seed=1,
+                                          portfolio_chunk_size=1)
+            metrics_df = simulator.evaluate_optimized_portfolios(self.optimized_df)
+            self.assertEqual(len(metrics_df), 3)
+            # The failed optimization has no weights and no metrics
+            self.assertTrue(np.isnan(metrics_df.iloc[1][HeaderConventions.value_at_risk_column]))
+
+            returns = simulator.simulate_returns()
+            self.assertEqual(returns.shape, (200, 60, 3))
+            wealth = np.cumprod(1 + returns, axis=1) @ np.array([0.2, 0.3, 0.5])
+            np.testing.assert_allclose(simulator.terminal_wealth[:, 1], wealth[:, -1])
+            self.assertAlmostEqual(metrics_df.iloc[2][HeaderConventions.expected_terminal_wealth_column],
+                                   wealth[:, -1].mean())
+            drawdowns = 1 - wealth / np.maximum(np.maximum.accumulate(wealth, axis=1), 1.0)
+            self.assertAlmostEqual(metrics_df.iloc[2][HeaderConventions.expected_max_drawdown_column],
+                                   drawdowns.max(axis=1).mean())
+
+    def test_stationary_bootstrap_keeps_blocks_of_consecutive_days(self):
+        indices = stationary_bootstrap_indices(np.random.default_rng(0), 50, 100, 200, block_size=10)
+        self.assertTrue(((indices >= 0) & (indices < 50)).all())
+        # Consecutive days continue their block with a probability of 1 - 1 / block_size
+        continued = (np.diff(indices, axis=1) % 50) == 1
+        self.assertAlmostEqual(continued.mean(), 0.9, delta=0.02)
+
+
+if __name__ == '__main__':
+    unittest.main()
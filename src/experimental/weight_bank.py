@@ -0,0 +1,68 @@
+import logging
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from src.common.conventions import PklFileConventions
+from src.common.utils import compute_fingerprint
+from src.experimental.simplex_samplers import get_sobol_seed, sample_simplex
+
+logger = logging.getLogger(__name__)
+
+
+class WeightBank:
+    """
+    Random portfolio weights shared by all the windows of a run.
+
+    The weights of the Monte Carlo simulation do not depend on the prices, so they are generated once per universe
+    (tickers), sampler, seed, number of portfolios and constraints, saved as a `.npy` file in bank_dir and
+    memory-mapped by every window, which then only evaluates them against its own mean returns and covariance.
+    """
+    # Rows generated at once, the bank is written chunk by chunk so it never has to fit in memory
+    generation_chunk_size = 2 ** 16
+
+    def __init__(self, bank_dir, tickers, num_of_portfolios, seed, sampler, constraints=None):
+        if seed is None:
+            raise ValueError("A seed is required for the weight bank, the bank is only reused for the same seed")
+        self.tickers = list(tickers)
+        self.num_of_portfolios = num_of_portfolios
+        self.seed = seed
+        self.sampler = sampler
+        self.constraints = constraints
+        # Long-only weights without bounds or cardinality are the same bank whatever the constraints object
+        constrained = constraints is not None and not constraints.is_unconstrained
+        fingerprint = compute_fingerprint(self.tickers, num_of_portfolios, seed, sampler,
+                                          *([constraints] if constrained else []))
+        self.path = Path(bank_dir) / PklFileConventions.weight_bank_filename.format(fingerprint=fingerprint[:16])
+
+    def get_weights(self):
+        """Read-only memory map of the (num_of_portfolios x tickers) weights, generated on first use."""
+        if not self.path.exists():
+            self._generate()
+        return np.load(self.path, mmap_mode='r')
+
+    def _generate(self):
+        logger.info(f"Generating weight bank={self.path} for {len(self.tickers)} tickers, "
+                    f"number of portfolios={self.num_of_portfolios}, sampler={self.sampler}, seed={self.seed}")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Windows running in parallel may generate the same bank, each one writes its own file and renames it
+        tmp_path = self.path.with_name(f"{self.path.stem}.{os.getpid()}.{threading.get_ident()}.tmp.npy")
+        weights = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float64,
+                                            shape=(self.num_of_portfolios, len(self.tickers)))
+        first_positions = range(0, self.num_of_portfolios, self.generation_chunk_size)
+        seed_sequences = np.random.SeedSequence(self.seed).spawn(len(first_positions))
+        sobol_seed = get_sobol_seed(self.sampler, self.seed)
+        for first_position, seed_sequence in zip(first_positions, seed_sequences):
+            size = min(self.generation_chunk_size, self.num_of_portfolios - first_position)
+            weights[first_position:first_position + size] = sample_simplex(self.sampler,
+                                                                           np.random.default_rng(seed_sequence),
+                                                                           size,
+                                                                           len(self.tickers),
+                                                                           first_position,
+                                                                           sobol_seed,
+                                                                           self.constraints)
+        weights.flush()
+        del weights
+        os.replace(tmp_path, self.path)
@@ -1,4 +1,6 @@
 import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 import pandas as pd
@@ -6,12 +8,17 @@ from tabulate import tabulate
 
 from src.common.execution_time_recorder import ExecutionTimeRecorder
 from src.common.logging_config import setup_logging
+from src.common.market_data_context import MarketDataContext
+from src.common.stage_scheduler import StageScheduler
 from src.common.utils import create_current_data_directory
 from src.dataDownloader.main import get_data
 from src.date_generation.generate_date_ranges import generate_date_ranges
 from src.expected_return.main import calculate_or_get_all_return
 from src.experimental.monte_carlo_simulation import run_monte_carlo_simulation
-from src.optimization.main import calculate_optimizations
+from src.experimental.scenario_simulator import run_scenario_simulation
+from src.optimization.main import calculate_efficient_frontiers, calculate_optimizations, \
+    calculate_scenario_reduction_reports
+from src.optimization.multi_period import get_multi_period_config, get_previous_weights
 from src.performance_metrics.main import calculate_performance
 from src.processing_weight.main import run_all_post_processing_weight
 from src.risk_returns.main import calculate_all_risk_matrix
@@ -23,6 +30,209 @@ project_directory = Path(__file__).resolve().parent.parent
 setup_logging(project_directory)
 
 
+def run_optimization_for_date_range(start_date,
+                                    end_date,
+                                    tickers=None,
+                                    frequency="yearly",
+                                    data_directory=project_directory / "data",
+                                    expected_return_methods=None,
+                                    risk_return_methods=None,
+                                    optimization_methods=None,
+                                    post_processing_methods=None,
+                                    max_stage_workers=None,
+                                    previous_weights=None,
+                                    return_stage_results=False):
+    """
+    Run every stage of the pipeline for a single (start_date, end_date) window.
+
+    Each window works in its own `current_dir`, so windows can be processed independently
+    (and concurrently) without sharing any cached files.
+
+    The stages are scheduled by their dependencies:
+    data -> {expected returns, risk matrices, Monte Carlo} -> optimization -> post-processing -> performance,
+    expected returns, risk matrices and the Monte Carlo simulation only need the data and run concurrently.
+    The return statistics of the data are computed once per window in a `MarketDataContext` shared by all stages.
+    When enabled, the optimized portfolios are also evaluated against simulated forward paths next to post-processing,
+    and the efficient frontier of every optimizer is swept next to the optimization.
+    In multi-period mode, previous_weights holds the optimized weights of the previous window, the optimizers are
+    solved against them.
+
+    Returns:
+    - performance_df: The performance DataFrame of the window, or the results of every stage by stage name with
+      return_stage_results.
+    """
+    current_dir = create_current_data_directory(start_date=start_date,
+                                                end_date=end_date,
+                                                output_dir=data_directory,
+                                                frequency=frequency)
+
+    logger.info(f"Processing start_date={start_date}, end_date={end_date} for current_dir={current_dir}")
+
+    def combine_optimized(monte_carlo_df, optimized_df):
+        # Combine the optimization and Monte Carlo results
+        all_optimized_df = pd.concat([monte_carlo_df, optimized_df], ignore_index=True)
+
+        # Save the results to a pickle file
+        save_pickle = Path(current_dir) / 'all_optimized_df.pkl'
+        all_optimized_df.to_pickle(save_pickle)
+        return all_optimized_df
+
+    scheduler = StageScheduler(max_workers=max_stage_workers)
+
+    # Load data for the given date range
+    scheduler.add_stage('data',
+                        lambda: get_data(current_dir=current_dir, start_date=start_date, end_date=end_date,
+                                         tickers=tickers))
+
+    # Share the return statistics of the data with every stage of the window
+    scheduler.add_stage('market_data_context', lambda data: MarketDataContext(data), depends_on=('data',))
+
+    # Calculate expected returns using the provided method
+    scheduler.add_stage('expected_return_df',
+                        lambda data, market_data_context: calculate_or_get_all_return(
+                            data=data,
+                            current_dir=current_dir,
+                            enabled_methods=expected_return_methods,
+                            market_data_context=market_data_context),
+                        depends_on=('data', 'market_data_context'))
+
+    # Calculate risk return matrix using the provided method
+    scheduler.add_stage('risk_return_dict',
+                        lambda data, market_data_context: calculate_all_risk_matrix(
+                            data=data,
+                            current_dir=current_dir,
+                            enabled_methods=risk_return_methods,
+                            market_data_context=market_data_context),
+                        depends_on=('data', 'market_data_context'))
+
+    # Run Monte Carlo simulation
+    scheduler.add_stage('monte_carlo_df',
+                        lambda data, market_data_context: run_monte_carlo_simulation(
+                            output_dir=current_dir,
+                            data=data,
+                            market_data_context=market_data_context),
+                        depends_on=('data', 'market_data_context'))
+
+    # Perform optimization using the provided method
+    scheduler.add_stage('optimized_df',
+                        lambda data, market_data_context, expected_return_df, risk_return_dict:
+                        calculate_optimizations(
+                            data=data,
+                            expected_return_df=expected_return_df,
+                            risk_return_dict=risk_return_dict,
+                            current_dir=current_dir,
+                            enabled_methods=optimization_methods,
+                            market_data_context=market_data_context,
+                            previous_weights=previous_weights),
+                        depends_on=('data', 'market_data_context', 'expected_return_df', 'risk_return_dict'))
+
+    # Sweep the efficient frontier of every optimizer, when enabled in the optimization config.yaml
+    scheduler.add_stage('efficient_frontier_df',
+                        lambda data, market_data_context, expected_return_df, risk_return_dict:
+                        calculate_efficient_frontiers(
+                            data=data,
+                            expected_return_df=expected_return_df,
+                            risk_return_dict=risk_return_dict,
+                            current_dir=current_dir,
+                            enabled_methods=optimization_methods,
+                            market_data_context=market_data_context),
+                        depends_on=('data', 'market_data_context', 'expected_return_df', 'risk_return_dict'))
+
+    # Objective gap of the scenario reduction of the Riskfolio risk measures, when enabled in optimization config.yaml
+    scheduler.add_stage('scenario_reduction_report_df',
+                        lambda data, market_data_context, expected_return_df, risk_return_dict:
+                        calculate_scenario_reduction_reports(
+                            data=data,
+                            expected_return_df=expected_return_df,
+                            risk_return_dict=risk_return_dict,
+                            current_dir=current_dir,
+                            market_data_context=market_data_context),
+                        depends_on=('data', 'market_data_context', 'expected_return_df', 'risk_return_dict'))
+
+    scheduler.add_stage('all_optimized_df', combine_optimized, depends_on=('monte_carlo_df', 'optimized_df'))
+
+    # Evaluate the optimized portfolios against simulated forward paths, when enabled in the experimental config.yaml
+    scheduler.add_stage('scenario_metrics_df',
+                        lambda data, market_data_context, all_optimized_df: run_scenario_simulation(
+                            output_dir=current_dir,
+                            data=data,
+                            all_optimized_df=all_optimized_df,
+                            market_data_context=market_data_context),
+                        depends_on=('data', 'market_data_context', 'all_optimized_df'))
+
+    # Run post-processing on the optimized weights using the provided method
+    scheduler.add_stage('post_processing_weight_df',
+                        lambda data, all_optimized_df: run_all_post_processing_weight(
+                            results_df=all_optimized_df,
+                            data=data,
+                            current_dir=current_dir,
+                            enabled_methods=post_processing_methods),
+                        depends_on=('data', 'all_optimized_df'))
+
+    # Calculate performance based on the post-processed data
+    scheduler.add_stage('performance_df',
+                        lambda data, market_data_context, post_processing_weight_df: calculate_performance(
+                            post_processing_df=post_processing_weight_df,
+                            data=data,
+                            start_date=start_date,
+                            end_date=end_date,
+                            current_dir=current_dir,
+                            market_data_context=market_data_context),
+                        depends_on=('data', 'market_data_context', 'post_processing_weight_df'))
+
+    stage_results = scheduler.run()
+    return stage_results if return_stage_results else stage_results['performance_df']
+
+
+def _run_date_range_in_worker(start_date, end_date, **kwargs):
+    """
+    Process-pool entry point: runs one window and also hands back the execution times recorded
+    in the worker, since the ExecutionTimeRecorder results live in the worker process.
+    """
+    recorded_before = len(ExecutionTimeRecorder.get_performance_dataframe())
+    performance_df = run_optimization_for_date_range(start_date, end_date, **kwargs)
+    execution_times_df = ExecutionTimeRecorder.get_performance_dataframe().iloc[recorded_before:]
+    return performance_df, execution_times_df
+
+
+def _run_multi_period(pipeline_results, date_ranges, window_kwargs):
+    """
+    Run the windows in date order, each one with the optimized weights of the last window that has them (none for
+    the first window).
+    """
+    previous_weights = None
+    for start_date, end_date in date_ranges:
+        stage_results = {}
+
+        def run_window(start_date=start_date, end_date=end_date, previous_weights=previous_weights):
+            stage_results.update(run_optimization_for_date_range(start_date, end_date,
+                                                                 previous_weights=previous_weights,
+                                                                 return_stage_results=True,
+                                                                 **window_kwargs))
+            return stage_results['performance_df']
+
+        _collect_window_result(pipeline_results, start_date, end_date, run_window)
+        window_weights = get_previous_weights(stage_results.get('optimized_df'))
+        if window_weights:
+            previous_weights = window_weights
+    return pipeline_results
+
+
+def _collect_window_result(pipeline_results, start_date, end_date, run_window):
+    """
+    Run (or wait for) a single window and store its performance DataFrame, or the error message if it failed,
+    so that one failing window does not stop the remaining ones.
+    """
+    try:
+        performance_df = run_window()
+        pipeline_results[(start_date, end_date)] = performance_df
+        # Print a preview of the performance
+        print(tabulate(performance_df.head(100), headers='keys', tablefmt='pretty'))
+    except Exception as e:
+        logger.error(f"Processing start_date={start_date}, end_date={end_date} failed with error: {e}")
+        pipeline_results[(start_date, end_date)] = f" failed with error: {e}"
+
+
 @ExecutionTimeRecorder(module_name=__name__)
 def run_optimization_pipeline(
         years,  # List of years to process (mandatory)
@@ -33,7 +243,11 @@ def run_optimization_pipeline(
         expected_return_methods=None,  # Function to calculate expected returns
         risk_return_methods=None,  # Function to calculate risk return matrix
         optimization_methods=None,  # Function to calculate optimizations
-        post_processing_methods=None  # Function for post-processing
+        post_processing_methods=None,  # Function for post-processing
+        max_workers=None,  # Number of processes used to run the date ranges in parallel(optional)
+        executor=None,  # concurrent.futures.Executor used to run the date ranges(optional)
+        max_stage_workers=None,  # Number of threads used to run the independent stages of a window(optional)
+        multi_period=None  # Chain the windows with the weights of the previous window(optional)
 ):
     """
     This function runs the entire optimization pipeline with user-defined methods.
@@ -47,9 +261,18 @@ def run_optimization_pipeline(
     - optimization_method: Function to calculate optimizations.
     - post_processing_method: Function for post-processing optimization weights.
     - performance_method: Function to calculate performance.
+    - max_workers: Number of worker processes, each date range is sent to a process pool when greater than 1.
+    - executor: Already created executor to submit the date ranges to, takes precedence over max_workers.
+      The executor is not shut down by the pipeline.
+    - max_stage_workers: Number of threads running the independent stages of one window concurrently,
+      1 runs the stages one after another.
+    - multi_period: Run the windows one after another in date order, every optimizer being solved against its weights
+      of the previous window (warm start of the batched backend and turnover controls of the `multi_period` section of
+      the optimization config.yaml, which also holds the default). The windows then do not run in parallel.
 
     Returns:
-    - performance_df: The performance DataFrame after running the optimization pipeline.
+    - pipeline_results: Dictionary keyed by (start_date, end_date), in date range order, holding the performance
+      DataFrame of every window, or the error message for the windows that failed.
     """
 
     # Generate date ranges based on user input or defaults
@@ -61,57 +284,48 @@ def run_optimization_pipeline(
             f"Date ranges generation failed for years={years}, months={months}, frequency={frequency}"
         )
 
-    # Loop through date ranges and process the data
-    for start_date, end_date in date_ranges:
-        current_dir = create_current_data_directory(start_date=start_date,
-                                                    end_date=end_date,
-                                                    output_dir=data_directory,
-                                                    frequency=frequency)
-
-        logger.info(f"Processing start_date={start_date}, end_date={end_date} for current_dir={current_dir}")
-
-        # Load data for the given date range
-        data = get_data(current_dir=current_dir, start_date=start_date, end_date=end_date, tickers=tickers)
-
-        # Calculate expected returns using the provided method
-        expected_return_df = calculate_or_get_all_return(data=data,
-                                                         current_dir=current_dir,
-                                                         enabled_methods=expected_return_methods)
-
-        # Calculate risk return matrix using the provided method
-        risk_return_dict = calculate_all_risk_matrix(data=data,
-                                                     current_dir=current_dir,
-                                                     enabled_methods=risk_return_methods)
-
-        # Perform optimization using the provided method
-        optimized_df = calculate_optimizations(data=data,
-                                               expected_return_df=expected_return_df,
-                                               risk_return_dict=risk_return_dict,
-                                               current_dir=current_dir,
-                                               enabled_methods=optimization_methods)
-
-        # Run Monte Carlo simulation
-        monte_carlo_df = run_monte_carlo_simulation(output_dir=current_dir, data=data)
-
-        # Combine the optimization and Monte Carlo results
-        all_optimized_df = pd.concat([monte_carlo_df, optimized_df], ignore_index=True)
+    window_kwargs = dict(tickers=tickers,
+                         frequency=frequency,
+                         data_directory=data_directory,
+                         expected_return_methods=expected_return_methods,
+                         risk_return_methods=risk_return_methods,
+                         optimization_methods=optimization_methods,
+                         post_processing_methods=post_processing_methods,
+                         max_stage_workers=max_stage_workers)
+    pipeline_results = {}
+    if multi_period is None:
+        multi_period = get_multi_period_config().enabled
 
-        # Save the results to a pickle file
-        save_pickle = Path(current_dir) / 'all_optimized_df.pkl'
-        all_optimized_df.to_pickle(save_pickle)
+    if multi_period:
+        if executor is not None or (max_workers is not None and max_workers > 1):
+            logger.warning("Multi-period windows depend on the previous window, they run one after another")
+        return _run_multi_period(pipeline_results, date_ranges, window_kwargs)
 
-        # Run post-processing on the optimized weights using the provided method
-        post_processing_wright_df = run_all_post_processing_weight(results_df=all_optimized_df,
-                                                                   data=data,
-                                                                   current_dir=current_dir,
-                                                                   enabled_methods=post_processing_methods)
+    # Loop through date ranges and process the data
+    if executor is None and (max_workers is None or max_workers <= 1):
+        for start_date, end_date in date_ranges:
+            _collect_window_result(pipeline_results, start_date, end_date,
+                                   lambda: run_optimization_for_date_range(start_date, end_date, **window_kwargs))
+        return pipeline_results
 
-        # Calculate performance based on the post-processed data
-        performance_df = calculate_performance(post_processing_df=post_processing_wright_df,
-                                               data=data,
-                                               start_date=start_date,
-                                               end_date=end_date,
-                                               current_dir=current_dir)
+    owns_executor = executor is None
+    if owns_executor:
+        # Spawned workers do not inherit the threads and held locks (logging, config) of the calling process
+        executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+    logger.info(f"Processing {len(date_ranges)} date ranges with executor={executor}")
+    try:
+        # Submit every window first, then collect them in date range order
+        futures = [(start_date, end_date, executor.submit(_run_date_range_in_worker, start_date, end_date,
+                                                          **window_kwargs))
+                   for start_date, end_date in date_ranges]
+        for start_date, end_date, future in futures:
+            def run_window(future=future):
+                performance_df, execution_times_df = future.result()
+                ExecutionTimeRecorder.merge_results(execution_times_df)
+                return performance_df
 
-        # Print a preview of the performance
-        print(tabulate(performance_df.head(100), headers='keys', tablefmt='pretty'))
+            _collect_window_result(pipeline_results, start_date, end_date, run_window)
+    finally:
+        if owns_executor:
+            executor.shutdown(wait=True)
+    return pipeline_results
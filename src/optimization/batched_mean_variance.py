@@ -0,0 +1,318 @@
+import logging
+import os
+import time
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from pypfopt import EfficientFrontier
+
+from src.common.conventions import HeaderConventions
+from src.common.hydra_config_loader import load_config
+from src.common.utils import compute_fingerprint
+from src.optimization.parametric_mean_variance import MAX_SHARPE_OBJECTIVE, MIN_VOLATILITY_OBJECTIVE, \
+    PARAMETRIC_OBJECTIVES, clean_weights, get_tickers, portfolio_performance
+from src.optimization.solver_policy import CONVERGED_STATUS, MAX_ITERATIONS_STATUS, SolveTelemetry
+
+logger = logging.getLogger(__name__)
+
+# Name of the long only max Sharpe ratio portfolios of a window solved in one batch, memoized in its MarketDataContext
+# per expected returns, covariance and starting weights
+BATCHED_SOLUTIONS_NAME = 'batched_long_only_max_sharpe'
+BATCHED_SOLVER = 'batched'
+
+
+@lru_cache(maxsize=None)
+def get_batched_solver_config():
+    """(tolerance, max_iterations) of the batched solver from the `batched_solver` section of config.yaml."""
+    module_name = os.path.basename(os.path.dirname(__file__))
+    batched_solver_cfg = load_config(module_name).optimization.batched_solver
+    return batched_solver_cfg.tolerance, batched_solver_cfg.max_iterations
+
+
+def project_onto_hyperplane_orthant(points, normals):
+    """
+    Euclidean projection of every row of points onto {y >= 0, normal' y = 1}, the simplex for a normal of ones.
+
+    The projection is y(l) = max(x + l * normal, 0) where normal' y(l) is non decreasing and piecewise linear in l,
+    with breakpoints -x_i / normal_i. The breakpoints are sorted once per row and the segment where normal' y(l)
+    crosses 1 is found with cumulative sums, so the projection is exact and batched over the rows.
+
+    :param points: (batch x assets) points.
+    :param normals: (batch x assets) normals, with at least one positive entry per row.
+    """
+    positive = normals > 0
+    negative = normals < 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        breakpoints = np.where(positive | negative, -points / normals, np.inf)
+    order = np.argsort(breakpoints, axis=1)
+    sorted_breakpoints = np.take_along_axis(breakpoints, order, axis=1)
+    sorted_points = np.take_along_axis(points, order, axis=1)
+    sorted_normals = np.take_along_axis(normals, order, axis=1)
+    sorted_positive = np.take_along_axis(positive, order, axis=1)
+    sorted_negative = np.take_along_axis(negative, order, axis=1)
+    # Terms with a zero normal do not depend on l and do not contribute to normal' y
+    # Active terms on the segment after the k-th breakpoint: positive normals up to k, negative normals after k
+    normal_points = sorted_normals * sorted_points
+    normal_squares = sorted_normals ** 2
+    zeros = np.zeros((len(points), 1))
+    intercepts = (np.concatenate([zeros, np.cumsum(np.where(sorted_positive, normal_points, 0), axis=1)], axis=1)
+                  + np.concatenate([np.cumsum(np.where(sorted_negative, normal_points, 0)[:, ::-1], axis=1)[:, ::-1],
+                                    zeros], axis=1))
+    slopes = (np.concatenate([zeros, np.cumsum(np.where(sorted_positive, normal_squares, 0), axis=1)], axis=1)
+              + np.concatenate([np.cumsum(np.where(sorted_negative, normal_squares, 0)[:, ::-1], axis=1)[:, ::-1],
+                                zeros], axis=1))
+    # normal' y at every finite breakpoint, using the segment on its right, the first segment above 1 holds l
+    finite = np.isfinite(sorted_breakpoints)
+    values_at_breakpoints = np.where(finite,
+                                     intercepts[:, 1:] + slopes[:, 1:] * np.where(finite, sorted_breakpoints, 0),
+                                     np.inf)
+    segments = (values_at_breakpoints < 1).sum(axis=1)
+    segment_intercepts = np.take_along_axis(intercepts, segments[:, None], axis=1)[:, 0]
+    segment_slopes = np.take_along_axis(slopes, segments[:, None], axis=1)[:, 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        multipliers = (1 - segment_intercepts) / segment_slopes
+    return np.maximum(points + multipliers[:, None] * normals, 0)
+
+
+def solve_long_only_batch(expected_returns, covariance_matrices, objective=MAX_SHARPE_OBJECTIVE, tolerance=1e-10,
+                          max_iterations=20000, check_every=10, risk_free_rate=0.0, initial_weights=None):
+    """
+    Long only max Sharpe ratio or min volatility portfolios of a batch of problems with accelerated projected
+    gradient iterations (FISTA with adaptive restart), batched in numpy over the (batch x assets x assets) covariance
+    tensor, so every iteration is one batched matrix product.
+
+    - min volatility: min w' S w over the simplex.
+    - max Sharpe ratio: min y' S y subject to (mu - rf)' y = 1 and y >= 0, the weights are y / sum(y), the same
+      transformation as `EfficientFrontier.max_sharpe`.
+
+    The problems stop independently once the largest change of their iterate is below tolerance (relative to the
+    largest entry), converged problems are removed from the batch every check_every iterations.
+
+    The iterations start from the equal weights, or from the (batch x assets) initial_weights, e.g. the weights of the
+    previous window, rows of NaN starting from the equal weights.
+
+    :return: (batch x assets) weights (NaN for a max Sharpe ratio problem without any return above the risk-free
+             rate), (batch,) iterations and (batch,) converged flags.
+    """
+    if objective not in PARAMETRIC_OBJECTIVES:
+        raise ValueError(f"Unknown objective=`{objective}`, supported objectives are {PARAMETRIC_OBJECTIVES}")
+    covariance_matrices = np.asarray(covariance_matrices, dtype=float)
+    number_of_problems, number_of_assets = covariance_matrices.shape[:2]
+    if objective == MAX_SHARPE_OBJECTIVE:
+        normals = np.asarray(expected_returns, dtype=float) - risk_free_rate
+    else:
+        normals = np.ones((number_of_problems, number_of_assets))
+    feasible = (normals > 0).any(axis=1)
+
+    # Step 1 / L with L = 2 * largest eigenvalue of S, the Lipschitz constant of the gradient 2 S y
+    steps = 1 / (2 * np.linalg.eigvalsh(covariance_matrices)[:, -1])
+    solutions = np.full((number_of_problems, number_of_assets), np.nan)
+    iterations = np.zeros(number_of_problems, dtype=int)
+    converged = np.zeros(number_of_problems, dtype=bool)
+
+    active = np.flatnonzero(feasible)
+    active_covariances = covariance_matrices[active]
+    active_normals = normals[active]
+    active_steps = steps[active]
+    # Start from the projection of the equal weights or of the initial weights, scaled to the hyperplane when they
+    # have a positive excess return, so that the max Sharpe ratio weights start from their own solution
+    starting_points = np.full((len(active), number_of_assets), 1.0 / number_of_assets)
+    if initial_weights is not None:
+        initial_weights = np.asarray(initial_weights, dtype=float)[active]
+        given = ~np.isnan(initial_weights).any(axis=1)
+        starting_points[given] = initial_weights[given]
+    normal_products = np.einsum('bi,bi->b', active_normals, starting_points)
+    starting_points = np.where((normal_products > 0)[:, None],
+                               starting_points / np.where(normal_products > 0, normal_products, 1)[:, None],
+                               starting_points)
+    iterates = project_onto_hyperplane_orthant(starting_points, active_normals)
+    extrapolated = iterates.copy()
+    momentum = np.ones(len(active))
+    changes = np.full(len(active), np.inf)
+    for iteration in range(1, max_iterations + 1):
+        gradients = 2 * np.einsum('bij,bj->bi', active_covariances, extrapolated)
+        next_iterates = project_onto_hyperplane_orthant(extrapolated - active_steps[:, None] * gradients,
+                                                        active_normals)
+        steps_taken = next_iterates - iterates
+        # Adaptive restart: the momentum is dropped when it points against the gradient step
+        restart = np.einsum('bi,bi->b', extrapolated - next_iterates, steps_taken) > 0
+        momentum = np.where(restart, 1.0, momentum)
+        next_momentum = (1 + np.sqrt(1 + 4 * momentum ** 2)) / 2
+        extrapolated = next_iterates + ((momentum - 1) / next_momentum)[:, None] * steps_taken
+        momentum = next_momentum
+        changes = np.abs(steps_taken).max(axis=1) / np.maximum(np.abs(next_iterates).max(axis=1), 1e-12)
+        iterates = next_iterates
+
+        if iteration % check_every == 0 or iteration == max_iterations:
+            done = changes <= tolerance
+            if iteration == max_iterations:
+                done[:] = True
+            if done.any():
+                finished = active[done]
+                solutions[finished] = iterates[done]
+                iterations[finished] = iteration
+                converged[finished] = changes[done] <= tolerance
+                keep = ~done
+                active, active_covariances, active_normals, active_steps = \
+                    active[keep], active_covariances[keep], active_normals[keep], active_steps[keep]
+                iterates, extrapolated, momentum = iterates[keep], extrapolated[keep], momentum[keep]
+            if len(active) == 0:
+                break
+
+    if objective == MAX_SHARPE_OBJECTIVE:
+        solutions = solutions / solutions.sum(axis=1, keepdims=True)
+    return solutions, iterations, converged
+
+
+def solve_long_only_grid(expected_returns_dict, covariance_dict, objective=MAX_SHARPE_OBJECTIVE, tolerance=1e-10,
+                         max_iterations=20000, risk_free_rate=0.0, initial_weights_dict=None):
+    """
+    Long only portfolio of every (expected returns, covariance) pair of a window in a single batch.
+
+    :param expected_returns_dict: {expected return type: expected returns}, e.g. the columns of expected_return_df.
+    :param covariance_dict: {risk model: covariance matrix}, e.g. risk_return_dict.
+    :param initial_weights_dict: {(expected return type, risk model): weights by ticker} the iterations of the pairs
+                                 start from, e.g. the weights of the previous window.
+    :return: {(expected return type, risk model): (raw weights, cleaned weights, performance)} with the outputs of
+             `optimize_mean_variance`, or the exception of the pair, and the (pairs,) iterations and converged flags
+             in the same order.
+    """
+    keys = [(expected_return_type, risk_model_name) for risk_model_name in covariance_dict
+            for expected_return_type in expected_returns_dict]
+    covariance_matrices = np.stack([np.asarray(covariance_dict[risk_model_name], dtype=float)
+                                    for _, risk_model_name in keys])
+    expected_returns = np.stack([np.asarray(expected_returns_dict[expected_return_type], dtype=float)
+                                 for expected_return_type, _ in keys])
+    initial_weights = None
+    if initial_weights_dict:
+        initial_weights = np.stack([
+            pd.Series(initial_weights_dict[key], dtype=float).reindex(
+                get_tickers(expected_returns_dict[key[0]], covariance_dict[key[1]]), fill_value=0).to_numpy()
+            if key in initial_weights_dict else np.full(expected_returns.shape[1], np.nan) for key in keys])
+    weights, iterations, converged = solve_long_only_batch(expected_returns, covariance_matrices, objective,
+                                                           tolerance, max_iterations, risk_free_rate=risk_free_rate,
+                                                           initial_weights=initial_weights)
+    results = {}
+    for position, (expected_return_type, risk_model_name) in enumerate(keys):
+        mu, covariance_matrix = expected_returns_dict[expected_return_type], covariance_dict[risk_model_name]
+        if np.isnan(weights[position]).any():
+            results[(expected_return_type, risk_model_name)] = ValueError(
+                "at least one of the assets must have an expected return exceeding the risk-free rate")
+            continue
+        # Same rounding as PyPortfolioOpt, +0.0 removes signed zero
+        portfolio_weights = weights[position].round(16) + 0.0
+        results[(expected_return_type, risk_model_name)] = (
+            portfolio_weights,
+            clean_weights(portfolio_weights, get_tickers(mu, covariance_matrix)),
+            portfolio_performance(portfolio_weights, mu, covariance_matrix, risk_free_rate))
+    if not converged.all():
+        logger.warning(f"{int((~converged).sum())} of {len(keys)} batched {objective} problems did not converge in "
+                       f"max_iterations={max_iterations}")
+    return results, iterations, converged
+
+
+def get_agreement_report(expected_returns_dict, covariance_dict, objective=MAX_SHARPE_OBJECTIVE, tolerance=1e-10,
+                         max_iterations=20000):
+    """
+    Agreement of the batched solver with `EfficientFrontier` of PyPortfolioOpt on the same inputs, one row per
+    (expected returns, covariance) pair: largest weight difference, Sharpe ratio difference, whether the cleaned
+    weights are the same, iterations and convergence of the batched solver.
+    """
+    results, iterations, converged = solve_long_only_grid(expected_returns_dict, covariance_dict, objective,
+                                                          tolerance, max_iterations)
+    report = []
+    for position, ((expected_return_type, risk_model_name), result) in enumerate(results.items()):
+        row = {HeaderConventions.expected_return_column: expected_return_type,
+               HeaderConventions.risk_model_column: risk_model_name,
+               HeaderConventions.iterations_column: iterations[position],
+               HeaderConventions.converged_column: converged[position]}
+        try:
+            efficient_frontier = EfficientFrontier(expected_returns_dict[expected_return_type],
+                                                   covariance_dict[risk_model_name])
+            if objective == MAX_SHARPE_OBJECTIVE:
+                efficient_frontier.max_sharpe()
+            else:
+                efficient_frontier.min_volatility()
+            weights, cleaned_weights, performance = result
+            row.update({
+                HeaderConventions.max_weight_difference_column: np.abs(weights - efficient_frontier.weights).max(),
+                HeaderConventions.sharpe_ratio_difference_column:
+                    performance[2] - efficient_frontier.portfolio_performance()[2],
+                HeaderConventions.cleaned_weights_match_column:
+                    dict(cleaned_weights) == dict(efficient_frontier.clean_weights())})
+        except Exception as e:
+            logger.error(f"Comparing the batched solver for Risk Model=`{risk_model_name}`, Return Type="
+                         f"`{expected_return_type}` failed with error: {e}")
+        report.append(row)
+    return pd.DataFrame(report)
+
+
+def get_batched_solution_name(market_data_context, expected_returns, covariance_matrix, initial_weights=None):
+    """
+    Name of the memoized long only max Sharpe ratio portfolio of the contents of the inputs and of the weights the
+    iterations start from, None for the equal weights.
+    """
+    if initial_weights is not None:
+        initial_weights = compute_fingerprint(pd.Series(initial_weights, dtype=float).rename(None).sort_index())
+    return (BATCHED_SOLUTIONS_NAME,
+            market_data_context.get_input_fingerprint(expected_returns),
+            market_data_context.get_input_fingerprint(covariance_matrix),
+            initial_weights)
+
+
+def solve_max_sharpe_batch(expected_returns_dict, covariance_dict, initial_weights_dict=None):
+    """
+    Long only max Sharpe ratio portfolios of `solve_long_only_grid` with the batched solver settings of config.yaml,
+    and the SolveTelemetry of every pair: its iterations, whether it converged and its share of the batch time.
+
+    :return: {(expected return type, risk model): (result, SolveTelemetry)}.
+    """
+    tolerance, max_iterations = get_batched_solver_config()
+    started = time.perf_counter()
+    results, iterations, converged = solve_long_only_grid(expected_returns_dict, covariance_dict, MAX_SHARPE_OBJECTIVE,
+                                                          tolerance, max_iterations,
+                                                          initial_weights_dict=initial_weights_dict)
+    # Every pair is charged the same share of the batch
+    solve_time = (time.perf_counter() - started) / len(results)
+    solutions = {}
+    for position, (key, result) in enumerate(results.items()):
+        solve_telemetry = SolveTelemetry()
+        if not isinstance(result, Exception):
+            solve_telemetry.record(BATCHED_SOLVER, CONVERGED_STATUS if converged[position] else MAX_ITERATIONS_STATUS,
+                                   int(iterations[position]), solve_time=solve_time)
+        solutions[key] = (result, solve_telemetry)
+    return solutions
+
+
+def solve_window_batch(market_data_context, expected_return_df, risk_return_dict, initial_weights_dict=None):
+    """
+    Solve the long only max Sharpe ratio portfolios of every return type and risk model of the window in one batch,
+    memoized with their SolveTelemetry in the MarketDataContext where the PyPortfolioOpt frontiers of the `batched`
+    backend read them. The iterations of a pair start from its initial_weights_dict weights, the batch is only solved
+    when one of its portfolios is not memoized yet.
+
+    :return: {(expected return type, risk model): result} of `solve_long_only_grid`.
+    """
+    initial_weights_dict = initial_weights_dict or {}
+    expected_returns_dict = {expected_return_type: expected_return_df[expected_return_type]
+                             for expected_return_type in expected_return_df.columns}
+    covariance_dict = {risk_model_name: covariance_matrix
+                       for risk_model_name, covariance_matrix in risk_return_dict.items()
+                       if covariance_matrix.shape[0] == expected_return_df.shape[0]}
+    batch_results = {}
+
+    def get_batch_result(key):
+        if not batch_results:
+            batch_results.update(solve_max_sharpe_batch(expected_returns_dict, covariance_dict, initial_weights_dict))
+        return batch_results[key]
+
+    results = {}
+    for risk_model_name, covariance_matrix in covariance_dict.items():
+        for expected_return_type, expected_returns in expected_returns_dict.items():
+            key = (expected_return_type, risk_model_name)
+            results[key], _ = market_data_context.memoize(
+                get_batched_solution_name(market_data_context, expected_returns, covariance_matrix,
+                                          initial_weights_dict.get(key)),
+                lambda: get_batch_result(key))
+    return results
@@ -0,0 +1,218 @@
+import logging
+import time
+
+import numpy as np
+
+from src.optimization.parametric_mean_variance import MAX_SHARPE_OBJECTIVE, MIN_VOLATILITY_OBJECTIVE, \
+    PARAMETRIC_OBJECTIVES, clean_weights, get_tickers, optimize_mean_variance, portfolio_performance
+from src.optimization.solver_policy import ANALYTIC_STATUS, SolveTelemetry
+
+logger = logging.getLogger(__name__)
+
+# Name of the max Sharpe ratio portfolios of a window solved with one stacked `solve_closed_form`, memoized in its
+# MarketDataContext per expected returns, covariance and weight bounds
+CLOSED_FORM_SOLUTIONS_NAME = 'closed_form_max_sharpe'
+CLOSED_FORM_SOLVER = 'closed_form'
+
+
+def solve_closed_form(covariance_matrices, expected_returns, risk_free_rate=0.0):
+    """
+    Min volatility and max Sharpe ratio (tangency) weights with the budget constraint only, for every covariance and
+    expected returns, with one batched `np.linalg.solve`: the min volatility weights are S^-1 1 / 1' S^-1 1 and the
+    tangency weights S^-1 (mu - rf) / 1' S^-1 (mu - rf).
+
+    :param covariance_matrices: (covariances x assets x assets) covariance matrices.
+    :param expected_returns: (expected returns x assets) expected returns, solved against every covariance.
+    :return: (covariances x assets) min volatility weights and (covariances x expected returns x assets) tangency
+             weights, NaN for a singular covariance and for tangency weights without a positive Sharpe ratio (the
+             solution is then on the inefficient branch of the frontier).
+    """
+    covariance_matrices = np.asarray(covariance_matrices, dtype=float)
+    excess_returns = np.asarray(expected_returns, dtype=float) - risk_free_rate
+    number_of_covariances, number_of_assets = covariance_matrices.shape[:2]
+    # (covariances x assets x (1 + expected returns)) right hand sides, the ones then every excess return
+    right_hand_sides = np.concatenate([np.ones((number_of_assets, 1)), excess_returns.T], axis=1)
+    right_hand_sides = np.broadcast_to(right_hand_sides, (number_of_covariances,) + right_hand_sides.shape)
+    try:
+        solutions = np.linalg.solve(covariance_matrices, right_hand_sides)
+    except np.linalg.LinAlgError:
+        # One singular covariance fails the whole batch, solve them one by one
+        solutions = np.full(right_hand_sides.shape, np.nan)
+        for position, covariance_matrix in enumerate(covariance_matrices):
+            try:
+                solutions[position] = np.linalg.solve(covariance_matrix, right_hand_sides[position])
+            except np.linalg.LinAlgError:
+                logger.warning("Singular covariance matrix, no closed form mean variance weights")
+    budgets = solutions.sum(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weights = np.where(budgets > 0, solutions / budgets, np.nan)
+    return weights[:, :, 0], weights[:, :, 1:].transpose(0, 2, 1)
+
+
+def solve_closed_form_frontier(expected_returns, covariance_matrix, target_returns):
+    """
+    Min volatility weights for every target return with the budget and return equality constraints only:
+    w = S^-1 [1 mu] A^-1 [1 r]' with A = [1 mu]' S^-1 [1 mu], affine in the target return r.
+
+    :return: (target returns x assets) weights, NaN when the covariance or A is singular.
+    """
+    expected_returns = np.asarray(expected_returns, dtype=float).ravel()
+    constraint_matrix = np.column_stack([np.ones(len(expected_returns)), expected_returns])
+    try:
+        solution = np.linalg.solve(np.asarray(covariance_matrix, dtype=float), constraint_matrix)
+        multipliers = np.linalg.solve(constraint_matrix.T @ solution,
+                                      np.vstack([np.ones(len(target_returns)), target_returns]))
+    except np.linalg.LinAlgError:
+        return np.full((len(target_returns), len(expected_returns)), np.nan)
+    return (solution @ multipliers).T
+
+
+def within_bounds(weights, weight_bounds=(0, 1), tolerance=1e-9):
+    """True for every row of weights that is defined and within the (lower, upper) weight bounds."""
+    lower, upper = weight_bounds
+    return ((weights >= lower - tolerance) & (weights <= upper + tolerance)).all(axis=-1)
+
+
+def solve_mean_variance_grid(expected_returns_dict, covariance_dict, weight_bounds=(0, 1),
+                             objective=MAX_SHARPE_OBJECTIVE, risk_free_rate=0.0, solve_telemetries=None):
+    """
+    Max Sharpe ratio or min volatility portfolio of every (expected returns, covariance) pair of a window, in closed
+    form when the weight bounds are not active, otherwise with the compiled CVXPY problem of
+    `parametric_mean_variance.py`. All the pairs must have the same assets.
+
+    :param expected_returns_dict: {expected return type: expected returns}, e.g. the columns of expected_return_df.
+    :param covariance_dict: {risk model: covariance matrix}, e.g. risk_return_dict.
+    :param solve_telemetries: dict filled with the SolveTelemetry of every pair: the `analytic` status and its share
+                              of the stacked solve time in closed form, the CVXPY solve otherwise.
+    :return: {(expected return type, risk model): (raw weights, cleaned weights, performance)} with the outputs of
+             `optimize_mean_variance`, or the exception raised for the pair.
+    """
+    if objective not in PARAMETRIC_OBJECTIVES:
+        raise ValueError(f"Unknown objective=`{objective}`, supported objectives are {PARAMETRIC_OBJECTIVES}")
+    covariance_matrices = np.stack([np.asarray(covariance_matrix, dtype=float)
+                                    for covariance_matrix in covariance_dict.values()])
+    expected_returns_matrix = np.stack([np.asarray(expected_returns, dtype=float)
+                                        for expected_returns in expected_returns_dict.values()])
+    started = time.perf_counter()
+    min_volatility_weights, max_sharpe_weights = solve_closed_form(covariance_matrices, expected_returns_matrix,
+                                                                   risk_free_rate)
+    stacked_solve_time = time.perf_counter() - started
+    if objective == MIN_VOLATILITY_OBJECTIVE:
+        closed_form_weights = np.broadcast_to(min_volatility_weights[:, None, :], max_sharpe_weights.shape)
+    else:
+        closed_form_weights = max_sharpe_weights
+    closed_form_valid = within_bounds(closed_form_weights, weight_bounds)
+    if objective == MAX_SHARPE_OBJECTIVE:
+        # PyPortfolioOpt raises when no asset beats the risk-free rate, left to the CVXPY problem
+        closed_form_valid &= expected_returns_matrix.max(axis=1) > risk_free_rate
+    # Every pair is charged the same share of the stacked solve
+    closed_form_solve_time = stacked_solve_time / closed_form_valid.size
+
+    results = {}
+    for covariance_position, (risk_model_name, covariance_matrix) in enumerate(covariance_dict.items()):
+        for expected_returns_position, (expected_return_type, expected_returns) in \
+                enumerate(expected_returns_dict.items()):
+            key = (expected_return_type, risk_model_name)
+            solve_telemetry = SolveTelemetry()
+            if solve_telemetries is not None:
+                solve_telemetries[key] = solve_telemetry
+            try:
+                if closed_form_valid[covariance_position, expected_returns_position]:
+                    # Same rounding as PyPortfolioOpt, +0.0 removes signed zero
+                    weights = closed_form_weights[covariance_position, expected_returns_position].round(16) + 0.0
+                    solve_telemetry.record(CLOSED_FORM_SOLVER, ANALYTIC_STATUS, solve_time=closed_form_solve_time)
+                    results[key] = (weights,
+                                    clean_weights(weights, get_tickers(expected_returns, covariance_matrix)),
+                                    portfolio_performance(weights, expected_returns, covariance_matrix,
+                                                          risk_free_rate))
+                else:
+                    results[key] = optimize_mean_variance(expected_returns, covariance_matrix, weight_bounds,
+                                                          objective, risk_free_rate, solve_telemetry)
+            except Exception as e:
+                results[key] = e
+    number_of_closed_form = int(closed_form_valid.sum())
+    logger.debug(f"Solved {number_of_closed_form} of {closed_form_valid.size} mean variance portfolios in closed "
+                 f"form, {closed_form_valid.size - number_of_closed_form} with CVXPY")
+    return results
+
+
+def optimize_closed_form(expected_returns, covariance_matrix, weight_bounds=(0, 1), objective=MAX_SHARPE_OBJECTIVE,
+                         risk_free_rate=0.0, solve_telemetry=None):
+    """
+    Single portfolio of `solve_mean_variance_grid`, with the outputs (and exceptions) of `optimize_mean_variance`,
+    the solve is recorded in the SolveTelemetry solve_telemetry when given.
+    """
+    result, pair_telemetry = solve_pair(expected_returns, covariance_matrix, weight_bounds, objective, risk_free_rate)
+    return get_recorded_result(result, pair_telemetry, solve_telemetry)
+
+
+def solve_pair(expected_returns, covariance_matrix, weight_bounds=(0, 1), objective=MAX_SHARPE_OBJECTIVE,
+               risk_free_rate=0.0):
+    """(result, SolveTelemetry) of the single pair grid of `solve_mean_variance_grid`."""
+    solve_telemetries = {}
+    result = solve_mean_variance_grid({0: expected_returns}, {0: covariance_matrix}, weight_bounds, objective,
+                                      risk_free_rate, solve_telemetries)[(0, 0)]
+    return result, solve_telemetries[(0, 0)]
+
+
+def get_recorded_result(result, pair_telemetry, solve_telemetry=None):
+    """Record the SolveTelemetry pair_telemetry of result in solve_telemetry, then return result or raise it."""
+    if solve_telemetry is not None:
+        solve_telemetry.record_telemetry(pair_telemetry)
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def get_closed_form_solution_name(market_data_context, expected_returns, covariance_matrix, weight_bounds):
+    """Name of the memoized max Sharpe ratio portfolio of the contents of the inputs and the weight bounds."""
+    return (CLOSED_FORM_SOLUTIONS_NAME,
+            market_data_context.get_input_fingerprint(expected_returns),
+            market_data_context.get_input_fingerprint(covariance_matrix),
+            tuple(weight_bounds))
+
+
+def solve_window_closed_form(market_data_context, expected_return_df, risk_return_dict, weight_bounds=(0, 1)):
+    """
+    Solve the max Sharpe ratio portfolios of every return type and risk model of the window with one stacked
+    `solve_mean_variance_grid`, memoized with their SolveTelemetry in the MarketDataContext where the PyPortfolioOpt
+    frontiers of the `closed_form` backend read them. The grid is only solved when one of its portfolios is not
+    memoized yet.
+
+    :return: {(expected return type, risk model): result} of `solve_mean_variance_grid`.
+    """
+    expected_returns_dict = {expected_return_type: expected_return_df[expected_return_type]
+                             for expected_return_type in expected_return_df.columns}
+    covariance_dict = {risk_model_name: covariance_matrix
+                       for risk_model_name, covariance_matrix in risk_return_dict.items()
+                       if covariance_matrix.shape[0] == expected_return_df.shape[0]}
+    grid_results = {}
+    grid_telemetries = {}
+
+    def get_grid_result(key):
+        if not grid_results:
+            grid_results.update(solve_mean_variance_grid(expected_returns_dict, covariance_dict, weight_bounds,
+                                                         solve_telemetries=grid_telemetries))
+        return grid_results[key], grid_telemetries[key]
+
+    results = {}
+    for risk_model_name, covariance_matrix in covariance_dict.items():
+        for expected_return_type, expected_returns in expected_returns_dict.items():
+            key = (expected_return_type, risk_model_name)
+            results[key], _ = market_data_context.memoize(
+                get_closed_form_solution_name(market_data_context, expected_returns, covariance_matrix, weight_bounds),
+                lambda: get_grid_result(key))
+    return results
+
+
+def get_window_closed_form_solution(market_data_context, expected_returns, covariance_matrix, weight_bounds=(0, 1),
+                                    solve_telemetry=None):
+    """
+    Max Sharpe ratio portfolio of `solve_window_closed_form` with the outputs (and exceptions) of
+    `optimize_mean_variance`, solved alone when it is not in the stacked solve of the window. Its SolveTelemetry is
+    recorded in solve_telemetry when given.
+    """
+    result, pair_telemetry = market_data_context.memoize(
+        get_closed_form_solution_name(market_data_context, expected_returns, covariance_matrix, weight_bounds),
+        lambda: solve_pair(expected_returns, covariance_matrix, weight_bounds))
+    return get_recorded_result(result, pair_telemetry, solve_telemetry)
@@ -7,6 +7,6 @@ from src.optimization.riskfolio_lib_frontier import RiskFolioOptimizer
 class CVaRRiskFolioOptimizer(RiskFolioOptimizer):
     @ExecutionTimeRecorder(module_name=__name__)
     def __init__(self, expected_returns, covariance_matrix, expected_return_type, risk_return_type, output_dir,
-                 data: pd.DataFrame):
+                 data: pd.DataFrame, market_data_context=None):
         super().__init__(expected_returns, covariance_matrix, expected_return_type, risk_return_type, output_dir, data,
-                         rm='CVaR')
+                         rm='CVaR', market_data_context=market_data_context)
@@ -1,43 +1,137 @@
-import os
-import pickle
+import numpy as np
+import pandas as pd
 
-from src.common.conventions import PklFileConventions
-from src.common.utils import load_data_from_pickle, save_data_to_pickle
+from src.common.conventions import HeaderConventions
+from src.common.market_data_context import MarketDataContext
+from src.common.result_store import get_result_store
+from src.common.utils import compute_fingerprint
+from src.optimization.solver_policy import SOLVE_TELEMETRY_COLUMNS
 
 
 class EfficientFrontierBase:
     def __init__(self, expected_returns, covariance_matrix, expected_return_type, risk_return_type,
                  output_dir=None,
-                 data=None):
+                 data=None, market_data_context=None):
         self.expected_returns = expected_returns
         self.covariance_matrix = covariance_matrix
         self.cleaned_weights = None
         self.performance = None
+        # SolveTelemetry of the last calculate_efficient_frontier, when the optimizer records one
+        self.solve_telemetry = None
+        # TurnoverControl against the weights of the previous window, in multi-period mode
+        self.turnover_control = None
         self.data = data
-        self.cache_file = self._generate_cache_filename(output_dir=output_dir,
-                                                        expected_return_type=expected_return_type,
-                                                        risk_return_type=risk_return_type)
-
-    def _generate_cache_filename(self, output_dir, expected_return_type, risk_return_type):
-        # Generate cache filename using the class name and a hash of the data characteristics
-        class_name = self.__class__.__name__
-        expected_return_pkl_filename = os.path.join(output_dir,
-                                                    PklFileConventions.optimization_pkl_filename.
-                                                    format(expected_return_type=expected_return_type,
-                                                           risk_return_type=risk_return_type,
-                                                           optimization_type=class_name))
-        return os.path.join(output_dir, expected_return_pkl_filename)
-
-    def get_results(self):
-        cached_result = load_data_from_pickle(self.cache_file)
+        # Return statistics shared by all the optimizers of the window
+        if market_data_context is None and data is not None:
+            market_data_context = MarketDataContext(data)
+        self.market_data_context = market_data_context
+        # Results are cached in the result store of the window, keyed by return type, risk model and optimizer
+        self.result_store = get_result_store(output_dir)
+        self.cache_key = (expected_return_type, risk_return_type, self.__class__.__name__)
+
+    def get_cache_parameters(self):
+        """
+        Parameters of the optimizer that change its results, they are part of the cache fingerprint.
+        """
+        return {}
+
+    @classmethod
+    def get_config_cache_parameters(cls):
+        """
+        Parameters of the optimizer class read from config.yaml that change its results, for the fingerprint of the
+        results of a whole window, which is checked before the cache of every optimizer.
+        """
+        return {}
+
+    def set_turnover_control(self, turnover_control):
+        """
+        Optimize against the weights of the previous window of the TurnoverControl, None for a single period. The
+        turnover controls are applied by the optimizers supporting them, every optimizer reports its turnover.
+        """
+        self.turnover_control = turnover_control
+
+    def get_cache_fingerprint(self):
+        # The previous weights change the turnover of every optimizer, single period fingerprints are left unchanged
+        turnover_parameters = (self.turnover_control.get_cache_parameters(),) \
+            if self.turnover_control is not None else ()
+        if self.market_data_context is None:
+            return compute_fingerprint(self.__class__.__name__,
+                                       self.expected_returns,
+                                       self.covariance_matrix,
+                                       self.get_cache_parameters(),
+                                       *turnover_parameters)
+        # The inputs are shared by all the optimizers of a return type and risk model, they are hashed once
+        return compute_fingerprint(self.__class__.__name__,
+                                   self.market_data_context.get_input_fingerprint(self.expected_returns),
+                                   self.market_data_context.get_input_fingerprint(self.covariance_matrix),
+                                   self.get_cache_parameters(),
+                                   *turnover_parameters)
+
+    def load_cached_results(self, stored_results=None):
+        """
+        Return the cached results if they were computed from the same inputs, otherwise None.
+        stored_results holds the rows of `ResultStore.load_all` read once for a whole grid, otherwise the result store
+        is read.
+        """
+        if stored_results is None:
+            return self.result_store.get(self.cache_key, self.get_cache_fingerprint())
+        fingerprint_and_results = stored_results.get(self.cache_key)
+        if fingerprint_and_results is None or fingerprint_and_results[0] != self.get_cache_fingerprint():
+            return None
+        return fingerprint_and_results[1]
+
+    def get_results(self, save_to_cache=True, stored_results=None):
+        """
+        Results of the optimizer, from the cache when computed from the same inputs.
+        With save_to_cache=False the new results are not written to the cache, e.g. when the caller appends the
+        results of a whole grid to the result store in one batch. stored_results: see `load_cached_results`.
+        """
+        cached_result = self.load_cached_results(stored_results)
         if cached_result is None:
-            df = self._get_results()
-            save_data_to_pickle(pkl_filename=self.cache_file, dataframe=df)
+            df = self._get_results().assign(**self.get_solve_telemetry())
+            df[HeaderConventions.turnover_column] = self.get_turnover(
+                df[HeaderConventions.cleaned_weights_column].iloc[0])
+            if save_to_cache:
+                self.result_store.put_many([(self.cache_key, self.get_cache_fingerprint(), df)])
             cached_result = df
         return cached_result
 
+    def get_solve_telemetry(self):
+        """Solver, status, iterations, compile and solve times of the last optimization, NaN when not recorded."""
+        if self.solve_telemetry is None:
+            return dict.fromkeys(SOLVE_TELEMETRY_COLUMNS, np.nan)
+        return self.solve_telemetry.to_dict()
+
+    def get_turnover(self, cleaned_weights):
+        """L1 turnover of the cleaned weights from the weights of the previous window, NaN for a single period."""
+        if self.turnover_control is None:
+            return np.nan
+        return self.turnover_control.get_turnover(cleaned_weights)
+
     def calculate_efficient_frontier(self):
         raise NotImplementedError("Subclasses should implement this method")
 
+    def efficient_frontier(self, n_points=50):
+        """
+        n_points portfolios of the efficient frontier of the optimizer, from its min risk to its max return portfolio,
+        computed in one call: one row with the (points,) annual returns and volatilities and the (points x tickers)
+        weights.
+        """
+        raise NotImplementedError("Subclasses should implement this method")
+
+    @staticmethod
+    def _get_frontier_results(weights, expected_returns, covariance_matrix, tickers, annualization_factor=1):
+        """One row DataFrame of the (points x assets) frontier weights, annualized with annualization_factor."""
+        expected_returns = np.asarray(expected_returns, dtype=float).ravel()
+        covariance_matrix = np.asarray(covariance_matrix, dtype=float)
+        frontier_returns = weights @ expected_returns * annualization_factor
+        frontier_volatilities = np.sqrt(np.einsum('pi,ij,pj->p', weights, covariance_matrix, weights)
+                                        * annualization_factor)
+        return pd.DataFrame({
+            HeaderConventions.frontier_returns_column: [frontier_returns],
+            HeaderConventions.frontier_volatilities_column: [frontier_volatilities],
+            HeaderConventions.frontier_weights_column: [pd.DataFrame(weights, columns=list(tickers))]
+        })
+
     def _get_results(self):
         raise NotImplementedError("Subclasses should implement this method")
@@ -3,8 +3,10 @@ from src.optimization.py_portfolio_opt_frontier_base import PyPortfolioOptFronti
 
 
 class PyPortfolioOptFrontierWithShortPosition(PyPortfolioOptFrontierBase):
+    WEIGHT_BOUNDS = (-1, 1)
+
     @ExecutionTimeRecorder(module_name=__name__)
     def __init__(self, expected_returns, covariance_matrix, expected_return_type, risk_return_type, output_dir=None,
-                 data=None):
+                 data=None, market_data_context=None):
         super().__init__(expected_returns, covariance_matrix, expected_return_type, risk_return_type, output_dir, data,
-                         weight_bounds=(-1, 1))
+                         weight_bounds=self.WEIGHT_BOUNDS, market_data_context=market_data_context)
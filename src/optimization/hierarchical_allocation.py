@@ -0,0 +1,177 @@
+import os
+from functools import lru_cache
+
+import numpy as np
+import scipy.cluster.hierarchy as sch
+from scipy.spatial.distance import squareform
+
+from src.common.hydra_config_loader import load_config
+
+HRP_METHOD = 'HRP'
+HERC_METHOD = 'HERC'
+NCO_METHOD = 'NCO'
+HIERARCHICAL_METHODS = (HRP_METHOD, HERC_METHOD, NCO_METHOD)
+# Name of the clusterings shared through the MarketDataContext of the window
+CLUSTERING_NAME = 'hierarchical_clustering'
+
+
+@lru_cache(maxsize=None)
+def get_hierarchical_config():
+    """(linkage method, max clusters) of the `hierarchical` section of config.yaml."""
+    module_name = os.path.basename(os.path.dirname(__file__))
+    hierarchical_cfg = load_config(module_name).optimization.hierarchical
+    return hierarchical_cfg.linkage, hierarchical_cfg.max_clusters
+
+
+class HierarchicalClustering:
+    """
+    Hierarchical clustering of the assets of a covariance matrix on the correlation distance sqrt((1 - rho) / 2): the
+    linkage matrix, the quasi-diagonal order of its leaves and its cluster tree. Computed once per covariance and
+    shared by the hierarchical optimizers.
+    """
+
+    def __init__(self, covariance_matrix, linkage_method='single'):
+        covariance_matrix = np.asarray(covariance_matrix, dtype=float)
+        self.number_of_assets = len(covariance_matrix)
+        volatilities = np.sqrt(np.diag(covariance_matrix))
+        correlation = np.clip(covariance_matrix / np.outer(volatilities, volatilities), -1, 1)
+        distance = np.sqrt(np.clip((1 - correlation) / 2, 0, None))
+        np.fill_diagonal(distance, 0)
+        if self.number_of_assets > 1:
+            self.linkage = sch.linkage(squareform(distance, checks=False), method=linkage_method)
+            self.order = sch.leaves_list(self.linkage)
+            self.tree = sch.to_tree(self.linkage)
+        else:
+            self.linkage = np.empty((0, 4))
+            self.order = np.arange(self.number_of_assets)
+            self.tree = None
+
+    def get_number_of_clusters(self, max_clusters=10):
+        """
+        Number of clusters at the largest gap between the heights of two consecutive merges of the linkage, between
+        2 and max_clusters.
+        """
+        if self.number_of_assets < 3:
+            return self.number_of_assets
+        heights = self.linkage[:, 2]
+        candidates = np.arange(2, min(max_clusters, self.number_of_assets - 1) + 1)
+        # Cutting into k clusters leaves out the last k - 1 merges, the gap is up to the merge into k - 1 clusters
+        gaps = heights[self.number_of_assets - candidates] - heights[self.number_of_assets - candidates - 1]
+        return int(candidates[np.argmax(gaps)])
+
+    def get_labels(self, number_of_clusters):
+        """(assets,) cluster labels of the tree cut into number_of_clusters clusters."""
+        if self.number_of_assets < 2:
+            return np.ones(self.number_of_assets, dtype=int)
+        return sch.fcluster(self.linkage, number_of_clusters, criterion='maxclust')
+
+
+def get_clustering(covariance_matrix, linkage_method='single', market_data_context=None):
+    """
+    Clustering of the covariance matrix, computed once per covariance content of the window when a MarketDataContext
+    is given, so HRP, HERC and NCO share the linkage of a risk model.
+    """
+    if market_data_context is None:
+        return HierarchicalClustering(covariance_matrix, linkage_method)
+    return market_data_context.memoize(
+        (CLUSTERING_NAME, market_data_context.get_input_fingerprint(covariance_matrix), linkage_method),
+        lambda: HierarchicalClustering(covariance_matrix, linkage_method))
+
+
+def inverse_variance_weights(covariance_matrix):
+    inverse_variances = 1 / np.diag(covariance_matrix)
+    return inverse_variances / inverse_variances.sum()
+
+
+def cluster_variance(covariance_matrix, assets):
+    """Variance of the inverse variance portfolio of the assets."""
+    cluster_covariance = covariance_matrix[np.ix_(assets, assets)]
+    weights = inverse_variance_weights(cluster_covariance)
+    return weights @ cluster_covariance @ weights
+
+
+def hierarchical_risk_parity_weights(covariance_matrix, clustering):
+    """
+    Hierarchical risk parity (Lopez de Prado): recursive bisection of the quasi-diagonal order, every half receives a
+    share of the weight of its parent inversely proportional to its cluster variance.
+    """
+    covariance_matrix = np.asarray(covariance_matrix, dtype=float)
+    weights = np.ones(clustering.number_of_assets)
+    clusters = [clustering.order]
+    while clusters:
+        clusters = [half for cluster in clusters if len(cluster) > 1
+                    for half in (cluster[:len(cluster) // 2], cluster[len(cluster) // 2:])]
+        for left, right in zip(clusters[::2], clusters[1::2]):
+            left_variance, right_variance = cluster_variance(covariance_matrix, left), \
+                cluster_variance(covariance_matrix, right)
+            left_share = 1 - left_variance / (left_variance + right_variance)
+            weights[left] *= left_share
+            weights[right] *= 1 - left_share
+    return weights
+
+
+def hierarchical_equal_risk_contribution_weights(covariance_matrix, clustering, max_clusters=10):
+    """
+    Hierarchical equal risk contribution (Raffinot): the weight is split top-down along the dendrogram, inversely to
+    the cluster variance of the two children, down to the clusters of the tree cut at its largest gap, then within
+    every cluster with the inverse variance weights.
+    """
+    covariance_matrix = np.asarray(covariance_matrix, dtype=float)
+    weights = np.ones(clustering.number_of_assets)
+    if clustering.tree is None:
+        return weights
+    labels = clustering.get_labels(clustering.get_number_of_clusters(max_clusters))
+    # Depth first on the dendrogram, a node whose assets are all in one cluster is not split further
+    nodes = [clustering.tree]
+    while nodes:
+        node = nodes.pop()
+        assets = np.asarray(node.pre_order())
+        if len(np.unique(labels[assets])) == 1:
+            weights[assets] *= inverse_variance_weights(covariance_matrix[np.ix_(assets, assets)])
+            continue
+        left, right = node.get_left(), node.get_right()
+        left_assets, right_assets = np.asarray(left.pre_order()), np.asarray(right.pre_order())
+        left_variance, right_variance = cluster_variance(covariance_matrix, left_assets), \
+            cluster_variance(covariance_matrix, right_assets)
+        left_share = 1 - left_variance / (left_variance + right_variance)
+        weights[left_assets] *= left_share
+        weights[right_assets] *= 1 - left_share
+        nodes.extend((left, right))
+    return weights
+
+
+def min_variance_weights(covariance_matrix):
+    """Min variance weights with the budget constraint only, S^-1 1 / 1' S^-1 1, pseudo inverse when singular."""
+    ones = np.ones(len(covariance_matrix))
+    try:
+        weights = np.linalg.solve(covariance_matrix, ones)
+    except np.linalg.LinAlgError:
+        weights = np.linalg.pinv(covariance_matrix) @ ones
+    return weights / weights.sum()
+
+
+def nested_clustered_optimization_weights(covariance_matrix, clustering, max_clusters=10):
+    """
+    Nested clustered optimization (Lopez de Prado) with min variance portfolios: the min variance weights within every
+    cluster of the tree cut at its largest gap, then the min variance weights of the clusters on the covariance of the
+    cluster portfolios. The closed form min variance portfolios can hold short positions.
+    """
+    covariance_matrix = np.asarray(covariance_matrix, dtype=float)
+    labels = clustering.get_labels(clustering.get_number_of_clusters(max_clusters))
+    clusters = [np.flatnonzero(labels == label) for label in np.unique(labels)]
+    intra_cluster_weights = np.zeros((clustering.number_of_assets, len(clusters)))
+    for position, assets in enumerate(clusters):
+        intra_cluster_weights[assets, position] = min_variance_weights(covariance_matrix[np.ix_(assets, assets)])
+    reduced_covariance = intra_cluster_weights.T @ covariance_matrix @ intra_cluster_weights
+    return intra_cluster_weights @ min_variance_weights(reduced_covariance)
+
+
+def hierarchical_weights(method, covariance_matrix, clustering, max_clusters=10):
+    """(assets,) weights of the hierarchical method, in the order of the covariance matrix."""
+    if method == HRP_METHOD:
+        return hierarchical_risk_parity_weights(covariance_matrix, clustering)
+    if method == HERC_METHOD:
+        return hierarchical_equal_risk_contribution_weights(covariance_matrix, clustering, max_clusters)
+    if method == NCO_METHOD:
+        return nested_clustered_optimization_weights(covariance_matrix, clustering, max_clusters)
+    raise ValueError(f"Unknown method=`{method}`, supported methods are {HIERARCHICAL_METHODS}")
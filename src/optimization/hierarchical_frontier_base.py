@@ -0,0 +1,64 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.common.conventions import HeaderConventions
+from src.optimization.efficient_frontier_base import EfficientFrontierBase
+from src.optimization.hierarchical_allocation import get_clustering, get_hierarchical_config, hierarchical_weights
+from src.optimization.parametric_mean_variance import clean_weights, get_tickers, portfolio_performance
+from src.optimization.solver_policy import ANALYTIC_STATUS, SolveTelemetry
+
+HIERARCHICAL_SOLVER = 'hierarchical'
+
+
+class HierarchicalFrontierBase(EfficientFrontierBase):
+    """
+    Allocation of a hierarchical clustering method (HRP, HERC or NCO) on the covariance matrix of the risk model,
+    without a solver. The expected returns are only used for the performance of the portfolio.
+    """
+    method = None
+
+    def __init__(self, expected_returns, covariance_matrix, expected_return_type, risk_return_type,
+                 output_dir=None,
+                 data=None, market_data_context=None):
+        super().__init__(expected_returns, covariance_matrix, expected_return_type, risk_return_type, output_dir, data,
+                         market_data_context)
+        self.weights = None
+        self.linkage_method, self.max_clusters = get_hierarchical_config()
+
+    def get_cache_parameters(self):
+        return {'linkage': self.linkage_method, 'max_clusters': self.max_clusters}
+
+    @classmethod
+    def get_config_cache_parameters(cls):
+        linkage_method, max_clusters = get_hierarchical_config()
+        return {'linkage': linkage_method, 'max_clusters': max_clusters}
+
+    def calculate_efficient_frontier(self):
+        self.solve_telemetry = SolveTelemetry()
+        started = time.perf_counter()
+        clustering = get_clustering(self.covariance_matrix, self.linkage_method, self.market_data_context)
+        self.weights = hierarchical_weights(self.method, self.covariance_matrix, clustering, self.max_clusters)
+        tickers = get_tickers(self.expected_returns, self.covariance_matrix)
+        self.cleaned_weights = dict(clean_weights(self.weights, tickers))
+        self.performance = portfolio_performance(self.weights, self.expected_returns, self.covariance_matrix)
+        self.solve_telemetry.record(HIERARCHICAL_SOLVER, ANALYTIC_STATUS, solve_time=time.perf_counter() - started)
+
+    def efficient_frontier(self, n_points=50):
+        """
+        The allocation does not trade return for risk, its frontier is the single point of its portfolio whatever
+        n_points.
+        """
+        clustering = get_clustering(self.covariance_matrix, self.linkage_method, self.market_data_context)
+        weights = hierarchical_weights(self.method, self.covariance_matrix, clustering, self.max_clusters)
+        return self._get_frontier_results(weights[np.newaxis, :], self.expected_returns, self.covariance_matrix,
+                                          get_tickers(self.expected_returns, self.covariance_matrix))
+
+    def _get_results(self):
+        return pd.DataFrame({
+            HeaderConventions.cleaned_weights_column: [self.cleaned_weights],
+            HeaderConventions.expected_annual_return_column: [self.performance[0]],
+            HeaderConventions.annual_volatility_column: [self.performance[1]],
+            HeaderConventions.sharpe_ratio_column: [self.performance[2]]
+        })
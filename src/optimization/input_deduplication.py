@@ -0,0 +1,84 @@
+import logging
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from src.common.conventions import HeaderConventions
+from src.common.hydra_config_loader import load_config
+from src.common.utils import compute_fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def get_deduplication_config():
+    """(enabled, rtol, atol) of the `deduplicate_inputs` section of config.yaml."""
+    module_name = os.path.basename(os.path.dirname(__file__))
+    deduplication_cfg = load_config(module_name).optimization.deduplicate_inputs
+    return deduplication_cfg.enabled, deduplication_cfg.rtol, deduplication_cfg.atol
+
+
+def _get_labels(values):
+    """Index and columns of a pandas input, the inputs of an alias group are aligned on the same tickers."""
+    if isinstance(values, pd.DataFrame):
+        return tuple(values.index), tuple(values.columns)
+    if isinstance(values, pd.Series):
+        return (tuple(values.index),)
+    return None
+
+
+def group_duplicate_inputs(named_inputs, rtol=1e-10, atol=1e-14):
+    """
+    Alias every input (expected returns or covariance matrix) to the first input with the same tickers and the same
+    values: exact duplicates are found by their fingerprint, the others are compared with `np.allclose(rtol, atol)`
+    to the unique inputs found so far.
+
+    :param named_inputs: {name: values}, e.g. the columns of expected_return_df or risk_return_dict.
+    :return: {name: name of the unique input it is an alias of, itself for a unique input}.
+    """
+    aliases = {}
+    fingerprints = {}
+    unique_inputs = []
+    for name, values in named_inputs.items():
+        labels = _get_labels(values)
+        array = np.asarray(values, dtype=float)
+        fingerprint = compute_fingerprint(labels, array)
+        if fingerprint in fingerprints:
+            aliases[name] = fingerprints[fingerprint]
+            continue
+        aliases[name] = next((unique_name for unique_name, unique_labels, unique_array in unique_inputs
+                              if unique_labels == labels and unique_array.shape == array.shape
+                              and np.allclose(array, unique_array, rtol=rtol, atol=atol, equal_nan=True)), name)
+        fingerprints[fingerprint] = aliases[name]
+        if aliases[name] == name:
+            unique_inputs.append((name, labels, array))
+    duplicates = {name: unique_name for name, unique_name in aliases.items() if name != unique_name}
+    if duplicates:
+        logger.info(f"Inputs solved once for their aliases, {{alias: unique input}}={duplicates}")
+    return aliases
+
+
+def fan_out_results(optimization_df, expected_return_aliases, risk_model_aliases):
+    """
+    Rows of the optimizer grid for every return type and risk model, aliases included, in the order of the grid: the
+    rows of an alias pair are the rows of its unique pair, under the names of the alias. Their Alias Of column holds
+    the "expected return type / risk model" pair they were solved as (None for the unique pairs), their solve
+    telemetry is the one of that pair.
+    """
+    if optimization_df.empty:
+        return optimization_df
+    rows_by_pair = {pair: rows for pair, rows in
+                    optimization_df.groupby([HeaderConventions.expected_return_column,
+                                             HeaderConventions.risk_model_column], sort=False)}
+    fanned_out_rows = [rows_by_pair[(unique_expected_return_type, unique_risk_model_name)].assign(**{
+        HeaderConventions.expected_return_column: expected_return_type,
+        HeaderConventions.risk_model_column: risk_model_name,
+        HeaderConventions.alias_of_column: f"{unique_expected_return_type} / {unique_risk_model_name}"
+        if (expected_return_type, risk_model_name) != (unique_expected_return_type, unique_risk_model_name)
+        else None})
+        for expected_return_type, unique_expected_return_type in expected_return_aliases.items()
+        for risk_model_name, unique_risk_model_name in risk_model_aliases.items()
+        if (unique_expected_return_type, unique_risk_model_name) in rows_by_pair]
+    return pd.concat(fanned_out_rows, ignore_index=True)
@@ -1,5 +1,8 @@
 import logging
+import math
+import multiprocessing
 import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 import numpy as np
@@ -8,25 +11,60 @@ import pandas as pd
 from src.common.conventions import HeaderConventions, PklFileConventions
 from src.common.execution_time_recorder import ExecutionTimeRecorder
 from src.common.hydra_config_loader import load_config
-from src.common.utils import load_data_from_pickle, save_data_to_pickle
+from src.common.result_store import get_result_store
+from src.common.market_data_context import MarketDataContext
+from src.common.utils import compute_fingerprint, load_data_from_cache, save_data_to_cache
 from src.optimization.add_risk_folio_optimizer import ADDRiskFolioOptimizer
+from src.optimization.batched_mean_variance import solve_window_batch
 from src.optimization.cadr_risk_folio_optimizer import CDaRRiskFolioOptimizer
+from src.optimization.closed_form_mean_variance import solve_window_closed_form
 from src.optimization.cvarr_risk_folio_optimizer import CVaRRiskFolioOptimizer
 from src.optimization.eadr_risk_folio_optimizer import EDaRRiskFolioOptimizer
 from src.optimization.evarr_risk_folio_optimizer import EVaRRiskFolioOptimizer
 from src.optimization.flpm_v_risk_folio_optimizer import FLPMRiskFolioOptimizer
 from src.optimization.frontier_with_short_position import PyPortfolioOptFrontierWithShortPosition
+from src.optimization.herc_optimizer import HERCOptimizer
+from src.optimization.hrp_optimizer import HRPOptimizer
+from src.optimization.input_deduplication import fan_out_results, get_deduplication_config, group_duplicate_inputs
 from src.optimization.mad_risk_folio_optimizer import MADRiskFolioOptimizer
 from src.optimization.mdd_risk_folio_optimizer import MDDRiskFolioOptimizer
 from src.optimization.msv_risk_folio_optimizer import MSVRiskFolioOptimizer
+from src.optimization.multi_period import get_multi_period_config, get_turnover_control
 from src.optimization.mv_risk_folio_optimizer import MVRiskFolioOptimizer
+from src.optimization.nco_optimizer import NCOOptimizer
 from src.optimization.py_portfolio_opt_frontier import PyPortfolioOptFrontier
+from src.optimization.py_portfolio_opt_frontier_base import BATCHED_BACKEND, CLOSED_FORM_BACKEND, \
+    LONG_ONLY_WEIGHT_BOUNDS, PyPortfolioOptFrontierBase, get_solver_backend
+from src.optimization.scenario_reduction import get_objective_gap_report, get_scenario_reduction_config, \
+    get_window_scenario_reduction_parameters
 from src.optimization.slpm_risk_folio_optimizer import SLPMRiskFolioOptimizer
+from src.optimization.solver_policy import SOLVE_TELEMETRY_COLUMNS
 from src.optimization.uci_risk_folio_optimizer import UCIRiskFolioOptimizer
 from src.optimization.wr_risk_folio_optimizer import WRRiskFolioOptimizer
 
 logger = logging.getLogger(__name__)
 
+OPTIMIZERS = {
+    'pyPortfolioOptFrontier': PyPortfolioOptFrontier,
+    'pyPortfolioOptFrontierWithShortPosition': PyPortfolioOptFrontierWithShortPosition,
+    'MVRiskFolioOptimizer': MVRiskFolioOptimizer,
+    'MADRiskFolioOptimizer': MADRiskFolioOptimizer,
+    'MSVRiskFolioOptimizer': MSVRiskFolioOptimizer,
+    'FLPMRiskFolioOptimizer': FLPMRiskFolioOptimizer,
+    'SLPMRiskFolioOptimizer': SLPMRiskFolioOptimizer,
+    'CVaRRiskFolioOptimizer': CVaRRiskFolioOptimizer,
+    'EVaRRiskFolioOptimizer': EVaRRiskFolioOptimizer,
+    'WRRiskFolioOptimizer': WRRiskFolioOptimizer,
+    'MDDRiskFolioOptimizer': MDDRiskFolioOptimizer,
+    'ADDRiskFolioOptimizer': ADDRiskFolioOptimizer,
+    'CDaRRiskFolioOptimizer': CDaRRiskFolioOptimizer,
+    'UCIRiskFolioOptimizer': UCIRiskFolioOptimizer,
+    'EDaRRiskFolioOptimizer': EDaRRiskFolioOptimizer,
+    'HRPOptimizer': HRPOptimizer,
+    'HERCOptimizer': HERCOptimizer,
+    'NCOOptimizer': NCOOptimizer
+}
+
 
 def get_all_efficient_frontier_optimizer(expected_return_type,
                                          risk_model_name,
@@ -34,31 +72,29 @@ def get_all_efficient_frontier_optimizer(expected_return_type,
                                          covariance_matrix,
                                          current_month_dir,
                                          enabled_methods,
-                                         data=None):
-    optimizers = {
-        'pyPortfolioOptFrontier': PyPortfolioOptFrontier,
-        'pyPortfolioOptFrontierWithShortPosition': PyPortfolioOptFrontierWithShortPosition,
-        'MVRiskFolioOptimizer': MVRiskFolioOptimizer,
-        'MADRiskFolioOptimizer': MADRiskFolioOptimizer,
-        'MSVRiskFolioOptimizer': MSVRiskFolioOptimizer,
-        'FLPMRiskFolioOptimizer': FLPMRiskFolioOptimizer,
-        'SLPMRiskFolioOptimizer': SLPMRiskFolioOptimizer,
-        'CVaRRiskFolioOptimizer': CVaRRiskFolioOptimizer,
-        'EVaRRiskFolioOptimizer': EVaRRiskFolioOptimizer,
-        'WRRiskFolioOptimizer': WRRiskFolioOptimizer,
-        'MDDRiskFolioOptimizer': MDDRiskFolioOptimizer,
-        'ADDRiskFolioOptimizer': ADDRiskFolioOptimizer,
-        'CDaRRiskFolioOptimizer': CDaRRiskFolioOptimizer,
-        'UCIRiskFolioOptimizer': UCIRiskFolioOptimizer,
-        'EDaRRiskFolioOptimizer': EDaRRiskFolioOptimizer
-    }
+                                         data=None,
+                                         market_data_context=None,
+                                         cache_writes=None,
+                                         previous_weights=None,
+                                         stored_results=None):
+    """
+    Run the enabled optimizers for one return type and risk model, {optimizer: results or the error message and the
+    solve telemetry}.
+    With a cache_writes list, the new results are appended to it as (cache key, fingerprint, results) instead of
+    being written to the result store, so that the caller appends the results of the whole grid in one batch.
+    stored_results holds the rows of `ResultStore.load_all` read once for the whole grid, the cached results are then
+    checked in memory instead of reading the result store for every optimizer.
+    In multi-period mode, previous_weights holds the weights of the previous window by (expected return type, risk
+    model, optimizer class name), every optimizer is solved against its own previous weights.
+    """
 
     # Dictionary to store covariance matrices for each risk model
     optimizers_dict = {}
 
     for enabled_method in enabled_methods:
-        if enabled_method in optimizers:
-            optimizer = optimizers[enabled_method]
+        if enabled_method in OPTIMIZERS:
+            optimizer = OPTIMIZERS[enabled_method]
+            optimizer_instance = None
             try:
                 logger.info(
                     f"Calculating efficient frontier for current_date=`{current_month_dir}`,Risk Model=`{risk_model_name}`, "
@@ -69,22 +105,39 @@ def get_all_efficient_frontier_optimizer(expected_return_type,
                                                expected_return_type=expected_return_type,
                                                risk_return_type=risk_model_name,
                                                output_dir=current_month_dir,
-                                               data=data)
-                optimizer_instance.calculate_efficient_frontier()
-                optimizer_results = optimizer_instance.get_results()
+                                               data=data,
+                                               market_data_context=market_data_context)
+                if previous_weights is not None:
+                    optimizer_instance.set_turnover_control(get_turnover_control(previous_weights.get(
+                        (expected_return_type, risk_model_name, optimizer.__name__))))
+                # Only solve when there are no cached results for the same inputs
+                optimizer_results = optimizer_instance.load_cached_results(stored_results)
+                if optimizer_results is None:
+                    optimizer_instance.calculate_efficient_frontier()
+                    optimizer_results = optimizer_instance.get_results(save_to_cache=cache_writes is None,
+                                                                       stored_results=stored_results)
+                    if cache_writes is not None:
+                        cache_writes.append((optimizer_instance.cache_key,
+                                             optimizer_instance.get_cache_fingerprint(),
+                                             optimizer_results))
                 optimizers_dict[optimizer] = optimizer_results
             except Exception as e:
                 logger.error(
                     f"Calculating efficient frontier current_date=`{current_month_dir},Risk Model=`{risk_model_name}`, "
                     f"Return Type=`{expected_return_type}`" + f",optimizer=`{optimizer}`" + f" failed with error: {e}")
-                optimizers_dict[optimizer] = f" failed with error: {e}"
+                # The error message with the solve telemetry of the failed optimization
+                optimizers_dict[optimizer] = {
+                    HeaderConventions.weights_column: f" failed with error: {e}",
+                    **(optimizer_instance.get_solve_telemetry() if optimizer_instance is not None
+                       else dict.fromkeys(SOLVE_TELEMETRY_COLUMNS, np.nan))}
         else:
-            logger.warning("Optimizer{}  %s not found in return optimizers_dict={}", enabled_method, optimizers_dict)
+            logger.warning(f"Optimizer=`{enabled_method}` not found in the available optimizers={list(OPTIMIZERS)}")
     return optimizers_dict
 
 
 def process_optimizer_results(expected_return_type, risk_model_name, mu, cov_matrix, data, current_month_dir,
-                              enabled_methods):
+                              enabled_methods, market_data_context=None, cache_writes=None, previous_weights=None,
+                              stored_results=None):
     """
     Process the optimizer results for a given return type and risk model.
     """
@@ -96,14 +149,18 @@ def process_optimizer_results(expected_return_type, risk_model_name, mu, cov_mat
                                                                cov_matrix,
                                                                current_month_dir,
                                                                enabled_methods,
-                                                               data)
+                                                               data,
+                                                               market_data_context,
+                                                               cache_writes,
+                                                               previous_weights,
+                                                               stored_results)
         for optimizer_name, result in optimizers_dict.items():
-            if 'error' in result:
+            if isinstance(result, dict):
                 result_dict = {
                     HeaderConventions.expected_return_column: expected_return_type,
                     HeaderConventions.risk_model_column: risk_model_name,
                     HeaderConventions.optimizer_column: optimizer_name,
-                    HeaderConventions.weights_column: result,
+                    HeaderConventions.weights_column: result[HeaderConventions.weights_column],
                     HeaderConventions.expected_annual_return_column: np.nan,
                     HeaderConventions.annual_volatility_column: np.nan,
                     HeaderConventions.sharpe_ratio_column: np.nan}
@@ -118,6 +175,9 @@ def process_optimizer_results(expected_return_type, risk_model_name, mu, cov_mat
                     HeaderConventions.annual_volatility_column: result[HeaderConventions.annual_volatility_column],
                     HeaderConventions.sharpe_ratio_column: result[HeaderConventions.sharpe_ratio_column]
                 }
+            # Solver, status, iterations, compile and solve times, NaN for results cached without them
+            result_dict.update({column: result[column] if column in result else np.nan
+                                for column in SOLVE_TELEMETRY_COLUMNS + (HeaderConventions.turnover_column,)})
             results.append(result_dict)
     except Exception as e:
         logger.error(
@@ -126,22 +186,247 @@ def process_optimizer_results(expected_return_type, risk_model_name, mu, cov_mat
     return results
 
 
+def get_enabled_methods():
+    module_name = os.path.basename(os.path.dirname(__file__))
+    returns_cfg = load_config(module_name)
+    enabled_methods = returns_cfg.optimization.enabled_methods
+    logger.info("loading optmizers config for enabled_methods: %s", enabled_methods)
+    return enabled_methods
+
+
+def get_parallel_config():
+    """Number of worker processes and tasks per chunk of the optimizer grid, from config.yaml."""
+    module_name = os.path.basename(os.path.dirname(__file__))
+    optimization_cfg = load_config(module_name).optimization
+    return optimization_cfg.get('max_workers', 1), optimization_cfg.get('chunk_size', None)
+
+
+def get_optimizer_config_parameters(enabled_methods):
+    """Config parameters of every enabled optimizer class, {method: parameters}, see `get_config_cache_parameters`."""
+    return {enabled_method: OPTIMIZERS[enabled_method].get_config_cache_parameters()
+            for enabled_method in enabled_methods if enabled_method in OPTIMIZERS}
+
+
+def _solve_window_portfolios(expected_return_df, risk_return_dict, enabled_methods, market_data_context,
+                             previous_weights=None):
+    """
+    Solve the max Sharpe ratio portfolios of the enabled PyPortfolioOpt frontiers for all the return types and risk
+    models at once, memoized in the MarketDataContext for the optimizers: with the `batched` backend the long only
+    portfolios in one batch, with the `closed_form` backend (and the other weight bounds of the `batched` backend) in
+    one stacked closed form solve per weight bounds. In multi-period mode the batch starts from the weights of the
+    previous window, and the portfolios with turnover controls are left to the frontiers.
+    """
+    solver_backend = get_solver_backend()
+    if solver_backend not in (BATCHED_BACKEND, CLOSED_FORM_BACKEND):
+        return
+    if previous_weights is not None:
+        multi_period_cfg = get_multi_period_config()
+        if multi_period_cfg.turnover_penalty > 0 or multi_period_cfg.max_turnover is not None:
+            return
+    for enabled_method in enabled_methods:
+        optimizer = OPTIMIZERS.get(enabled_method)
+        if optimizer is None or not issubclass(optimizer, PyPortfolioOptFrontierBase):
+            continue
+        if solver_backend == BATCHED_BACKEND and tuple(optimizer.WEIGHT_BOUNDS) == LONG_ONLY_WEIGHT_BOUNDS:
+            initial_weights_dict = None
+            if previous_weights is not None:
+                initial_weights_dict = {(expected_return_type, risk_model_name): weights
+                                        for (expected_return_type, risk_model_name, optimizer_name), weights
+                                        in previous_weights.items() if optimizer_name == optimizer.__name__}
+            solve_window_batch(market_data_context, expected_return_df, risk_return_dict, initial_weights_dict)
+        else:
+            solve_window_closed_form(market_data_context, expected_return_df, risk_return_dict,
+                                     optimizer.WEIGHT_BOUNDS)
+
+
+def _run_optimization_chunk(risk_model_name, cov_matrix, tasks, data, current_month_dir, market_data_context,
+                            previous_weights=None, stored_results=None):
+    """
+    Run a chunk of the optimizer grid sharing the covariance of risk_model_name, in a worker process.
+
+    :param tasks: List of (key, expected_return_type, mu, enabled_methods).
+    :param stored_results: Rows of the result store for the chunk, read once for the grid by the calling process.
+    :return: List of (key, results) and the cache writes left to the caller.
+    """
+    # The memoized statistics are not sent to the workers, the batch of a chunk is its return types
+    _solve_window_portfolios(pd.DataFrame({expected_return_type: mu for _, expected_return_type, mu, _ in tasks}),
+                             {risk_model_name: cov_matrix},
+                             {method for _, _, _, methods in tasks for method in methods},
+                             market_data_context,
+                             previous_weights)
+    cache_writes = []
+    chunk_results = [(key, process_optimizer_results(expected_return_type,
+                                                     risk_model_name,
+                                                     mu,
+                                                     cov_matrix,
+                                                     data,
+                                                     current_month_dir,
+                                                     methods,
+                                                     market_data_context,
+                                                     cache_writes,
+                                                     previous_weights,
+                                                     stored_results))
+                     for key, expected_return_type, mu, methods in tasks]
+    return chunk_results, cache_writes
+
+
+def get_optimization_chunks(expected_return_df, risk_return_dict, enabled_methods, chunk_size):
+    """
+    Flatten the grid of return types x risk models x optimizers into chunks of at most chunk_size optimizations.
+    The chunks never mix risk models, so every worker receives a single covariance matrix per chunk.
+
+    :return: List of (risk_model_name, tasks), a task is (key, expected_return_type, mu, enabled_methods) and the
+             key (return type position, risk model position, first optimizer position) orders the results as the
+             serial loop does.
+    """
+    chunks = []
+    for risk_model_position, (risk_model_name, cov_matrix) in enumerate(risk_return_dict.items()):
+        optimizations = [(expected_return_position, expected_return_type, method_position)
+                         for expected_return_position, expected_return_type in enumerate(expected_return_df.columns)
+                         if cov_matrix.shape[0] == expected_return_df[expected_return_type].shape[0]
+                         for method_position in range(len(enabled_methods))]
+        for first_optimization in range(0, len(optimizations), chunk_size):
+            tasks = []
+            for expected_return_position, expected_return_type, method_position in \
+                    optimizations[first_optimization:first_optimization + chunk_size]:
+                # Consecutive optimizers of the same return type are solved by one task
+                if tasks and tasks[-1][1] == expected_return_type:
+                    tasks[-1][3].append(enabled_methods[method_position])
+                else:
+                    tasks.append(((expected_return_position, risk_model_position, method_position),
+                                  expected_return_type,
+                                  expected_return_df[expected_return_type],
+                                  [enabled_methods[method_position]]))
+            chunks.append((risk_model_name, tasks))
+    return chunks
+
+
+def _calculate_optimizations_in_parallel(expected_return_df, risk_return_dict, data, current_month_dir,
+                                         enabled_methods, market_data_context, max_workers, chunk_size,
+                                         previous_weights=None):
+    """
+    Run the chunks of the optimizer grid on a process pool. The result store of the window is read once by this
+    process, every chunk receives its rows. The results are gathered in the order of the serial loop and the new
+    results are appended to the result store of the window by this process only, in one batch.
+    """
+    enabled_methods = list(enabled_methods)
+    if chunk_size is None:
+        # A few chunks per worker balance the load while keeping the covariance of a chunk shared
+        number_of_optimizations = len(expected_return_df.columns) * len(risk_return_dict) * len(enabled_methods)
+        chunk_size = max(1, math.ceil(number_of_optimizations / (4 * max_workers)))
+    chunks = get_optimization_chunks(expected_return_df, risk_return_dict, enabled_methods, chunk_size)
+    logger.info(f"Running {len(chunks)} optimization chunks of at most {chunk_size} optimizations on "
+                f"max_workers={max_workers} for current_date=`{current_month_dir}`")
+
+    stored_results = get_result_store(current_month_dir).load_all()
+    keyed_results = []
+    all_cache_writes = []
+    # The grid runs in a stage thread next to other stages: forking would copy the locks they hold (logging, config,
+    # cache manifest) into the workers, spawned workers start from a clean interpreter
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = [executor.submit(_run_optimization_chunk,
+                                   risk_model_name,
+                                   risk_return_dict[risk_model_name],
+                                   tasks,
+                                   data,
+                                   current_month_dir,
+                                   market_data_context,
+                                   previous_weights,
+                                   {key: fingerprint_and_results
+                                    for key, fingerprint_and_results in stored_results.items()
+                                    if key[1] == risk_model_name and key[0] in {task[1] for task in tasks}})
+                   for risk_model_name, tasks in chunks]
+        for future in futures:
+            chunk_results, cache_writes = future.result()
+            keyed_results.extend(chunk_results)
+            all_cache_writes.extend(cache_writes)
+    get_result_store(current_month_dir).put_many(all_cache_writes)
+
+    all_results = []
+    for _, results in sorted(keyed_results, key=lambda keyed_result: keyed_result[0]):
+        all_results.extend(results)
+    return all_results
+
+
 @ExecutionTimeRecorder(module_name=__name__)
 def calculate_optimizations_for_risk_model(expected_return_df,
                                            risk_return_dict,
                                            data,
                                            current_month_dir,
-                                           enabled_methods=None):
+                                           enabled_methods=None,
+                                           market_data_context=None,
+                                           max_workers=None,
+                                           chunk_size=None,
+                                           deduplicate=None,
+                                           previous_weights=None):
     """
     Calculate optimizations for all risk models and expected return types.
+
+    With max_workers > 1, the grid of return types x risk models x optimizers is split into chunks of chunk_size
+    optimizations sharing the same covariance matrix and run on a process pool, the results keep the same order.
+    max_workers and chunk_size default to the `optimization` section of config.yaml.
+
+    With deduplicate, return types and risk models whose inputs are equal (within the tolerances of the
+    `deduplicate_inputs` section of config.yaml, which also holds the default) are solved once, and the results of the
+    unique pair are fanned out to all its aliases.
+
+    In multi-period mode, previous_weights holds the weights of the previous window by (expected return type, risk
+    model, optimizer class name), see `get_all_efficient_frontier_optimizer`.
     """
-    module_name = os.path.basename(os.path.dirname(__file__))
-    returns_cfg = load_config(module_name)
     if enabled_methods is None:
-        enabled_methods = returns_cfg.optimization.enabled_methods
-    logger.info("loading optmizers config for enabled_methods: %s", enabled_methods)
+        enabled_methods = get_enabled_methods()
+    if market_data_context is None:
+        market_data_context = MarketDataContext(data)
+    # Only the values not given by the caller are read from the config
+    config_max_workers, config_chunk_size = get_parallel_config()
+    if max_workers is None:
+        max_workers = config_max_workers
+    if chunk_size is None:
+        chunk_size = config_chunk_size
+    deduplication_enabled, rtol, atol = get_deduplication_config()
+    if deduplicate is None:
+        deduplicate = deduplication_enabled
+
+    if deduplicate:
+        expected_return_aliases = group_duplicate_inputs(
+            {expected_return_type: expected_return_df[expected_return_type]
+             for expected_return_type in expected_return_df.columns}, rtol, atol)
+        risk_model_aliases = group_duplicate_inputs(risk_return_dict, rtol, atol)
+        unique_expected_return_df = expected_return_df[[expected_return_type
+                                                        for expected_return_type, unique_expected_return_type
+                                                        in expected_return_aliases.items()
+                                                        if expected_return_type == unique_expected_return_type]]
+        unique_risk_return_dict = {risk_model_name: cov_matrix
+                                   for risk_model_name, cov_matrix in risk_return_dict.items()
+                                   if risk_model_aliases[risk_model_name] == risk_model_name}
+        optimization_df = _calculate_optimization_grid(unique_expected_return_df, unique_risk_return_dict, data,
+                                                       current_month_dir, enabled_methods, market_data_context,
+                                                       max_workers, chunk_size, previous_weights)
+        return fan_out_results(optimization_df, expected_return_aliases, risk_model_aliases)
+    return _calculate_optimization_grid(expected_return_df, risk_return_dict, data, current_month_dir, enabled_methods,
+                                        market_data_context, max_workers, chunk_size, previous_weights)
+
 
+def _calculate_optimization_grid(expected_return_df, risk_return_dict, data, current_month_dir, enabled_methods,
+                                 market_data_context, max_workers, chunk_size, previous_weights=None):
+    """Rows of every return type, risk model and optimizer of the grid, serially or on a process pool."""
+    if max_workers is not None and max_workers > 1:
+        return pd.DataFrame(_calculate_optimizations_in_parallel(expected_return_df,
+                                                                 risk_return_dict,
+                                                                 data,
+                                                                 current_month_dir,
+                                                                 enabled_methods,
+                                                                 market_data_context,
+                                                                 max_workers,
+                                                                 chunk_size,
+                                                                 previous_weights))
+
+    _solve_window_portfolios(expected_return_df, risk_return_dict, enabled_methods, market_data_context,
+                             previous_weights)
+    # The stored results of the whole grid with one read, checked in memory for every optimizer
+    stored_results = get_result_store(current_month_dir).load_all()
     all_results = []
+    cache_writes = []
     for expected_return_type in expected_return_df.columns:
         mu = expected_return_df[expected_return_type]
 
@@ -153,11 +438,141 @@ def calculate_optimizations_for_risk_model(expected_return_df,
                                                     cov_matrix,
                                                     data,
                                                     current_month_dir,
-                                                    enabled_methods)
+                                                    enabled_methods,
+                                                    market_data_context,
+                                                    cache_writes,
+                                                    previous_weights,
+                                                    stored_results)
                 all_results.extend(results)
+    # The new results of the window in one transaction
+    get_result_store(current_month_dir).put_many(cache_writes)
     return pd.DataFrame(all_results)
 
 
+def get_efficient_frontier_config():
+    """`efficient_frontier` section of config.yaml: whether the frontiers are computed and their number of points."""
+    module_name = os.path.basename(os.path.dirname(__file__))
+    return load_config(module_name).optimization.efficient_frontier
+
+
+@ExecutionTimeRecorder(module_name=__name__)
+def calculate_efficient_frontiers(data: pd.DataFrame,
+                                  expected_return_df: pd.DataFrame,
+                                  risk_return_dict: dict,
+                                  current_dir: Path,
+                                  enabled_methods=None,
+                                  market_data_context=None,
+                                  n_points=None):
+    """
+    Efficient frontier of n_points portfolios for every return type, risk model and optimizer, one row per
+    combination with the frontier returns, volatilities and weights (or the error message in the weights column).
+    n_points defaults to the `efficient_frontier` section of config.yaml, where the frontiers are disabled by default:
+    returns None when disabled and n_points is not given.
+    """
+    if n_points is None:
+        frontier_cfg = get_efficient_frontier_config()
+        if not frontier_cfg.enabled:
+            return None
+        n_points = frontier_cfg.n_points
+    if enabled_methods is None:
+        enabled_methods = get_enabled_methods()
+    if market_data_context is None:
+        market_data_context = MarketDataContext(data)
+
+    pkl_filepath = Path(current_dir) / PklFileConventions.efficient_frontiers_pkl_filename
+    # Same config of the optimizers and scenario reduction as the fingerprint of the results of the window
+    fingerprint = compute_fingerprint(market_data_context.fingerprint,
+                                      expected_return_df,
+                                      risk_return_dict,
+                                      list(enabled_methods),
+                                      get_optimizer_config_parameters(enabled_methods),
+                                      get_window_scenario_reduction_parameters(),
+                                      n_points)
+    frontiers_df = load_data_from_cache(pkl_filepath, fingerprint)
+    if frontiers_df is not None:
+        logger.info(f"cache exists={pkl_filepath},loading efficient frontiers from cache..")
+        return frontiers_df
+
+    logger.info(f"calculating efficient frontiers of n_points={n_points} for current_date=`{current_dir}`")
+    all_frontiers = []
+    for expected_return_type in expected_return_df.columns:
+        mu = expected_return_df[expected_return_type]
+        for risk_model_name, cov_matrix in risk_return_dict.items():
+            if cov_matrix.shape[0] != mu.shape[0]:
+                continue
+            for enabled_method in enabled_methods:
+                if enabled_method not in OPTIMIZERS:
+                    logger.warning(f"Optimizer=`{enabled_method}` not found in the available "
+                                   f"optimizers={list(OPTIMIZERS)}")
+                    continue
+                frontier_dict = {HeaderConventions.expected_return_column: expected_return_type,
+                                 HeaderConventions.risk_model_column: risk_model_name,
+                                 HeaderConventions.optimizer_column: enabled_method}
+                try:
+                    optimizer_instance = OPTIMIZERS[enabled_method](expected_returns=mu,
+                                                                    covariance_matrix=cov_matrix,
+                                                                    expected_return_type=expected_return_type,
+                                                                    risk_return_type=risk_model_name,
+                                                                    output_dir=current_dir,
+                                                                    data=data,
+                                                                    market_data_context=market_data_context)
+                    frontier_dict.update(optimizer_instance.efficient_frontier(n_points).iloc[0].to_dict())
+                except Exception as e:
+                    logger.error(f"Calculating the efficient frontier for current_date=`{current_dir}`,Risk Model="
+                                 f"`{risk_model_name}`, Return Type=`{expected_return_type}`,optimizer="
+                                 f"`{enabled_method}` failed with error: {e}")
+                    frontier_dict.update({HeaderConventions.frontier_returns_column: np.nan,
+                                          HeaderConventions.frontier_volatilities_column: np.nan,
+                                          HeaderConventions.frontier_weights_column: f" failed with error: {e}"})
+                all_frontiers.append(frontier_dict)
+
+    frontiers_df = pd.DataFrame(all_frontiers)
+    save_data_to_cache(pkl_filepath, fingerprint, frontiers_df)
+    return frontiers_df
+
+
+@ExecutionTimeRecorder(module_name=__name__)
+def calculate_scenario_reduction_reports(data: pd.DataFrame,
+                                         expected_return_df: pd.DataFrame,
+                                         risk_return_dict: dict,
+                                         current_dir: Path,
+                                         market_data_context=None):
+    """
+    Objective gap of the scenario reduction (`get_objective_gap_report`) for every return type, one row per return
+    type and reduced risk measure. The risk measures of historical scenarios do not use the covariance, the first
+    risk model of the window is taken. Returns None unless the reduction and its report are enabled in the
+    `scenario_reduction` section of config.yaml.
+    """
+    reduction_cfg = get_scenario_reduction_config()
+    if not (reduction_cfg.enabled and reduction_cfg.report):
+        return None
+    if market_data_context is None:
+        market_data_context = MarketDataContext(data)
+
+    pkl_filepath = Path(current_dir) / PklFileConventions.scenario_reduction_report_pkl_filename
+    fingerprint = compute_fingerprint(data, expected_return_df, risk_return_dict, dict(reduction_cfg))
+    report_df = load_data_from_cache(pkl_filepath, fingerprint)
+    if report_df is not None:
+        logger.info(f"cache exists={pkl_filepath},loading scenario reduction report from cache..")
+        return report_df
+
+    logger.info(f"calculating scenario reduction report for current_date=`{current_dir}`")
+    all_reports = []
+    for expected_return_type in expected_return_df.columns:
+        mu = expected_return_df[expected_return_type]
+        cov_matrix = next((cov_matrix for cov_matrix in risk_return_dict.values()
+                           if cov_matrix.shape[0] == mu.shape[0]), None)
+        if cov_matrix is None:
+            continue
+        report_df = get_objective_gap_report(market_data_context, mu, cov_matrix)
+        report_df.insert(0, HeaderConventions.expected_return_column, expected_return_type)
+        all_reports.append(report_df)
+
+    report_df = pd.concat(all_reports, ignore_index=True) if all_reports else pd.DataFrame()
+    save_data_to_cache(pkl_filepath, fingerprint, report_df)
+    return report_df
+
+
 # Assuming df is your DataFrame
 def clean_metadata(value):
     if isinstance(value, pd.Series):
@@ -182,12 +597,37 @@ def calculate_optimizations(data: pd.DataFrame,
                             expected_return_df: pd.DataFrame,
                             risk_return_dict: dict,
                             current_dir: Path,
-                            enabled_methods=None):
+                            enabled_methods=None,
+                            market_data_context=None,
+                            max_workers=None,
+                            chunk_size=None,
+                            previous_weights=None):
     """
     Iterate over each return type and risk model to calculate optimizations.
+    max_workers and chunk_size control the process pool the optimizer grid runs on, see
+    `calculate_optimizations_for_risk_model`.
+    In multi-period mode, previous_weights holds the weights of the previous window (`get_previous_weights`).
     """
     logger.info("calculating optimizations for the month {}".format(current_dir))
-    optimized_df = load_data_from_pickle(current_dir / PklFileConventions.optimization_for_all_type_pkl_filename)
+    if enabled_methods is None:
+        enabled_methods = get_enabled_methods()
+    if market_data_context is None:
+        market_data_context = MarketDataContext(data)
+    # The previous weights change the results, single period fingerprints are left unchanged
+    multi_period_parameters = (previous_weights, dict(get_multi_period_config())) \
+        if previous_weights is not None else ()
+    # The results of the window are read before the cache of every optimizer, so the fingerprint also covers the
+    # config of the optimizers, the inputs merged by the deduplication and the scenario reduction of the risk measures
+    fingerprint = compute_fingerprint(market_data_context.fingerprint,
+                                      expected_return_df,
+                                      risk_return_dict,
+                                      list(enabled_methods),
+                                      get_optimizer_config_parameters(enabled_methods),
+                                      get_deduplication_config(),
+                                      get_window_scenario_reduction_parameters(),
+                                      *multi_period_parameters)
+    optimized_df = load_data_from_cache(current_dir / PklFileConventions.optimization_for_all_type_pkl_filename,
+                                        fingerprint)
     if optimized_df is not None:
         logger.info(
             f"cache exists={current_dir / PklFileConventions.optimization_for_all_type_pkl_filename},loading optimized data from cache..")
@@ -203,11 +643,16 @@ def calculate_optimizations(data: pd.DataFrame,
                                                                risk_return_dict,
                                                                data,
                                                                current_dir,
-                                                               enabled_methods)
+                                                               enabled_methods,
+                                                               market_data_context,
+                                                               max_workers,
+                                                               chunk_size,
+                                                               previous_weights=previous_weights)
 
     # Clean the metadata and extract the values from the DataFrame
     df1 = optimization_data.apply(lambda x: x.map(clean_metadata))
     optimization_data_cleaned = df1.apply(lambda x: x.map(extract_value))
-    save_data_to_pickle(current_dir / PklFileConventions.optimization_for_all_type_pkl_filename,
-                        optimization_data_cleaned)
+    save_data_to_cache(current_dir / PklFileConventions.optimization_for_all_type_pkl_filename,
+                       fingerprint,
+                       optimization_data_cleaned)
     return optimization_data_cleaned
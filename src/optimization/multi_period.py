@@ -0,0 +1,179 @@
+import os
+import threading
+import time
+from functools import lru_cache
+
+import cvxpy as cp
+import numpy as np
+import pandas as pd
+from pypfopt.exceptions import OptimizationError
+
+from src.common.conventions import HeaderConventions
+from src.common.hydra_config_loader import load_config
+from src.optimization.parametric_mean_variance import clean_weights, covariance_factor, get_tickers, \
+    portfolio_performance
+
+# Compiled turnover problems of the process, keyed by (number of assets, weight bounds, constrained)
+_turnover_problems = {}
+_turnover_problems_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_multi_period_config():
+    """`multi_period` section of config.yaml: whether the windows are chained and their turnover controls."""
+    module_name = os.path.basename(os.path.dirname(__file__))
+    return load_config(module_name).optimization.multi_period
+
+
+def get_previous_weights(optimized_df):
+    """
+    Weights of every successful optimization of a window, {(expected return type, risk model, optimizer class name):
+    weights by ticker}, the failed optimizations hold their error message instead of weights and are left out.
+    """
+    previous_weights = {}
+    if optimized_df is None or optimized_df.empty:
+        return previous_weights
+    for _, row in optimized_df.iterrows():
+        weights = row[HeaderConventions.weights_column]
+        if isinstance(weights, dict):
+            optimizer = row[HeaderConventions.optimizer_column]
+            previous_weights[(row[HeaderConventions.expected_return_column],
+                              row[HeaderConventions.risk_model_column],
+                              getattr(optimizer, '__name__', optimizer))] = pd.Series(weights, dtype=float)
+    return previous_weights
+
+
+def calculate_turnover(weights, previous_weights):
+    """L1 turnover sum(|w - w_prev|) between two {ticker: weight} portfolios, a missing ticker has a weight of 0."""
+    weights, previous_weights = pd.Series(weights, dtype=float), pd.Series(previous_weights, dtype=float)
+    tickers = weights.index.union(previous_weights.index)
+    return float((weights.reindex(tickers, fill_value=0) - previous_weights.reindex(tickers, fill_value=0)).abs().sum())
+
+
+class TurnoverControl:
+    """
+    Weights of the previous window of an optimizer and the turnover controls against them: the L1 penalty
+    turnover_penalty * sum(|w - w_prev|) and L1 limit max_turnover of the mean variance frontiers, and the per asset
+    limit max_asset_turnover of the Riskfolio turnover constraint. None disables a limit.
+    """
+
+    def __init__(self, previous_weights, turnover_penalty=0.0, max_turnover=None, max_asset_turnover=None):
+        self.previous_weights = pd.Series(previous_weights, dtype=float)
+        self.turnover_penalty = turnover_penalty
+        self.max_turnover = max_turnover
+        self.max_asset_turnover = max_asset_turnover
+
+    def get_cache_parameters(self):
+        return {'previous_weights': self.previous_weights.to_dict(), 'turnover_penalty': self.turnover_penalty,
+                'max_turnover': self.max_turnover, 'max_asset_turnover': self.max_asset_turnover}
+
+    def controls_mean_variance(self):
+        """
+        Whether the mean variance problem changes, otherwise the previous weights only warm start the batched backend.
+        """
+        return self.turnover_penalty > 0 or self.max_turnover is not None
+
+    def get_aligned_weights(self, tickers):
+        """(assets,) previous weights in the order of the tickers, 0 for a ticker without a previous weight."""
+        return self.previous_weights.reindex(tickers, fill_value=0).to_numpy()
+
+    def get_turnover(self, weights):
+        return calculate_turnover(weights, self.previous_weights)
+
+
+def get_turnover_control(previous_weights):
+    """Turnover control of the previous weights with the limits of the `multi_period` config, None without them."""
+    if previous_weights is None:
+        return None
+    multi_period_cfg = get_multi_period_config()
+    return TurnoverControl(previous_weights, multi_period_cfg.turnover_penalty, multi_period_cfg.max_turnover,
+                           multi_period_cfg.max_asset_turnover)
+
+
+class TurnoverMeanVarianceProblem:
+    """
+    Max Sharpe ratio problem of `ParametricMeanVarianceProblem` with turnover controls against the previous weights
+    w_prev, compiled once for a number of assets, weight bounds and whether the turnover is limited.
+
+    With the weights y / k of the variable transformation, the L1 limit sum(|w - w_prev|) <= max_turnover is exactly
+    sum(|y - k w_prev|) <= max_turnover * k. The penalty turnover_penalty * sum(|y - k w_prev|) is added to y' S y, so
+    the problem maximizes the Sharpe ratio with the variance increased by the penalty times the turnover times the
+    excess return of the portfolio, the max Sharpe ratio portfolio for a penalty of 0.
+    """
+
+    def __init__(self, number_of_assets, weight_bounds=(0, 1), constrained=False):
+        lower, upper = weight_bounds
+        self.excess_returns = cp.Parameter(number_of_assets)
+        self.factor = cp.Parameter((number_of_assets, number_of_assets))
+        self.previous_weights = cp.Parameter(number_of_assets)
+        self.turnover_penalty = cp.Parameter(nonneg=True)
+        self.max_turnover = cp.Parameter(nonneg=True)
+        self.weights = cp.Variable(number_of_assets)
+        self.scale = cp.Variable()
+        # |y - k w_prev| of every asset as a variable, so that the parameters only multiply variables (DPP)
+        self.trades = cp.Variable(number_of_assets)
+        constraints = [self.excess_returns @ self.weights == 1,
+                       cp.sum(self.weights) == self.scale,
+                       self.scale >= 0,
+                       self.weights >= lower * self.scale,
+                       self.weights <= upper * self.scale,
+                       self.trades >= self.weights - self.scale * self.previous_weights,
+                       self.trades >= self.scale * self.previous_weights - self.weights]
+        if constrained:
+            constraints.append(cp.sum(self.trades) <= self.max_turnover * self.scale)
+        self.problem = cp.Problem(cp.Minimize(cp.sum_squares(self.factor @ self.weights)
+                                              + self.turnover_penalty * cp.sum(self.trades)), constraints)
+        # One solve at a time, the parameters are shared
+        self.lock = threading.Lock()
+
+    def solve(self, expected_returns, covariance_matrix, previous_weights, turnover_penalty=0.0, max_turnover=None,
+              risk_free_rate=0.0, solve_telemetry=None):
+        """
+        Weights (array) for the expected returns, covariance and previous weights, raises like PyPortfolioOpt. The
+        solve is recorded in solve_telemetry, see `ParametricMeanVarianceProblem.solve`.
+        """
+        expected_returns = np.asarray(expected_returns, dtype=float)
+        if expected_returns.max() <= risk_free_rate:
+            raise ValueError("at least one of the assets must have an expected return exceeding the risk-free rate")
+        with self.lock:
+            self.excess_returns.value = expected_returns - risk_free_rate
+            self.factor.value = covariance_factor(covariance_matrix)
+            self.previous_weights.value = np.asarray(previous_weights, dtype=float)
+            self.turnover_penalty.value = turnover_penalty
+            self.max_turnover.value = max_turnover if max_turnover is not None else 0.0
+            started = time.perf_counter()
+            try:
+                self.problem.solve()
+            except (TypeError, cp.DCPError, cp.SolverError) as e:
+                raise OptimizationError from e
+            if solve_telemetry is not None:
+                solve_telemetry.record_problem(self.problem, None, time.perf_counter() - started)
+            if self.problem.status not in {"optimal", "optimal_inaccurate"}:
+                raise OptimizationError(f"Solver status: {self.problem.status}")
+            weights = self.weights.value / self.scale.value
+        # Same rounding as PyPortfolioOpt, +0.0 removes signed zero
+        return weights.round(16) + 0.0
+
+
+def get_turnover_problem(number_of_assets, weight_bounds=(0, 1), constrained=False):
+    key = (number_of_assets, tuple(weight_bounds), constrained)
+    with _turnover_problems_lock:
+        if key not in _turnover_problems:
+            _turnover_problems[key] = TurnoverMeanVarianceProblem(number_of_assets, weight_bounds, constrained)
+        return _turnover_problems[key]
+
+
+def optimize_max_sharpe_with_turnover(expected_returns, covariance_matrix, turnover_control, weight_bounds=(0, 1),
+                                      risk_free_rate=0.0, solve_telemetry=None):
+    """
+    Max Sharpe ratio portfolio with the turnover controls of turnover_control, with the outputs of
+    `optimize_mean_variance`: raw weights, cleaned weights and the (expected return, volatility, Sharpe ratio). The
+    solve is recorded in the SolveTelemetry solve_telemetry when given.
+    """
+    tickers = get_tickers(expected_returns, covariance_matrix)
+    problem = get_turnover_problem(len(tickers), weight_bounds, turnover_control.max_turnover is not None)
+    weights = problem.solve(expected_returns, covariance_matrix, turnover_control.get_aligned_weights(tickers),
+                            turnover_control.turnover_penalty, turnover_control.max_turnover, risk_free_rate,
+                            solve_telemetry)
+    performance = portfolio_performance(weights, expected_returns, covariance_matrix, risk_free_rate)
+    return weights, clean_weights(weights, tickers), performance
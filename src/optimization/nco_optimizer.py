@@ -0,0 +1,13 @@
+from src.common.execution_time_recorder import ExecutionTimeRecorder
+from src.optimization.hierarchical_allocation import NCO_METHOD
+from src.optimization.hierarchical_frontier_base import HierarchicalFrontierBase
+
+
+class NCOOptimizer(HierarchicalFrontierBase):
+    method = NCO_METHOD
+
+    @ExecutionTimeRecorder(module_name=__name__)
+    def __init__(self, expected_returns, covariance_matrix, expected_return_type, risk_return_type, output_dir=None,
+                 data=None, market_data_context=None):
+        super().__init__(expected_returns, covariance_matrix, expected_return_type, risk_return_type, output_dir, data,
+                         market_data_context=market_data_context)
@@ -0,0 +1,222 @@
+import threading
+
+import cvxpy as cp
+import numpy as np
+from pypfopt.cla import CLA
+from pypfopt.exceptions import OptimizationError
+
+from src.optimization.closed_form_mean_variance import solve_closed_form, solve_closed_form_frontier, within_bounds
+from src.optimization.parametric_mean_variance import covariance_factor
+
+MEAN_VARIANCE_RISK_MEASURE = 'MV'
+# Risk measures of the Riskfolio optimizers computed on the return scenarios, as defined by
+# `riskfolio.Portfolio.optimization` with model='Classic' and hist=True
+SCENARIO_RISK_MEASURES = ('MAD', 'MSV', 'CVaR', 'EVaR', 'WR', 'FLPM', 'SLPM', 'MDD', 'ADD', 'CDaR', 'EDaR', 'UCI')
+PARAMETRIC_FRONTIER_RISK_MEASURES = (MEAN_VARIANCE_RISK_MEASURE,) + SCENARIO_RISK_MEASURES
+# Solvers tried when the default solver of CVXPY fails, e.g. the interior point solver on some exponential cones
+FALLBACK_SOLVERS = (cp.SCS,)
+
+# Compiled frontier problems of the process, keyed by (risk measure, assets, observations, weight bounds, alpha, rf)
+_frontier_problems = {}
+_frontier_problems_lock = threading.Lock()
+
+
+def _entropic_value_at_risk(losses, number_of_observations, alpha, scale=1):
+    """
+    Entropic value at risk of the (observations,) losses expression, with its exponential cone constraints multiplied
+    by scale (Riskfolio scales them for the daily losses of the EVaR).
+    """
+    t = cp.Variable()
+    s = cp.Variable(nonneg=True)
+    u = cp.Variable(number_of_observations)
+    constraints = [cp.sum(u) * scale <= s * scale,
+                   cp.ExpCone(losses * scale - t * scale, s * np.ones(number_of_observations) * scale, u * scale)]
+    return t + s * np.log(1 / (alpha * number_of_observations)), constraints
+
+
+def _scenario_risk(risk_measure, portfolio_returns, mean_return, number_of_observations, alpha, risk_free_rate):
+    """Risk of the (observations,) portfolio returns expression and the constraints of its auxiliary variables."""
+    T = number_of_observations
+    if risk_measure == 'MAD':
+        return cp.sum(cp.pos(mean_return - portfolio_returns)) / T, []
+    if risk_measure == 'MSV':
+        return cp.norm(cp.pos(mean_return - portfolio_returns), 2) / np.sqrt(T - 1), []
+    if risk_measure == 'CVaR':
+        value_at_risk = cp.Variable()
+        return value_at_risk + cp.sum(cp.pos(-portfolio_returns - value_at_risk)) / (alpha * T), []
+    if risk_measure == 'EVaR':
+        return _entropic_value_at_risk(-portfolio_returns, T, alpha, scale=1000)
+    if risk_measure == 'WR':
+        return cp.max(-portfolio_returns), []
+    if risk_measure == 'FLPM':
+        return cp.sum(cp.pos(risk_free_rate - portfolio_returns)) / T, []
+    if risk_measure == 'SLPM':
+        return cp.norm(cp.pos(risk_free_rate - portfolio_returns), 2) / np.sqrt(T - 1), []
+
+    # Drawdowns of the uncompounded cumulative returns: drawdown_t >= drawdown_t-1 - return_t, drawdown_t >= 0,
+    # scaled by 1000 as in Riskfolio
+    drawdowns = cp.Variable(T + 1)
+    constraints = [drawdowns[1:] * 1000 >= drawdowns[:-1] * 1000 - portfolio_returns * 1000,
+                   drawdowns[1:] * 1000 >= 0,
+                   drawdowns[0] * 1000 == 0]
+    if risk_measure == 'MDD':
+        return cp.max(drawdowns[1:]), constraints
+    if risk_measure == 'ADD':
+        return cp.sum(drawdowns[1:]) / T, constraints
+    if risk_measure == 'CDaR':
+        drawdown_at_risk = cp.Variable()
+        return drawdown_at_risk + cp.sum(cp.pos(drawdowns[1:] - drawdown_at_risk)) / (alpha * T), constraints
+    if risk_measure == 'EDaR':
+        risk, entropic_constraints = _entropic_value_at_risk(drawdowns[1:], T, alpha, scale=1000)
+        return risk, constraints + entropic_constraints
+    if risk_measure == 'UCI':
+        return cp.norm(drawdowns[1:], 2) / np.sqrt(T), constraints
+    raise ValueError(f"Unknown risk_measure=`{risk_measure}`, supported risk measures are "
+                     f"{PARAMETRIC_FRONTIER_RISK_MEASURES}")
+
+
+class ParametricFrontierProblem:
+    """
+    Min risk portfolio for a target return, compiled once for a risk measure, number of assets (and of return
+    scenarios) and weight bounds, with the expected returns, the target return and the covariance factor or the return
+    scenarios as CVXPY parameters: the points of a frontier, and the frontiers of every return type and risk model of
+    the same size, only update the parameters.
+    """
+
+    def __init__(self, risk_measure, number_of_assets, number_of_observations=None, weight_bounds=(0, 1), alpha=0.05,
+                 risk_free_rate=0.0):
+        self.risk_measure = risk_measure
+        lower, upper = weight_bounds
+        self.expected_returns = cp.Parameter(number_of_assets)
+        self.target_return = cp.Parameter()
+        self.weights = cp.Variable(number_of_assets)
+        constraints = [cp.sum(self.weights) == 1, self.weights >= lower, self.weights <= upper,
+                       self.expected_returns @ self.weights >= self.target_return]
+        if risk_measure == MEAN_VARIANCE_RISK_MEASURE:
+            self.factor = cp.Parameter((number_of_assets, number_of_assets))
+            self.returns = None
+            risk = cp.sum_squares(self.factor @ self.weights)
+        else:
+            self.factor = None
+            self.returns = cp.Parameter((number_of_observations, number_of_assets))
+            risk, risk_constraints = _scenario_risk(risk_measure, self.returns @ self.weights,
+                                                    self.expected_returns @ self.weights, number_of_observations,
+                                                    alpha, risk_free_rate)
+            constraints += risk_constraints
+        self.problem = cp.Problem(cp.Minimize(risk), constraints)
+        # One frontier at a time, the parameters are shared
+        self.lock = threading.Lock()
+
+    def _solve(self):
+        """Solve with the default CVXPY solver, then with the fallback solvers when it fails, as Riskfolio does."""
+        for solver in (None,) + FALLBACK_SOLVERS:
+            try:
+                self.problem.solve(solver=solver)
+            except cp.SolverError:
+                continue
+            if self.problem.status in {"optimal", "optimal_inaccurate"}:
+                return
+        raise OptimizationError(f"Solver status: {self.problem.status}")
+
+    def solve_frontier(self, expected_returns, target_returns, covariance_matrix=None, returns=None):
+        """(points x assets) min risk weights for every target return."""
+        weights = np.empty((len(target_returns), len(expected_returns)))
+        with self.lock:
+            self.expected_returns.value = expected_returns
+            if self.factor is not None:
+                self.factor.value = covariance_factor(covariance_matrix)
+            else:
+                self.returns.value = returns
+            for point, target_return in enumerate(target_returns):
+                self.target_return.value = target_return
+                self._solve()
+                weights[point] = self.weights.value
+        return weights
+
+
+def get_frontier_problem(risk_measure, number_of_assets, number_of_observations=None, weight_bounds=(0, 1),
+                         alpha=0.05, risk_free_rate=0.0):
+    """Compiled frontier problem for the risk measure, sizes, weight bounds and risk parameters, one per process."""
+    if risk_measure == MEAN_VARIANCE_RISK_MEASURE:
+        # The mean variance problem does not depend on the scenarios
+        number_of_observations, alpha, risk_free_rate = None, None, None
+    key = (risk_measure, number_of_assets, number_of_observations, tuple(weight_bounds), alpha, risk_free_rate)
+    with _frontier_problems_lock:
+        if key not in _frontier_problems:
+            _frontier_problems[key] = ParametricFrontierProblem(risk_measure, number_of_assets, number_of_observations,
+                                                                weight_bounds, alpha, risk_free_rate)
+        return _frontier_problems[key]
+
+
+def max_return_weights(expected_returns, weight_bounds=(0, 1)):
+    """
+    Max return portfolio in the weight bounds: every asset at its lower bound, then the rest of the budget given to
+    the assets by decreasing expected return up to their upper bound.
+    """
+    lower, upper = weight_bounds
+    weights = np.full(len(expected_returns), float(lower))
+    budget = 1.0 - weights.sum()
+    for asset in np.argsort(-np.asarray(expected_returns), kind='stable'):
+        weights[asset] += min(upper - lower, budget)
+        budget -= weights[asset] - lower
+        if budget <= 0:
+            break
+    return weights
+
+
+def parametric_efficient_frontier(expected_returns, covariance_matrix=None, returns=None,
+                                  risk_measure=MEAN_VARIANCE_RISK_MEASURE, weight_bounds=(0, 1), n_points=50,
+                                  alpha=0.05, risk_free_rate=0.0):
+    """
+    n_points portfolios of the efficient frontier of the risk measure, at target returns evenly spaced from the
+    return of the min risk portfolio to the max return, solved with the compiled problem of its size.
+
+    :param returns: (observations x assets) return scenarios, for the scenario risk measures.
+    :return: (points x assets) weights.
+    """
+    expected_returns = np.asarray(expected_returns, dtype=float).ravel()
+    returns = None if returns is None else np.asarray(returns, dtype=float)
+    problem = get_frontier_problem(risk_measure, len(expected_returns),
+                                   None if returns is None else len(returns), weight_bounds, alpha, risk_free_rate)
+    mean_variance = risk_measure == MEAN_VARIANCE_RISK_MEASURE
+    if mean_variance:
+        min_risk_weights = solve_closed_form(np.asarray(covariance_matrix, dtype=float)[None],
+                                             expected_returns[None])[0][0]
+    else:
+        min_risk_weights = np.full(len(expected_returns), np.nan)
+    if not within_bounds(min_risk_weights, weight_bounds):
+        # The lowest return of the bounds leaves the return of the min risk portfolio free
+        lowest_return = max_return_weights(-expected_returns, weight_bounds) @ expected_returns
+        min_risk_weights = problem.solve_frontier(expected_returns, [lowest_return], covariance_matrix, returns)[0]
+    highest_weights = max_return_weights(expected_returns, weight_bounds)
+    # The max return portfolio is known, the min risk portfolios are solved strictly inside the return range
+    target_returns = np.linspace(min_risk_weights @ expected_returns, highest_weights @ expected_returns,
+                                 n_points)[1:-1]
+    inner_weights = solve_closed_form_frontier(expected_returns, covariance_matrix, target_returns) \
+        if mean_variance else np.full((len(target_returns), len(expected_returns)), np.nan)
+    # Mean variance points whose closed form weights are within the bounds are exact, only the others are solved
+    to_solve = ~within_bounds(inner_weights, weight_bounds)
+    inner_weights[to_solve] = problem.solve_frontier(expected_returns, target_returns[to_solve], covariance_matrix,
+                                                     returns)
+    return np.vstack([min_risk_weights, inner_weights, highest_weights])[:n_points]
+
+
+def critical_line_frontier(expected_returns, covariance_matrix, weight_bounds=(0, 1), n_points=50):
+    """
+    n_points portfolios of the mean variance efficient frontier with the critical line algorithm: the turning points
+    of `pypfopt.cla.CLA` are computed once, between two turning points the weights are linear in the target return,
+    so the points at target returns evenly spaced from the min volatility to the max return are interpolated exactly.
+
+    :return: (points x assets) weights.
+    """
+    cla = CLA(expected_returns, covariance_matrix, weight_bounds)
+    # Computes all the turning points, from the max return to the min volatility portfolio
+    cla.min_volatility()
+    turning_weights = np.hstack(cla.w[::-1]).T
+    turning_returns = turning_weights @ np.asarray(expected_returns, dtype=float)
+    # np.interp needs increasing returns, repeated turning points are dropped
+    turning_returns, first_positions = np.unique(turning_returns, return_index=True)
+    turning_weights = turning_weights[first_positions]
+    target_returns = np.linspace(turning_returns[0], turning_returns[-1], n_points)
+    return np.column_stack([np.interp(target_returns, turning_returns, turning_weights[:, asset])
+                            for asset in range(turning_weights.shape[1])])
@@ -0,0 +1,140 @@
+import threading
+import time
+from collections import OrderedDict
+
+import cvxpy as cp
+import numpy as np
+import pandas as pd
+from pypfopt.exceptions import OptimizationError
+
+MAX_SHARPE_OBJECTIVE = 'max_sharpe'
+MIN_VOLATILITY_OBJECTIVE = 'min_volatility'
+PARAMETRIC_OBJECTIVES = (MAX_SHARPE_OBJECTIVE, MIN_VOLATILITY_OBJECTIVE)
+
+# Compiled problems of the process, keyed by (objective, number of assets, weight bounds)
+_problems = {}
+_problems_lock = threading.Lock()
+
+
+def covariance_factor(covariance_matrix):
+    """
+    Square matrix F with F.T @ F = covariance_matrix, from its eigen decomposition. Negative eigenvalues of a
+    covariance that is not positive semi-definite are clipped at 0.
+    """
+    eigenvalues, eigenvectors = np.linalg.eigh(np.asarray(covariance_matrix, dtype=float))
+    return (eigenvectors * np.sqrt(np.clip(eigenvalues, 0, None))).T
+
+
+class ParametricMeanVarianceProblem:
+    """
+    Max Sharpe ratio or min volatility problem of PyPortfolioOpt, compiled once for a number of assets and weight
+    bounds, with the expected returns and the covariance factor as CVXPY parameters.
+
+    The structure of the problem does not change across the return types and risk models of a window, so CVXPY only
+    canonicalizes it on the first solve, the next solves only update the parameters. With `warm_start`, a solve starts
+    from the previous solution: the result then depends on the order of the solves in the last digits (solver
+    tolerance), and with the default OSQP solver it was not faster on the pipeline windows, so it is off by default. The
+    max Sharpe ratio problem uses the same variable transformation as
+    `EfficientFrontier.max_sharpe` (Cornuejols and Tutuncu): min y' S y subject to (mu - rf)' y = 1, sum(y) = k, k >= 0
+    and lower * k <= y <= upper * k, the weights being y / k.
+    """
+
+    def __init__(self, objective, number_of_assets, weight_bounds=(0, 1), warm_start=False):
+        if objective not in PARAMETRIC_OBJECTIVES:
+            raise ValueError(f"Unknown objective=`{objective}`, supported objectives are {PARAMETRIC_OBJECTIVES}")
+        self.objective = objective
+        self.number_of_assets = number_of_assets
+        self.warm_start = warm_start
+        lower, upper = weight_bounds
+        self.excess_returns = cp.Parameter(number_of_assets)
+        self.factor = cp.Parameter((number_of_assets, number_of_assets))
+        self.weights = cp.Variable(number_of_assets)
+        if objective == MAX_SHARPE_OBJECTIVE:
+            self.scale = cp.Variable()
+            constraints = [self.excess_returns @ self.weights == 1,
+                           cp.sum(self.weights) == self.scale,
+                           self.scale >= 0,
+                           self.weights >= lower * self.scale,
+                           self.weights <= upper * self.scale]
+        else:
+            self.scale = None
+            constraints = [cp.sum(self.weights) == 1, self.weights >= lower, self.weights <= upper]
+        self.problem = cp.Problem(cp.Minimize(cp.sum_squares(self.factor @ self.weights)), constraints)
+        # One solve at a time, the parameters are shared
+        self.lock = threading.Lock()
+
+    def solve(self, expected_returns, covariance_matrix, risk_free_rate=0.0, solve_telemetry=None):
+        """
+        Optimal weights (array) for the expected returns and covariance, raises like PyPortfolioOpt. The solve is
+        recorded in solve_telemetry under the lock, before another solve overwrites the statistics of the problem.
+        """
+        expected_returns = np.asarray(expected_returns, dtype=float)
+        if self.objective == MAX_SHARPE_OBJECTIVE and expected_returns.max() <= risk_free_rate:
+            raise ValueError("at least one of the assets must have an expected return exceeding the risk-free rate")
+        with self.lock:
+            self.excess_returns.value = expected_returns - risk_free_rate
+            self.factor.value = covariance_factor(covariance_matrix)
+            started = time.perf_counter()
+            try:
+                self.problem.solve(warm_start=self.warm_start)
+            except (TypeError, cp.DCPError, cp.SolverError) as e:
+                raise OptimizationError from e
+            if solve_telemetry is not None:
+                solve_telemetry.record_problem(self.problem, None, time.perf_counter() - started)
+            if self.problem.status not in {"optimal", "optimal_inaccurate"}:
+                raise OptimizationError(f"Solver status: {self.problem.status}")
+            weights = self.weights.value if self.scale is None else self.weights.value / self.scale.value
+        # Same rounding as PyPortfolioOpt, +0.0 removes signed zero
+        return weights.round(16) + 0.0
+
+
+def get_parametric_problem(objective, number_of_assets, weight_bounds=(0, 1)):
+    """Compiled problem for the objective, number of assets and weight bounds, created once per process."""
+    key = (objective, number_of_assets, tuple(weight_bounds))
+    with _problems_lock:
+        if key not in _problems:
+            _problems[key] = ParametricMeanVarianceProblem(objective, number_of_assets, weight_bounds)
+        return _problems[key]
+
+
+def clean_weights(weights, tickers, cutoff=1e-4, rounding=5):
+    """Weights below cutoff set to 0 and rounded, as `EfficientFrontier.clean_weights`."""
+    cleaned_weights = weights.copy()
+    cleaned_weights[np.abs(cleaned_weights) < cutoff] = 0
+    cleaned_weights = np.round(cleaned_weights, rounding)
+    return OrderedDict(zip(tickers, cleaned_weights.tolist()))
+
+
+def get_tickers(expected_returns, covariance_matrix):
+    """Tickers of the output weights, as `EfficientFrontier`."""
+    if isinstance(expected_returns, pd.Series):
+        return list(expected_returns.index)
+    if isinstance(covariance_matrix, pd.DataFrame):
+        return list(covariance_matrix.columns)
+    return list(range(len(expected_returns)))
+
+
+def portfolio_performance(weights, expected_returns, covariance_matrix, risk_free_rate=0.0):
+    """
+    (expected return, volatility, Sharpe ratio) of the weights, as `EfficientFrontier.portfolio_performance` without
+    building CVXPY expressions.
+    """
+    expected_return = float(weights @ np.asarray(expected_returns, dtype=float))
+    volatility = float(np.sqrt(weights @ np.asarray(covariance_matrix, dtype=float) @ weights))
+    return expected_return, volatility, (expected_return - risk_free_rate) / volatility
+
+
+def optimize_mean_variance(expected_returns, covariance_matrix, weight_bounds=(0, 1),
+                           objective=MAX_SHARPE_OBJECTIVE, risk_free_rate=0.0, solve_telemetry=None):
+    """
+    Solve the max Sharpe ratio or min volatility problem with the compiled problem of its size and bounds, the solve
+    is recorded in the SolveTelemetry solve_telemetry when given.
+
+    :return: Raw weights (array), cleaned weights (ordered dictionary by ticker) and the (expected return, volatility,
+             Sharpe ratio) performance, the same outputs as `EfficientFrontier`.
+    """
+    tickers = get_tickers(expected_returns, covariance_matrix)
+    problem = get_parametric_problem(objective, len(tickers), weight_bounds)
+    weights = problem.solve(expected_returns, covariance_matrix, risk_free_rate, solve_telemetry)
+    performance = portfolio_performance(weights, expected_returns, covariance_matrix, risk_free_rate)
+    return weights, clean_weights(weights, tickers), performance
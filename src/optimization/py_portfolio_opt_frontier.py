@@ -3,9 +3,10 @@ from src.optimization.py_portfolio_opt_frontier_base import PyPortfolioOptFronti
 
 
 class PyPortfolioOptFrontier(PyPortfolioOptFrontierBase):
+    WEIGHT_BOUNDS = (0, 1)
+
     @ExecutionTimeRecorder(module_name=__name__)
     def __init__(self, expected_returns, covariance_matrix, expected_return_type, risk_return_type, output_dir=None,
-                 data=None):
-        # Call the base class with default weight bounds (0, 1)
+                 data=None, market_data_context=None):
         super().__init__(expected_returns, covariance_matrix, expected_return_type, risk_return_type, output_dir, data,
-                         weight_bounds=(0, 1))
+                         weight_bounds=self.WEIGHT_BOUNDS, market_data_context=market_data_context)
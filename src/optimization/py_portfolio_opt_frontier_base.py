@@ -1,26 +1,149 @@
+import os
+import time
+from functools import lru_cache
+
 import pandas as pd
 from pypfopt import EfficientFrontier
 
 from src.common.conventions import HeaderConventions
+from src.common.hydra_config_loader import load_config
+from src.optimization.batched_mean_variance import get_batched_solution_name, get_batched_solver_config, \
+    solve_max_sharpe_batch
+from src.optimization.closed_form_mean_variance import get_recorded_result, get_window_closed_form_solution, \
+    optimize_closed_form
 from src.optimization.efficient_frontier_base import EfficientFrontierBase
+from src.optimization.multi_period import optimize_max_sharpe_with_turnover
+from src.optimization.parametric_frontier import critical_line_frontier, parametric_efficient_frontier
+from src.optimization.parametric_mean_variance import MAX_SHARPE_OBJECTIVE, optimize_mean_variance
+from src.optimization.solver_policy import SolveTelemetry
+
+PYPFOPT_BACKEND = 'pypfopt'
+PARAMETRIC_BACKEND = 'parametric'
+CLOSED_FORM_BACKEND = 'closed_form'
+BATCHED_BACKEND = 'batched'
+LONG_ONLY_WEIGHT_BOUNDS = (0, 1)
+
+
+@lru_cache(maxsize=None)
+def get_solver_backend():
+    """
+    Backend of the PyPortfolioOpt frontiers from config.yaml: `parametric` solves problems compiled once per number of
+    assets and weight bounds, `closed_form` uses the closed form solution when the weight bounds are not active and
+    the `parametric` problems otherwise, `batched` solves the long only portfolios of a window in one batch with a
+    first-order solver (and the others as `closed_form`), `pypfopt` builds a new `EfficientFrontier` for every
+    optimization.
+    """
+    module_name = os.path.basename(os.path.dirname(__file__))
+    return load_config(module_name).optimization.get('pypfopt_backend', PYPFOPT_BACKEND)
+
+
+def get_backend_cache_parameters(solver_backend):
+    """Cache parameters of the backend, the backends agree within the solver tolerances only."""
+    cache_parameters = {'solver_backend': solver_backend}
+    if solver_backend == BATCHED_BACKEND:
+        tolerance, max_iterations = get_batched_solver_config()
+        cache_parameters['batched_solver'] = {'tolerance': tolerance, 'max_iterations': max_iterations}
+    return cache_parameters
 
 
 class PyPortfolioOptFrontierBase(EfficientFrontierBase):
+    # Weight bounds of the optimizers of the subclass, the portfolios of a window are solved together per bounds
+    WEIGHT_BOUNDS = LONG_ONLY_WEIGHT_BOUNDS
+
     def __init__(self, expected_returns, covariance_matrix, expected_return_type, risk_return_type,
                  output_dir=None,
-                 data=None, weight_bounds=(0, 1)):
-        super().__init__(expected_returns, covariance_matrix, expected_return_type, risk_return_type, output_dir, data)
+                 data=None, weight_bounds=LONG_ONLY_WEIGHT_BOUNDS, market_data_context=None, solver_backend=None):
+        super().__init__(expected_returns, covariance_matrix, expected_return_type, risk_return_type, output_dir, data,
+                         market_data_context)
         self.weights = None
         self.ef = None
         self.weight_bounds = weight_bounds  # Add weight bounds as an instance attribute
+        self.expected_return_type = expected_return_type
+        self.risk_return_type = risk_return_type
+        self.solver_backend = solver_backend if solver_backend is not None else get_solver_backend()
+
+    def get_cache_parameters(self):
+        return {'weight_bounds': self.weight_bounds, **get_backend_cache_parameters(self.solver_backend)}
+
+    @classmethod
+    def get_config_cache_parameters(cls):
+        return get_backend_cache_parameters(get_solver_backend())
+
+    def _get_batched_solution(self):
+        """Long only max Sharpe ratio portfolio of the batch of the window, solved alone when not in the batch."""
+        key = (self.expected_return_type, self.risk_return_type)
+        # Warm start from the weights of the previous window
+        initial_weights = self.turnover_control.previous_weights if self.turnover_control is not None else None
+
+        def solve_alone():
+            return solve_max_sharpe_batch({self.expected_return_type: self.expected_returns},
+                                          {self.risk_return_type: self.covariance_matrix},
+                                          {key: initial_weights} if initial_weights is not None else None)[key]
+
+        result, solve_telemetry = self.market_data_context.memoize(
+            get_batched_solution_name(self.market_data_context, self.expected_returns, self.covariance_matrix,
+                                      initial_weights), solve_alone) \
+            if self.market_data_context is not None else solve_alone()
+        return get_recorded_result(result, solve_telemetry, self.solve_telemetry)
 
     def calculate_efficient_frontier(self):
+        # The other backends record their solves (or their share of the solve of the window) themselves
+        self.solve_telemetry = SolveTelemetry()
+        started = time.perf_counter()
+        self._solve_max_sharpe()
+        if self.ef is not None:
+            self.solve_telemetry.record_problem(self.ef._opt, None, time.perf_counter() - started)
+
+    def _solve_max_sharpe(self):
+        if self.turnover_control is not None and self.turnover_control.controls_mean_variance():
+            # Turnover penalty or limit against the previous window, with any backend
+            self.weights, self.cleaned_weights, self.performance = optimize_max_sharpe_with_turnover(
+                self.expected_returns, self.covariance_matrix, self.turnover_control, self.weight_bounds,
+                solve_telemetry=self.solve_telemetry)
+            self.cleaned_weights = dict(self.cleaned_weights)
+            return
+        if self.solver_backend == BATCHED_BACKEND and tuple(self.weight_bounds) == LONG_ONLY_WEIGHT_BOUNDS:
+            self.weights, self.cleaned_weights, self.performance = self._get_batched_solution()
+            self.cleaned_weights = dict(self.cleaned_weights)
+            return
+        if self.solver_backend in (CLOSED_FORM_BACKEND, BATCHED_BACKEND) and self.market_data_context is not None:
+            # Stacked closed form solve of the portfolios of the window with the same weight bounds
+            self.weights, self.cleaned_weights, self.performance = get_window_closed_form_solution(
+                self.market_data_context, self.expected_returns, self.covariance_matrix, self.weight_bounds,
+                self.solve_telemetry)
+            self.cleaned_weights = dict(self.cleaned_weights)
+            return
+        if self.solver_backend in (PARAMETRIC_BACKEND, CLOSED_FORM_BACKEND, BATCHED_BACKEND):
+            # Same problem and outputs as EfficientFrontier.max_sharpe, without compiling a new CVXPY problem
+            optimize = optimize_mean_variance if self.solver_backend == PARAMETRIC_BACKEND else optimize_closed_form
+            self.weights, self.cleaned_weights, self.performance = optimize(self.expected_returns,
+                                                                            self.covariance_matrix,
+                                                                            self.weight_bounds,
+                                                                            MAX_SHARPE_OBJECTIVE,
+                                                                            solve_telemetry=self.solve_telemetry)
+            self.cleaned_weights = dict(self.cleaned_weights)
+            return
         # Use the weight bounds during initialization
         self.ef = EfficientFrontier(self.expected_returns, self.covariance_matrix, weight_bounds=self.weight_bounds)
         self.weights = self.ef.max_sharpe()  # Max Sharpe optimization
         self.cleaned_weights = dict(self.ef.clean_weights())  # Clean the weights
         self.performance = self.ef.portfolio_performance(verbose=False)  # Portfolio performance_metrics
 
+    def efficient_frontier(self, n_points=50):
+        """
+        Mean variance frontier: critical line algorithm for long only weight bounds (all the turning points at once),
+        otherwise the min volatility problem for a target return compiled once and solved for every point.
+        """
+        if self.weight_bounds[0] >= 0:
+            weights = critical_line_frontier(self.expected_returns, self.covariance_matrix, self.weight_bounds,
+                                             n_points)
+        else:
+            weights = parametric_efficient_frontier(self.expected_returns, self.covariance_matrix,
+                                                    weight_bounds=self.weight_bounds, n_points=n_points)
+        tickers = self.expected_returns.index if isinstance(self.expected_returns, pd.Series) \
+            else range(len(self.expected_returns))
+        return self._get_frontier_results(weights, self.expected_returns, self.covariance_matrix, tickers)
+
     def _get_results(self):
         # Create a DataFrame for performance_metrics metrics
         result_df = pd.DataFrame({
@@ -1,9 +1,16 @@
+import copy
+
 import numpy as np
 import pandas as pd
 import riskfolio as rp
 
 from src.common.conventions import HeaderConventions
+from src.common.market_data_context import TRADING_DAYS_PER_YEAR
 from src.optimization.efficient_frontier_base import EfficientFrontierBase
+from src.optimization.parametric_frontier import PARAMETRIC_FRONTIER_RISK_MEASURES, parametric_efficient_frontier
+from src.optimization.scenario_reduction import get_reduced_portfolio, get_reduction_method, \
+    get_scenario_reduction_parameters
+from src.optimization.solver_policy import get_solver_policy
 
 
 def make_positive_definite(matrix, epsilon=1e-5):
@@ -30,11 +37,52 @@ def make_positive_definite(matrix, epsilon=1e-5):
         return matrix + diagonal_shift
 
 
+def get_window_portfolio(market_data_context):
+    """
+    Riskfolio Portfolio holding the daily return scenarios of the window, built once per window and shared read-only
+    by all the Riskfolio optimizers, which only work on shallow copies of it.
+    """
+    return market_data_context.memoize('riskfolio_portfolio',
+                                       lambda: rp.Portfolio(returns=market_data_context.simple_returns))
+
+
+def to_daily_statistics(expected_returns, covariance_matrix, tickers):
+    """
+    Annualized expected returns and covariance of the pipeline as the daily (1 x assets) mean vector and
+    (assets x assets) covariance used by Riskfolio, aligned to the tickers of the return scenarios.
+    """
+    expected_returns = pd.Series(np.asarray(expected_returns, dtype=float).ravel(), index=tickers) \
+        if not isinstance(expected_returns, pd.Series) else expected_returns.reindex(tickers)
+    if isinstance(covariance_matrix, pd.DataFrame):
+        covariance_matrix = covariance_matrix.reindex(index=tickers, columns=tickers)
+    else:
+        covariance_matrix = pd.DataFrame(np.asarray(covariance_matrix, dtype=float), index=tickers, columns=tickers)
+    mu = expected_returns.to_frame().T.reset_index(drop=True) / TRADING_DAYS_PER_YEAR
+    return mu, covariance_matrix / TRADING_DAYS_PER_YEAR
+
+
+def get_daily_statistics(market_data_context, expected_returns, covariance_matrix, tickers):
+    """
+    Daily statistics of `to_daily_statistics` with a positive definite covariance, memoized in the MarketDataContext
+    for the content of the expected returns and covariance.
+    """
+    def compute():
+        mu, daily_covariance = to_daily_statistics(expected_returns, covariance_matrix, tickers)
+        return mu, make_positive_definite(daily_covariance)
+
+    return market_data_context.memoize(('riskfolio_daily_statistics',
+                                        market_data_context.get_input_fingerprint(expected_returns),
+                                        market_data_context.get_input_fingerprint(covariance_matrix),
+                                        tuple(tickers)),
+                                       compute)
+
+
 # Base class for risk measure optimization
 class RiskFolioOptimizer(EfficientFrontierBase):
     def __init__(self, expected_returns, covariance_matrix, expected_return_type, risk_return_type, output_dir,
-                 data: pd.DataFrame, rm: str):
-        super().__init__(expected_returns, covariance_matrix, expected_return_type, risk_return_type, output_dir, data)
+                 data: pd.DataFrame, rm: str, market_data_context=None):
+        super().__init__(expected_returns, covariance_matrix, expected_return_type, risk_return_type, output_dir, data,
+                         market_data_context)
         self.rm = rm
         self.sharpe_ratio = None
         self.volatility = None
@@ -42,24 +90,48 @@ class RiskFolioOptimizer(EfficientFrontierBase):
         self.weights = []
         self.result_df = pd.DataFrame([])
 
-        # Create the Portfolio object from Riskfolio-Lib
-        self.port = rp.Portfolio(returns=data.pct_change().dropna())
-
-        # Estimate input parameters for the Portfolio
-        method_mu = 'hist'  # Method to estimate expected returns based on historical data.
-        method_cov = 'hist'  # Method to estimate covariance matrix based on historical data.
-        self.port.assets_stats(method_mu=method_mu, method_cov=method_cov)
-
-        # Ensure covariance matrix is positive definit
-        self.port.cov = make_positive_definite(self.port.cov)
+        # Shallow copy of the Portfolio of the window, the optimizers only swap the objective and the risk measure.
+        # Riskfolio reassigns its attributes instead of modifying them, so the shared Portfolio is left untouched.
+        # A risk measure with scenario reduction solves on the reduced scenarios of the window instead.
+        reduction_method = get_reduction_method(rm)
+        self.port = copy.copy(get_window_portfolio(self.market_data_context) if reduction_method is None
+                              else get_reduced_portfolio(self.market_data_context, reduction_method))
+
+        # Expected returns and covariance of the pipeline (return type and risk model), as daily statistics with a
+        # positive definite covariance, computed once for all the Riskfolio optimizers of the same inputs
+        self.port.mu, self.port.cov = get_daily_statistics(self.market_data_context, expected_returns,
+                                                           covariance_matrix, self.port.returns.columns)
         # Optimization parameters
         self.model = 'Classic'  # Could be Classic (historical), BL (Black Litterman) or FM (Factor Model)
         self.obj = 'Sharpe'  # Objective function, could be MinRisk, MaxRet, Utility, or Sharpe
         self.hist = True  # Use historical scenarios for risk measures that depend on scenarios
         self.rf = 0  # Risk-free rate
         self.l = 0  # Risk aversion factor, only useful when obj is 'Utility'
+        # Solvers, timeout and solver options of the optimizer class
+        self.solver_policy = get_solver_policy(self.__class__.__name__)
+
+    def get_cache_parameters(self):
+        cache_parameters = {'rm': self.rm, 'model': self.model, 'obj': self.obj, 'rf': self.rf, 'l': self.l,
+                            'hist': self.hist, 'data': self.market_data_context.fingerprint,
+                            **self.solver_policy.get_cache_parameters()}
+        scenario_reduction = get_scenario_reduction_parameters(self.rm)
+        if scenario_reduction is not None:
+            cache_parameters['scenario_reduction'] = scenario_reduction
+        return cache_parameters
+
+    @classmethod
+    def get_config_cache_parameters(cls):
+        return get_solver_policy(cls.__name__).get_cache_parameters()
 
     def calculate_efficient_frontier(self):
+        self.solve_telemetry = self.solver_policy.apply(self.port)
+        if self.turnover_control is not None and self.turnover_control.max_asset_turnover is not None:
+            # Riskfolio turnover constraint |w_i - w_prev_i| <= max_asset_turnover of every asset, with the previous
+            # weights as the benchmark weights of the copy of the Portfolio
+            self.port.benchweights = pd.DataFrame(self.turnover_control.get_aligned_weights(self.port.returns.columns),
+                                                  index=self.port.returns.columns)
+            self.port.allowTO = True
+            self.port.turnover = self.turnover_control.max_asset_turnover
         # Perform optimization using the specific risk measure
         self.weights = self.port.optimization(
             model=self.model,
@@ -80,7 +152,7 @@ class RiskFolioOptimizer(EfficientFrontierBase):
         cov_matrix = self.port.cov.values
 
         # Define annualization factor for daily returns
-        annualization_factor = 252  # Use 252 for daily returns or 12 for monthly returns
+        annualization_factor = TRADING_DAYS_PER_YEAR
 
         # Calculate expected return as dot product of mu and weights, then annualize it
         self.expected_return = np.dot(mu_array, weights_array) * annualization_factor  # Annualize expected return
@@ -92,6 +164,27 @@ class RiskFolioOptimizer(EfficientFrontierBase):
         # Calculate Sharpe Ratio
         self.sharpe_ratio = (self.expected_return - self.rf) / self.volatility
 
+    def efficient_frontier(self, n_points=50):
+        """
+        Frontier of the risk measure: the min risk problem for a target return is compiled once per size and solved
+        for every point. A risk measure without a compiled problem uses `Portfolio.efficient_frontier`, which builds
+        a new problem for every point.
+        """
+        if self.rm in PARAMETRIC_FRONTIER_RISK_MEASURES:
+            weights = parametric_efficient_frontier(self.port.mu.to_numpy(),
+                                                    self.port.cov.to_numpy(),
+                                                    self.port.returns.to_numpy(),
+                                                    risk_measure=self.rm,
+                                                    n_points=n_points,
+                                                    alpha=self.port.alpha,
+                                                    risk_free_rate=self.rf)
+        else:
+            frontier = self.port.efficient_frontier(model=self.model, rm=self.rm, points=n_points, rf=self.rf,
+                                                    hist=self.hist)
+            weights = frontier.to_numpy().T
+        return self._get_frontier_results(weights, self.port.mu, self.port.cov, self.port.returns.columns,
+                                          annualization_factor=TRADING_DAYS_PER_YEAR)
+
     def _get_results(self):
         # Convert weights to a dictionary for storing in DataFrame
         weights_dict = self.weights['weights'].to_dict()
@@ -0,0 +1,223 @@
+import copy
+import logging
+import math
+import os
+import time
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import riskfolio as rp
+from scipy.spatial.distance import pdist, squareform
+
+from src.common.conventions import HeaderConventions
+from src.common.hydra_config_loader import load_config
+
+logger = logging.getLogger(__name__)
+
+KMEDOIDS_METHOD = 'kmedoids'
+AGGREGATION_METHOD = 'aggregation'
+# Name of the reduced Riskfolio portfolios of a window, memoized in its MarketDataContext
+REDUCED_PORTFOLIO_NAME = 'riskfolio_reduced_portfolio'
+
+
+@lru_cache(maxsize=None)
+def get_scenario_reduction_config():
+    """`scenario_reduction` section of config.yaml."""
+    module_name = os.path.basename(os.path.dirname(__file__))
+    return load_config(module_name).optimization.scenario_reduction
+
+
+def get_reduction_method(risk_measure):
+    """
+    Reduction of the scenarios of the Riskfolio risk measure from the config: `kmedoids` for the risk measures of the
+    return distribution, `aggregation` for the drawdown measures, whose scenarios are a path, None when the scenarios
+    are not reduced.
+    """
+    reduction_cfg = get_scenario_reduction_config()
+    if not reduction_cfg.enabled:
+        return None
+    if risk_measure in reduction_cfg.kmedoids_risk_measures:
+        return KMEDOIDS_METHOD
+    if risk_measure in reduction_cfg.aggregation_risk_measures:
+        return AGGREGATION_METHOD
+    return None
+
+
+def k_medoids(points, number_of_clusters, max_iterations=100, random_state=0):
+    """
+    K-medoids clustering of the rows of points on the Euclidean distance: k-medoids++ seeding, then alternate the
+    assignment of every point to its closest medoid and the choice of the member closest to all the others as the
+    medoid of every cluster, until the medoids do not change.
+
+    :return: (clusters,) positions of the medoids in points and (points,) cluster of every point.
+    """
+    distances = squareform(pdist(np.asarray(points, dtype=float)))
+    number_of_points = len(distances)
+    rng = np.random.default_rng(random_state)
+    # k-medoids++: every next medoid is drawn with a probability proportional to its squared distance to the others
+    medoids = [int(rng.integers(number_of_points))]
+    closest_distances = distances[medoids[0]]
+    for _ in range(1, number_of_clusters):
+        weights = closest_distances ** 2
+        next_medoid = int(rng.choice(number_of_points, p=weights / weights.sum())) if weights.sum() > 0 \
+            else int(np.setdiff1d(np.arange(number_of_points), medoids)[0])
+        medoids.append(next_medoid)
+        closest_distances = np.minimum(closest_distances, distances[next_medoid])
+    medoids = np.array(medoids)
+
+    for _ in range(max_iterations):
+        labels = np.argmin(distances[:, medoids], axis=1)
+        next_medoids = medoids.copy()
+        for cluster in range(number_of_clusters):
+            members = np.flatnonzero(labels == cluster)
+            if len(members):
+                next_medoids[cluster] = members[np.argmin(distances[np.ix_(members, members)].sum(axis=1))]
+        if np.array_equal(next_medoids, medoids):
+            break
+        medoids = next_medoids
+    return medoids, np.argmin(distances[:, medoids], axis=1)
+
+
+def largest_remainder_counts(probabilities, total):
+    """Integer counts summing to total and proportional to the probabilities, rounded by the largest remainders."""
+    quotas = np.asarray(probabilities, dtype=float) * total
+    counts = np.floor(quotas).astype(int)
+    counts[np.argsort(counts - quotas, kind='stable')[:total - counts.sum()]] += 1
+    return counts
+
+
+def reduce_scenarios_with_k_medoids(returns, target_scenarios, max_iterations=100, random_state=0):
+    """
+    target_scenarios return scenarios representing the (observations x assets) returns: the medoids of the k-medoids
+    clustering into target_scenarios clusters, every medoid repeated in proportion to the probability of its cluster
+    (largest remainder rounding). Riskfolio weighs its scenarios equally, so the repetitions carry the probabilities,
+    a cluster holding less than half a scenario of probability is left out.
+    """
+    medoids, labels = k_medoids(returns.to_numpy(), target_scenarios, max_iterations, random_state)
+    probabilities = np.bincount(labels, minlength=len(medoids)) / len(labels)
+    counts = largest_remainder_counts(probabilities, target_scenarios)
+    return returns.iloc[np.repeat(medoids, counts)]
+
+
+def aggregate_scenarios(returns, target_scenarios):
+    """
+    Returns summed over consecutive blocks of ceil(observations / target_scenarios) days, e.g. weekly returns for 750
+    days and 150 scenarios. The uncompounded cumulative returns of Riskfolio are unchanged at the end of every block,
+    so the drawdown path keeps its shape at a coarser step.
+    """
+    block_length = math.ceil(len(returns) / target_scenarios)
+    blocks = np.arange(len(returns)) // block_length
+    aggregated_returns = returns.groupby(blocks).sum()
+    aggregated_returns.index = returns.index[np.minimum((aggregated_returns.index + 1) * block_length,
+                                                        len(returns)) - 1]
+    return aggregated_returns
+
+
+def reduce_scenarios(returns, method, target_scenarios, max_iterations=100, random_state=0):
+    """Scenarios of the reduction method, the returns themselves when there are at most target_scenarios."""
+    if len(returns) <= target_scenarios:
+        return returns
+    if method == KMEDOIDS_METHOD:
+        return reduce_scenarios_with_k_medoids(returns, target_scenarios, max_iterations, random_state)
+    if method == AGGREGATION_METHOD:
+        return aggregate_scenarios(returns, target_scenarios)
+    raise ValueError(f"Unknown method=`{method}`, supported methods are {(KMEDOIDS_METHOD, AGGREGATION_METHOD)}")
+
+
+def get_reduced_portfolio(market_data_context, method):
+    """
+    Riskfolio Portfolio of the reduced return scenarios of the window, built once per window and reduction method and
+    shared read-only by the Riskfolio optimizers of the risk measures reduced with it.
+    """
+    def compute():
+        reduction_cfg = get_scenario_reduction_config()
+        returns = market_data_context.simple_returns
+        reduced_returns = reduce_scenarios(returns, method, reduction_cfg.target_scenarios,
+                                           reduction_cfg.max_iterations, reduction_cfg.random_state)
+        logger.info(f"Reduced {len(returns)} return scenarios to {len(reduced_returns)} with method=`{method}`")
+        return rp.Portfolio(returns=reduced_returns)
+
+    return market_data_context.memoize((REDUCED_PORTFOLIO_NAME, method), compute)
+
+
+def get_scenario_reduction_parameters(risk_measure):
+    """Parameters of the reduction of the risk measure, for the cache fingerprint, None without reduction."""
+    method = get_reduction_method(risk_measure)
+    if method is None:
+        return None
+    reduction_cfg = get_scenario_reduction_config()
+    return {'method': method, 'target_scenarios': reduction_cfg.target_scenarios,
+            'max_iterations': reduction_cfg.max_iterations, 'random_state': reduction_cfg.random_state}
+
+
+def get_window_scenario_reduction_parameters():
+    """
+    Parameters of the reduction of every reduced risk measure, {risk measure: parameters}, for the fingerprint of the
+    results of a window, empty without reduction.
+    """
+    reduction_cfg = get_scenario_reduction_config()
+    if not reduction_cfg.enabled:
+        return {}
+    return {risk_measure: get_scenario_reduction_parameters(risk_measure)
+            for risk_measure in list(reduction_cfg.kmedoids_risk_measures)
+            + list(reduction_cfg.aggregation_risk_measures)}
+
+
+def _solve_sharpe(port, risk_measure, solver_policy):
+    """Max risk adjusted return ratio weights of the Portfolio for the risk measure and the seconds of the solve."""
+    solver_policy.apply(port)
+    started = time.perf_counter()
+    weights = port.optimization(model='Classic', rm=risk_measure, obj='Sharpe', rf=0, l=0, hist=True)
+    elapsed = time.perf_counter() - started
+    if weights is None:
+        raise ValueError(f"Optimization of risk measure=`{risk_measure}` returned no weights")
+    return weights, elapsed
+
+
+def get_objective_gap_report(market_data_context, expected_returns, covariance_matrix, risk_measures=None):
+    """
+    Objective gap of the scenario reduction, one row per reduced risk measure: the risk measure is optimized on the
+    full and on the reduced scenarios, and both weights are evaluated on the full scenarios. The objective is the
+    risk adjusted return ratio of Riskfolio (mean return over the risk measure), the gap is the relative loss of
+    objective of the reduced weights, with the numbers of scenarios and the solve times.
+
+    :param risk_measures: Riskfolio risk measures, the reduced risk measures of the config by default.
+    """
+    # Imported here, the Riskfolio optimizers import this module
+    from src.optimization.riskfolio_lib_frontier import get_daily_statistics, get_window_portfolio
+    from src.optimization.solver_policy import get_solver_policy
+
+    reduction_cfg = get_scenario_reduction_config()
+    if risk_measures is None:
+        risk_measures = list(reduction_cfg.kmedoids_risk_measures) + list(reduction_cfg.aggregation_risk_measures)
+    full_port = copy.copy(get_window_portfolio(market_data_context))
+    mu, cov = get_daily_statistics(market_data_context, expected_returns, covariance_matrix, full_port.returns.columns)
+    report = []
+    for risk_measure in risk_measures:
+        method = KMEDOIDS_METHOD if risk_measure in reduction_cfg.kmedoids_risk_measures else AGGREGATION_METHOD
+        reduced_port = copy.copy(get_reduced_portfolio(market_data_context, method))
+        row = {HeaderConventions.risk_measure_column: risk_measure,
+               HeaderConventions.reduction_method_column: method,
+               HeaderConventions.scenarios_column: len(full_port.returns),
+               HeaderConventions.reduced_scenarios_column: len(reduced_port.returns)}
+        try:
+            # Solvers and timeout of the Riskfolio optimizer class of the risk measure
+            solver_policy = get_solver_policy(f"{risk_measure}RiskFolioOptimizer")
+            objectives = {}
+            for name, port in (('full', full_port), ('reduced', reduced_port)):
+                port.mu, port.cov = mu, cov
+                weights, elapsed = _solve_sharpe(port, risk_measure, solver_policy)
+                objectives[name] = rp.Sharpe(full_port.returns, weights.to_numpy(), mu=mu.to_numpy(),
+                                             cov=cov.to_numpy(), rm=risk_measure, alpha=full_port.alpha)
+                row[HeaderConventions.full_solve_time_column if name == 'full'
+                    else HeaderConventions.reduced_solve_time_column] = elapsed
+            row.update({HeaderConventions.full_objective_column: objectives['full'],
+                        HeaderConventions.reduced_objective_column: objectives['reduced'],
+                        HeaderConventions.objective_gap_column:
+                            (objectives['full'] - objectives['reduced']) / abs(objectives['full'])})
+        except Exception as e:
+            logger.error(f"Objective gap of the scenario reduction for risk measure=`{risk_measure}` failed with "
+                         f"error: {e}")
+        report.append(row)
+    return pd.DataFrame(report)
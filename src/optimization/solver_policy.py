@@ -0,0 +1,176 @@
+import logging
+import os
+import time
+from functools import lru_cache
+
+import cvxpy as cp
+import numpy as np
+from omegaconf import OmegaConf
+
+from src.common.conventions import HeaderConventions
+from src.common.hydra_config_loader import load_config
+
+logger = logging.getLogger(__name__)
+
+# Name of the CVXPY solve method of the policy, given to Riskfolio through `Portfolio.sol_params`
+SOLVE_METHOD_NAME = 'solver_policy'
+# Native time limit option of the solvers supporting one, in seconds
+TIME_LIMIT_OPTIONS = {cp.CLARABEL: 'time_limit', cp.SCS: 'time_limit_secs', cp.OSQP: 'time_limit',
+                      cp.HIGHS: 'time_limit'}
+ACCEPTED_STATUSES = (cp.OPTIMAL, cp.OPTIMAL_INACCURATE)
+TIMEOUT_STATUS = 'timeout'
+SOLVER_ERROR_STATUS = 'solver_error'
+# Statuses of the optimizations without a CVXPY solve: computed in closed form (also the hierarchical allocations),
+# and the batched first-order solver stopped at its tolerance or at its max iterations
+ANALYTIC_STATUS = 'analytic'
+CONVERGED_STATUS = 'converged'
+MAX_ITERATIONS_STATUS = 'max_iterations'
+SOLVE_TELEMETRY_COLUMNS = (HeaderConventions.solver_column, HeaderConventions.solver_status_column,
+                           HeaderConventions.solver_iterations_column, HeaderConventions.compile_time_column,
+                           HeaderConventions.solve_time_column)
+
+
+class SolverTimeoutError(TimeoutError):
+    """The wall-clock budget of an optimization is spent, the remaining solvers of the chain are not tried."""
+
+
+class SolveTelemetry:
+    """
+    Solver, status and iterations of the last solve of an optimization, and the compile and solve times spent by all
+    its solves, checked against the wall-clock timeout of its solver policy.
+    """
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self.started = time.perf_counter()
+        self.solver = None
+        self.status = None
+        self.iterations = None
+        self.compile_time = 0.0
+        self.solve_time = 0.0
+
+    def remaining_time(self):
+        """Seconds left in the budget, None without timeout."""
+        if self.timeout is None:
+            return None
+        return self.timeout - (time.perf_counter() - self.started)
+
+    def record(self, solver, status, iterations=None, compile_time=0.0, solve_time=0.0):
+        self.solver = solver
+        self.status = status
+        self.iterations = iterations
+        self.compile_time += compile_time
+        self.solve_time += solve_time
+
+    def record_problem(self, problem, solver, elapsed, status=None):
+        """Record a solve of a CVXPY problem, its compile time is taken out of the elapsed wall-clock time."""
+        compile_time = getattr(problem, 'compilation_time', None) or 0.0
+        solver_stats = getattr(problem, 'solver_stats', None)
+        self.record(solver if solver is not None else getattr(solver_stats, 'solver_name', None),
+                    status if status is not None else problem.status,
+                    getattr(solver_stats, 'num_iters', None),
+                    compile_time,
+                    max(elapsed - compile_time, 0.0))
+
+    def record_telemetry(self, solve_telemetry):
+        """Record the solves of another telemetry, e.g. the share of an optimization in a batch of the window."""
+        self.record(solve_telemetry.solver, solve_telemetry.status, solve_telemetry.iterations,
+                    solve_telemetry.compile_time, solve_telemetry.solve_time)
+
+    def to_dict(self):
+        return {HeaderConventions.solver_column: self.solver,
+                HeaderConventions.solver_status_column: self.status,
+                HeaderConventions.solver_iterations_column: self.iterations
+                if self.iterations is not None else np.nan,
+                HeaderConventions.compile_time_column: self.compile_time,
+                HeaderConventions.solve_time_column: self.solve_time}
+
+
+def _solve_with_policy(problem, *args, solve_telemetry=None, **kwargs):
+    """
+    CVXPY solve method of the policy: the solver gets the time left in the budget as its native time limit, the
+    solve is recorded in the telemetry and a status without an optimal solution raises `cp.SolverError`, so that
+    Riskfolio tries the next solver. Once the budget is spent, `SolverTimeoutError` stops the chain.
+    """
+    solver = kwargs.get('solver')
+    remaining_time = solve_telemetry.remaining_time()
+    if remaining_time is not None:
+        if remaining_time <= 0:
+            raise SolverTimeoutError(f"Solver budget of timeout={solve_telemetry.timeout}s spent before "
+                                     f"solver=`{solver}`, last solver=`{solve_telemetry.solver}` status="
+                                     f"`{solve_telemetry.status}`")
+        if solver in TIME_LIMIT_OPTIONS:
+            kwargs[TIME_LIMIT_OPTIONS[solver]] = remaining_time
+    started = time.perf_counter()
+    try:
+        result = problem._solve(*args, **kwargs)
+    except cp.SolverError:
+        solve_telemetry.record_problem(problem, solver, time.perf_counter() - started, SOLVER_ERROR_STATUS)
+        raise
+    solve_telemetry.record_problem(problem, solver, time.perf_counter() - started)
+    if problem.status not in ACCEPTED_STATUSES:
+        remaining_time = solve_telemetry.remaining_time()
+        if remaining_time is not None and remaining_time <= 0:
+            # The solution of a solver stopped by its time limit is not used
+            solve_telemetry.status = TIMEOUT_STATUS
+            raise SolverTimeoutError(f"Solver=`{solver}` stopped by the solver budget of "
+                                     f"timeout={solve_telemetry.timeout}s with status=`{problem.status}`")
+        raise cp.SolverError(f"Solver=`{solver}` finished with status=`{problem.status}`")
+    return result
+
+
+cp.Problem.register_solve(SOLVE_METHOD_NAME, _solve_with_policy)
+
+
+class SolverPolicy:
+    """
+    Ordered solvers tried for an optimization, wall-clock timeout in seconds of the whole chain (None for no
+    timeout) and native options of every solver, e.g. its tolerances.
+
+    The timeout is enforced with the native time limit of the solvers that have one, a solver without one (ECOS) is
+    only started when time is left in the budget.
+    """
+
+    def __init__(self, solvers, timeout=None, solver_options=None):
+        installed_solvers = cp.installed_solvers()
+        self.solvers = [solver for solver in solvers if solver in installed_solvers]
+        skipped_solvers = [solver for solver in solvers if solver not in installed_solvers]
+        if skipped_solvers:
+            logger.debug(f"Skipping the solvers={skipped_solvers} that are not installed")
+        if not self.solvers:
+            raise ValueError(f"None of the solvers={list(solvers)} is installed, installed solvers are "
+                             f"{installed_solvers}")
+        self.timeout = timeout
+        self.solver_options = solver_options or {}
+
+    def get_cache_parameters(self):
+        """
+        The resolved policy: the order of the installed solvers and their options change the results, the timeout
+        which solver of the chain returns them.
+        """
+        return {'solvers': self.solvers, 'timeout': self.timeout, 'solver_options': self.solver_options}
+
+    def apply(self, port):
+        """
+        Solve the next optimizations of the Riskfolio Portfolio with the policy, the returned telemetry records them.
+        The attributes of the Portfolio are reassigned, so a shallow copy of a shared Portfolio can be given.
+        """
+        solve_telemetry = SolveTelemetry(self.timeout)
+        port.solvers = list(self.solvers)
+        port.sol_params = {solver: {'method': SOLVE_METHOD_NAME,
+                                    'solve_telemetry': solve_telemetry,
+                                    **self.solver_options.get(solver, {})}
+                           for solver in self.solvers}
+        return solve_telemetry
+
+
+@lru_cache(maxsize=None)
+def get_solver_policy(optimizer_name):
+    """
+    Solver policy of the optimizer class from the `solver_policy` section of config.yaml: the `default` policy
+    updated with the keys of the optimizer under `optimizers`.
+    """
+    module_name = os.path.basename(os.path.dirname(__file__))
+    solver_policy_cfg = OmegaConf.to_container(load_config(module_name).optimization.solver_policy)
+    policy = {**solver_policy_cfg['default'], **(solver_policy_cfg.get('optimizers') or {}).get(optimizer_name, {})}
+    return SolverPolicy(policy['solvers'], policy.get('timeout'), policy.get('solver_options'))
@@ -0,0 +1,83 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+from pypfopt import EfficientFrontier
+
+from src.common.conventions import HeaderConventions
+from src.common.market_data_context import MarketDataContext
+from src.common.tests.mock_market_data import mock_market_data
+from src.optimization.batched_mean_variance import get_agreement_report, solve_long_only_grid, solve_window_batch
+from src.optimization.parametric_mean_variance import MIN_VOLATILITY_OBJECTIVE
+from src.optimization.py_portfolio_opt_frontier_base import PyPortfolioOptFrontierBase
+
+
+class TestBatchedMeanVariance(unittest.TestCase):
+    def setUp(self):
+        self.current_dir = Path(tempfile.mkdtemp())
+        self.data, self.expected_return_df, self.risk_return_dict = mock_market_data()
+
+    def tearDown(self):
+        shutil.rmtree(self.current_dir, ignore_errors=True)
+
+    def test_batched_solver_agrees_with_pypfopt(self):
+        expected_returns_dict = {expected_return_type: self.expected_return_df[expected_return_type]
+                                 for expected_return_type in self.expected_return_df.columns}
+        for objective in ("max_sharpe", MIN_VOLATILITY_OBJECTIVE):
+            report_df = get_agreement_report(expected_returns_dict, self.risk_return_dict, objective)
+            self.assertEqual(len(report_df), 4)
+            self.assertTrue(report_df[HeaderConventions.converged_column].all())
+            self.assertTrue(report_df[HeaderConventions.cleaned_weights_match_column].all())
+            self.assertLess(report_df[HeaderConventions.max_weight_difference_column].max(), 1e-5)
+
+        # The optimizers of the batched backend read the batch of the window from the MarketDataContext
+        market_data_context = MarketDataContext(self.data)
+        solutions = solve_window_batch(market_data_context, self.expected_return_df, self.risk_return_dict)
+        self.assertEqual(len(solutions), 4)
+        mu, cov_matrix = self.expected_return_df["Median"], self.risk_return_dict["Sample"]
+        frontier = PyPortfolioOptFrontierBase(mu, cov_matrix, "Median", "Sample", self.current_dir,
+                                              market_data_context=market_data_context, solver_backend="batched")
+        frontier.calculate_efficient_frontier()
+        self.assertIs(frontier.weights, solutions[("Median", "Sample")][0])
+        efficient_frontier = EfficientFrontier(mu, cov_matrix)
+        efficient_frontier.max_sharpe()
+        np.testing.assert_allclose(frontier.weights, efficient_frontier.weights, atol=1e-6)
+
+    def test_batched_solutions_are_keyed_on_the_inputs(self):
+        market_data_context = MarketDataContext(self.data)
+        solutions = solve_window_batch(market_data_context, self.expected_return_df, self.risk_return_dict)
+        # Other expected returns under the same names are solved again instead of reading the first batch
+        other_expected_return_df = self.expected_return_df.assign(Mean=self.expected_return_df["Median"])
+        other_solutions = solve_window_batch(market_data_context, other_expected_return_df, self.risk_return_dict)
+        np.testing.assert_allclose(other_solutions[("Mean", "Sample")][0], solutions[("Median", "Sample")][0])
+        frontier = PyPortfolioOptFrontierBase(other_expected_return_df["Mean"], self.risk_return_dict["Sample"], "Mean",
+                                              "Sample", self.current_dir, market_data_context=market_data_context,
+                                              solver_backend="batched")
+        frontier.calculate_efficient_frontier()
+        self.assertIs(frontier.weights, other_solutions[("Mean", "Sample")][0])
+
+        # The same inputs are read from the memo, other starting weights are solved again
+        initial_weights_dict = {("Mean", "Sample"): dict.fromkeys(self.data.columns, 0.25)}
+        with patch("src.optimization.batched_mean_variance.solve_long_only_grid",
+                   wraps=solve_long_only_grid) as solve_grid:
+            solve_window_batch(market_data_context, self.expected_return_df, self.risk_return_dict)
+            self.assertEqual(solve_grid.call_count, 0)
+            solve_window_batch(market_data_context, self.expected_return_df, self.risk_return_dict,
+                               initial_weights_dict)
+            self.assertEqual(solve_grid.call_count, 1)
+
+    def test_batched_solver_settings_are_fingerprinted(self):
+        mu, cov_matrix = self.expected_return_df["Mean"], self.risk_return_dict["Sample"]
+        frontier = PyPortfolioOptFrontierBase(mu, cov_matrix, "Mean", "Sample", self.current_dir,
+                                              solver_backend="batched")
+        fingerprint = frontier.get_cache_fingerprint()
+        with patch("src.optimization.py_portfolio_opt_frontier_base.get_batched_solver_config",
+                   return_value=(1e-6, 100)):
+            self.assertNotEqual(frontier.get_cache_fingerprint(), fingerprint)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+from pypfopt import EfficientFrontier
+
+from src.common.tests.mock_market_data import mock_market_data
+from src.optimization.closed_form_mean_variance import solve_closed_form, solve_mean_variance_grid
+from src.optimization.main import calculate_optimizations_for_risk_model
+from src.optimization.parametric_mean_variance import MIN_VOLATILITY_OBJECTIVE, optimize_mean_variance
+from src.optimization.py_portfolio_opt_frontier_base import PyPortfolioOptFrontierBase
+
+
+class TestClosedFormMeanVariance(unittest.TestCase):
+    def setUp(self):
+        self.current_dir = Path(tempfile.mkdtemp())
+        self.data, self.expected_return_df, self.risk_return_dict = mock_market_data()
+
+    def tearDown(self):
+        shutil.rmtree(self.current_dir, ignore_errors=True)
+
+    def test_closed_form_grid_matches_cvxpy(self):
+        expected_returns_dict = {expected_return_type: self.expected_return_df[expected_return_type]
+                                 for expected_return_type in self.expected_return_df.columns}
+        for weight_bounds in ((-1, 1), (0, 1)):
+            for objective in ("max_sharpe", MIN_VOLATILITY_OBJECTIVE):
+                results = solve_mean_variance_grid(expected_returns_dict, self.risk_return_dict, weight_bounds,
+                                                   objective)
+                self.assertEqual(len(results), 4)
+                for (expected_return_type, risk_model_name), (weights, cleaned_weights, performance) in \
+                        results.items():
+                    expected = optimize_mean_variance(expected_returns_dict[expected_return_type],
+                                                      self.risk_return_dict[risk_model_name], weight_bounds,
+                                                      objective)
+                    np.testing.assert_allclose(weights, expected[0], atol=1e-5)
+                    self.assertEqual(list(cleaned_weights), list(expected[1]))
+                    np.testing.assert_allclose(performance, expected[2], rtol=1e-5)
+
+        # The closed form backend gives the max Sharpe ratio portfolio of EfficientFrontier
+        mu, cov_matrix = self.expected_return_df["Mean"], self.risk_return_dict["Sample"]
+        frontier = PyPortfolioOptFrontierBase(mu, cov_matrix, "Mean", "Sample", self.current_dir,
+                                              weight_bounds=(-1, 1), solver_backend="closed_form")
+        frontier.calculate_efficient_frontier()
+        efficient_frontier = EfficientFrontier(mu, cov_matrix, weight_bounds=(-1, 1))
+        efficient_frontier.max_sharpe()
+        np.testing.assert_allclose(frontier.weights, efficient_frontier.weights, atol=1e-6)
+
+    def test_window_is_solved_in_one_stacked_call_per_weight_bounds(self):
+        enabled_methods = ["pyPortfolioOptFrontier", "pyPortfolioOptFrontierWithShortPosition"]
+        with patch("src.optimization.py_portfolio_opt_frontier_base.get_solver_backend", return_value="closed_form"), \
+                patch("src.optimization.main.get_solver_backend", return_value="closed_form"), \
+                patch("src.optimization.closed_form_mean_variance.solve_closed_form",
+                      wraps=solve_closed_form) as stacked_solve:
+            optimization_df = calculate_optimizations_for_risk_model(self.expected_return_df, self.risk_return_dict,
+                                                                     self.data, self.current_dir, enabled_methods,
+                                                                     max_workers=1, deduplicate=False)
+        self.assertEqual(len(optimization_df), 8)
+        # Every call stacks the 2 covariances and the 2 expected returns of the window
+        self.assertEqual(stacked_solve.call_count, 2)
+        for call in stacked_solve.call_args_list:
+            self.assertEqual(call.args[0].shape, (2, 4, 4))
+            self.assertEqual(call.args[1].shape, (2, 4))
+
+
+if __name__ == '__main__':
+    unittest.main()
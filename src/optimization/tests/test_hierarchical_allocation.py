@@ -0,0 +1,85 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+from pypfopt import HRPOpt
+
+from src.common.conventions import HeaderConventions
+from src.common.market_data_context import MarketDataContext
+from src.optimization.hierarchical_allocation import HierarchicalClustering, get_clustering
+from src.optimization.hrp_optimizer import HRPOptimizer
+from src.optimization.main import calculate_efficient_frontiers, get_all_efficient_frontier_optimizer
+
+
+class TestHierarchicalOptimizers(unittest.TestCase):
+    def setUp(self):
+        self.current_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.current_dir, ignore_errors=True)
+
+    def test_hierarchical_optimizers_share_the_clustering(self):
+        # Two blocks of 4 assets driven by a common factor each
+        rng = np.random.default_rng(1)
+        factors = rng.normal(0, 0.01, (500, 2))
+        tickers = [f"Stock{i}" for i in range(8)]
+        returns = pd.DataFrame(np.repeat(factors, 4, axis=1) + rng.normal(0, 0.005, (500, 8)) * np.tile(
+            np.arange(1, 5), 2), columns=tickers)
+        data = 100 * (1 + returns).cumprod()
+        covariance_matrix = returns.cov() * 252
+        expected_returns = returns.mean() * 252
+        enabled_methods = ["HRPOptimizer", "HERCOptimizer", "NCOOptimizer"]
+        market_data_context = MarketDataContext(data)
+        with patch("src.optimization.hierarchical_allocation.HierarchicalClustering",
+                   wraps=HierarchicalClustering) as clustering:
+            optimizers_dict = get_all_efficient_frontier_optimizer("Mean", "Sample", expected_returns,
+                                                                   covariance_matrix, self.current_dir,
+                                                                   enabled_methods, data, market_data_context)
+            # The clustering is shared by content, another covariance object with the same values reuses it
+            self.assertIs(get_clustering(covariance_matrix.copy(), "single", market_data_context),
+                          get_clustering(covariance_matrix, "single", market_data_context))
+        # One linkage for the three optimizers of the covariance
+        self.assertEqual(clustering.call_count, 1)
+        self.assertEqual(len(optimizers_dict), 3)
+        for results in optimizers_dict.values():
+            weights = pd.Series(results[HeaderConventions.cleaned_weights_column].iloc[0])
+            self.assertAlmostEqual(weights.sum(), 1, places=4)
+            self.assertEqual(results[HeaderConventions.solver_column].iloc[0], "hierarchical")
+        self.assertEqual(HierarchicalClustering(covariance_matrix).get_number_of_clusters(), 2)
+        # HRP has the weights of PyPortfolioOpt with the same linkage
+        hrp_weights = optimizers_dict[HRPOptimizer][HeaderConventions.cleaned_weights_column].iloc[0]
+        expected_weights = HRPOpt(returns, covariance_matrix).optimize(linkage_method="single")
+        for ticker in tickers:
+            self.assertAlmostEqual(hrp_weights[ticker], expected_weights[ticker], places=4)
+
+    def test_hierarchical_frontier_is_the_allocation(self):
+        rng = np.random.default_rng(2)
+        tickers = ["StockA", "StockB", "StockC", "StockD"]
+        returns = pd.DataFrame(rng.normal(0.0005, 0.01, (250, 4)), columns=tickers)
+        data = 100 * (1 + returns).cumprod()
+        expected_return_df = pd.DataFrame({"Mean": returns.mean() * 252})
+        risk_return_dict = {"Sample": returns.cov() * 252}
+        frontiers_df = calculate_efficient_frontiers(data, expected_return_df, risk_return_dict, self.current_dir,
+                                                     ["HRPOptimizer", "HERCOptimizer", "NCOOptimizer"], n_points=10)
+        self.assertEqual(len(frontiers_df), 3)
+        for _, row in frontiers_df.iterrows():
+            optimizers_dict = get_all_efficient_frontier_optimizer(
+                "Mean", "Sample", expected_return_df["Mean"], risk_return_dict["Sample"], self.current_dir,
+                [row[HeaderConventions.optimizer_column]], data)
+            results = next(iter(optimizers_dict.values()))
+            frontier_weights = row[HeaderConventions.frontier_weights_column]
+            # One point, the portfolio of the allocation
+            self.assertEqual(frontier_weights.shape, (1, 4))
+            np.testing.assert_allclose(frontier_weights.iloc[0][tickers].to_numpy(),
+                                       pd.Series(results[HeaderConventions.cleaned_weights_column].iloc[0])[tickers],
+                                       atol=1e-4)
+            self.assertAlmostEqual(row[HeaderConventions.frontier_volatilities_column][0],
+                                   results[HeaderConventions.annual_volatility_column].iloc[0], places=4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import pandas as pd
+
+from src.common.conventions import HeaderConventions
+from src.common.tests.mock_market_data import mock_market_data
+from src.optimization.input_deduplication import group_duplicate_inputs
+from src.optimization.main import calculate_optimizations, calculate_optimizations_for_risk_model
+from src.optimization.mv_risk_folio_optimizer import MVRiskFolioOptimizer
+
+
+class TestInputDeduplication(unittest.TestCase):
+    def setUp(self):
+        self.current_dir = Path(tempfile.mkdtemp())
+        (self.current_dir / "serial").mkdir()
+        (self.current_dir / "parallel").mkdir()
+        self.data, self.expected_return_df, self.risk_return_dict = mock_market_data()
+
+    def tearDown(self):
+        shutil.rmtree(self.current_dir, ignore_errors=True)
+
+    def test_duplicate_inputs_are_solved_once(self):
+        expected_return_df = self.expected_return_df.assign(RiskParity=self.expected_return_df["Mean"],
+                                                            NearMean=self.expected_return_df["Mean"] * (1 + 1e-13))
+        risk_return_dict = {**self.risk_return_dict, "Copy": self.risk_return_dict["Sample"].copy()}
+        self.assertEqual(group_duplicate_inputs({column: expected_return_df[column]
+                                                 for column in expected_return_df.columns}),
+                         {"Mean": "Mean", "Median": "Median", "RiskParity": "Mean", "NearMean": "Mean"})
+        # Scaled inputs are different inputs
+        self.assertEqual(group_duplicate_inputs({"Sample": self.risk_return_dict["Sample"],
+                                                 "Daily": self.risk_return_dict["Sample"] / 252}),
+                         {"Sample": "Sample", "Daily": "Daily"})
+
+        enabled_methods = ["pyPortfolioOptFrontier", "MVRiskFolioOptimizer"]
+        with patch.object(MVRiskFolioOptimizer, "calculate_efficient_frontier", autospec=True,
+                          side_effect=MVRiskFolioOptimizer.calculate_efficient_frontier) as calculate:
+            deduplicated_df = calculate_optimizations_for_risk_model(expected_return_df, risk_return_dict, self.data,
+                                                                     self.current_dir / "serial", enabled_methods,
+                                                                     max_workers=1, deduplicate=True)
+        # 2 unique return types x 2 unique risk models
+        self.assertEqual(calculate.call_count, 4)
+        full_df = calculate_optimizations_for_risk_model(expected_return_df, risk_return_dict, self.data,
+                                                         self.current_dir / "parallel", enabled_methods,
+                                                         max_workers=1, deduplicate=False)
+        self.assertEqual(len(deduplicated_df), 4 * 3 * 2)
+        columns = [HeaderConventions.expected_return_column, HeaderConventions.risk_model_column,
+                   HeaderConventions.optimizer_column, HeaderConventions.weights_column]
+        # Exact aliases have the results of a full solve, tolerance aliases the results of their unique input
+        near_mean = deduplicated_df[HeaderConventions.expected_return_column] == "NearMean"
+        pd.testing.assert_frame_equal(deduplicated_df.loc[~near_mean, columns].astype(str),
+                                      full_df.loc[~near_mean, columns].astype(str))
+        mean = deduplicated_df[HeaderConventions.expected_return_column] == "Mean"
+        self.assertEqual(deduplicated_df.loc[near_mean, HeaderConventions.weights_column].astype(str).tolist(),
+                         deduplicated_df.loc[mean, HeaderConventions.weights_column].astype(str).tolist())
+        # The rows of an alias name the pair they were solved as, their solve times are the times of that pair
+        self.assertEqual(deduplicated_df.loc[near_mean, HeaderConventions.alias_of_column].tolist(),
+                         ["Mean / Sample"] * 2 + ["Mean / Diagonal"] * 2 + ["Mean / Sample"] * 2)
+        self.assertEqual(deduplicated_df.loc[mean, HeaderConventions.alias_of_column].tolist(),
+                         [None] * 4 + ["Mean / Sample"] * 2)
+        self.assertNotIn(HeaderConventions.alias_of_column, full_df.columns)
+
+    def test_window_cache_covers_the_deduplication_config(self):
+        expected_return_df = self.expected_return_df.assign(RiskParity=self.expected_return_df["Mean"])
+        enabled_methods = ["MVRiskFolioOptimizer"]
+        with patch("src.optimization.main.get_deduplication_config", return_value=(True, 1e-10, 1e-14)):
+            calculate_optimizations(self.data, expected_return_df, self.risk_return_dict, self.current_dir,
+                                    enabled_methods, max_workers=1)
+        # Without the deduplication (the default), the aliases are solved instead of being read from the window results
+        with patch.object(MVRiskFolioOptimizer, "calculate_efficient_frontier", autospec=True,
+                          side_effect=MVRiskFolioOptimizer.calculate_efficient_frontier) as calculate:
+            optimization_df = calculate_optimizations(self.data, expected_return_df, self.risk_return_dict,
+                                                      self.current_dir, enabled_methods, max_workers=1)
+        self.assertEqual(calculate.call_count, 2)
+        self.assertEqual(len(optimization_df), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
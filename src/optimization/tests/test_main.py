@@ -1,3 +1,5 @@
+import shutil
+import tempfile
 import unittest
 from pathlib import Path
 from unittest.mock import patch
@@ -5,7 +7,14 @@ from unittest.mock import patch
 import numpy as np
 import pandas as pd
 
-from src.optimization.main import calculate_optimizations
+from src.common.conventions import HeaderConventions, PklFileConventions
+from src.common.result_store import ResultStore, get_result_store
+from src.common.tests.mock_market_data import mock_market_data
+from src.optimization.hrp_optimizer import HRPOptimizer
+from src.optimization.main import calculate_optimizations, calculate_optimizations_for_risk_model, \
+    get_optimization_chunks
+from src.optimization.mv_risk_folio_optimizer import MVRiskFolioOptimizer
+from src.optimization.py_portfolio_opt_frontier import PyPortfolioOptFrontier
 
 
 class TestCalculateOptimizationsForRiskModel(unittest.TestCase):
@@ -33,5 +42,94 @@ class TestCalculateOptimizationsForRiskModel(unittest.TestCase):
         # )
 
 
+class TestParallelOptimizationGrid(unittest.TestCase):
+    def setUp(self):
+        self.current_dir = Path(tempfile.mkdtemp())
+        (self.current_dir / "serial").mkdir()
+        (self.current_dir / "parallel").mkdir()
+        self.data, self.expected_return_df, self.risk_return_dict = mock_market_data()
+        self.enabled_methods = ["pyPortfolioOptFrontier", "MVRiskFolioOptimizer", "unknownOptimizer"]
+
+    def tearDown(self):
+        shutil.rmtree(self.current_dir, ignore_errors=True)
+
+    def test_chunks_share_one_covariance(self):
+        chunks = get_optimization_chunks(self.expected_return_df, self.risk_return_dict, self.enabled_methods, 4)
+        self.assertEqual([risk_model_name for risk_model_name, _ in chunks], ["Sample", "Sample", "Diagonal",
+                                                                              "Diagonal"])
+        self.assertEqual(sum(len(methods) for _, tasks in chunks for *_, methods in tasks), 12)
+
+    def test_parallel_grid_matches_serial_loop(self):
+        serial_df = calculate_optimizations_for_risk_model(self.expected_return_df, self.risk_return_dict, self.data,
+                                                           self.current_dir / "serial", self.enabled_methods,
+                                                           max_workers=1)
+        parallel_df = calculate_optimizations_for_risk_model(self.expected_return_df, self.risk_return_dict,
+                                                             self.data, self.current_dir / "parallel",
+                                                             self.enabled_methods, max_workers=2, chunk_size=3)
+        self.assertEqual(len(serial_df), 8)
+        # The wall-clock times of the solves differ between runs
+        timing_columns = [HeaderConventions.compile_time_column, HeaderConventions.solve_time_column]
+        pd.testing.assert_frame_equal(serial_df.drop(columns=timing_columns).astype(str),
+                                      parallel_df.drop(columns=timing_columns).astype(str))
+        # The results of the workers are appended to the result store of the window by the calling process
+        stored_results = ResultStore(self.current_dir / "parallel" / PklFileConventions.result_store_filename).load_all()
+        self.assertEqual(len(stored_results), 8)
+        self.assertEqual(list(self.current_dir.glob("*/*.pkl")), [])
+
+    def test_cached_rerun_reads_the_result_store(self):
+        enabled_methods = ["pyPortfolioOptFrontier", "MVRiskFolioOptimizer"]
+        first_df = calculate_optimizations_for_risk_model(self.expected_return_df, self.risk_return_dict, self.data,
+                                                          self.current_dir, enabled_methods, max_workers=1)
+        # The rows of the grid are read once, not looked up for every optimizer
+        with patch.object(MVRiskFolioOptimizer, "calculate_efficient_frontier",
+                          side_effect=AssertionError("solved again")), \
+                patch.object(PyPortfolioOptFrontier, "calculate_efficient_frontier",
+                             side_effect=AssertionError("solved again")), \
+                patch.object(ResultStore, "get", side_effect=AssertionError("read per optimizer")), \
+                patch.object(ResultStore, "load_all", autospec=True, side_effect=ResultStore.load_all) as load_all:
+            cached_df = calculate_optimizations_for_risk_model(self.expected_return_df, self.risk_return_dict,
+                                                               self.data, self.current_dir, enabled_methods,
+                                                               max_workers=1)
+        pd.testing.assert_frame_equal(first_df.astype(str), cached_df.astype(str))
+        load_all.assert_called_once()
+        # Other inputs of the same key are not served from the store
+        result_store = get_result_store(self.current_dir)
+        optimizer = MVRiskFolioOptimizer(self.expected_return_df["Mean"] * 2, self.risk_return_dict["Sample"], "Mean",
+                                         "Sample", self.current_dir, self.data)
+        self.assertIs(optimizer.result_store, result_store)
+        self.assertIsNone(optimizer.load_cached_results())
+
+    def test_window_cache_covers_the_optimizer_config(self):
+        enabled_methods = ["pyPortfolioOptFrontier", "HRPOptimizer"]
+        calculate_optimizations(self.data, self.expected_return_df, self.risk_return_dict, self.current_dir,
+                                enabled_methods, max_workers=1)
+        # Same inputs and config: the results of the window are read without solving
+        with patch.object(PyPortfolioOptFrontier, "calculate_efficient_frontier",
+                          side_effect=AssertionError("solved again")):
+            cached_df = calculate_optimizations(self.data, self.expected_return_df, self.risk_return_dict,
+                                                self.current_dir, enabled_methods, max_workers=1)
+        self.assertEqual(len(cached_df), 8)
+        # Another backend or linkage of the config is solved again
+        for target, value, optimizer in (("py_portfolio_opt_frontier_base.get_solver_backend", "closed_form",
+                                          PyPortfolioOptFrontier),
+                                         ("hierarchical_frontier_base.get_hierarchical_config", ("average", 10),
+                                          HRPOptimizer)):
+            with patch(f"src.optimization.{target}", return_value=value), \
+                    patch.object(optimizer, "calculate_efficient_frontier", autospec=True,
+                                 side_effect=optimizer.calculate_efficient_frontier) as calculate:
+                calculate_optimizations(self.data, self.expected_return_df, self.risk_return_dict, self.current_dir,
+                                        enabled_methods, max_workers=1)
+            self.assertEqual(calculate.call_count, 4)
+
+    def test_given_chunk_size_is_kept_with_the_configured_workers(self):
+        with patch("src.optimization.main.get_parallel_config", return_value=(1, None)), \
+                patch("src.optimization.main._calculate_optimization_grid",
+                      return_value=pd.DataFrame()) as calculate_grid:
+            calculate_optimizations_for_risk_model(self.expected_return_df, self.risk_return_dict, self.data,
+                                                   self.current_dir, self.enabled_methods, chunk_size=3,
+                                                   deduplicate=False)
+        self.assertEqual(calculate_grid.call_args.args[6:8], (1, 3))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,77 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+from src.common.conventions import HeaderConventions
+from src.common.tests.mock_market_data import mock_market_data
+from src.optimization.batched_mean_variance import solve_long_only_grid
+from src.optimization.main import calculate_optimizations
+from src.optimization.multi_period import TurnoverControl, get_previous_weights
+from src.optimization.mv_risk_folio_optimizer import MVRiskFolioOptimizer
+from src.optimization.py_portfolio_opt_frontier import PyPortfolioOptFrontier
+
+
+class TestMultiPeriod(unittest.TestCase):
+    def setUp(self):
+        self.current_dir = Path(tempfile.mkdtemp())
+        (self.current_dir / "serial").mkdir()
+        (self.current_dir / "parallel").mkdir()
+        self.data, self.expected_return_df, self.risk_return_dict = mock_market_data()
+
+    def tearDown(self):
+        shutil.rmtree(self.current_dir, ignore_errors=True)
+
+    def test_multi_period_turnover_controls(self):
+        enabled_methods = ["pyPortfolioOptFrontier", "MVRiskFolioOptimizer"]
+        first_df = calculate_optimizations(self.data, self.expected_return_df, self.risk_return_dict,
+                                           self.current_dir / "serial", enabled_methods, max_workers=1)
+        self.assertTrue(first_df[HeaderConventions.turnover_column].isna().all())
+        previous_weights = get_previous_weights(first_df)
+        self.assertEqual(len(previous_weights), 8)
+        # Same inputs without turnover controls: the previous weights are only a warm start
+        with patch("src.optimization.main.get_turnover_control",
+                   side_effect=lambda weights: TurnoverControl(weights)):
+            second_df = calculate_optimizations(self.data, self.expected_return_df, self.risk_return_dict,
+                                                self.current_dir / "parallel", enabled_methods, max_workers=1,
+                                                previous_weights=previous_weights)
+        np.testing.assert_allclose(second_df[HeaderConventions.turnover_column].astype(float), 0, atol=1e-3)
+
+        # Equal previous weights, the max Sharpe ratio portfolio is further away than the turnover limits
+        tickers = list(self.data.columns)
+        equal_weights = pd.Series(0.25, index=tickers)
+        mu, cov = self.expected_return_df["Mean"], self.risk_return_dict["Sample"]
+        unconstrained = PyPortfolioOptFrontier(mu, cov, "Mean", "Sample", self.current_dir, self.data)
+        unconstrained.calculate_efficient_frontier()
+        self.assertGreater(TurnoverControl(equal_weights).get_turnover(unconstrained.cleaned_weights), 0.3)
+        frontier = PyPortfolioOptFrontier(mu, cov, "Mean", "Sample", self.current_dir, self.data)
+        frontier.set_turnover_control(TurnoverControl(equal_weights, max_turnover=0.2))
+        frontier.calculate_efficient_frontier()
+        self.assertAlmostEqual(frontier.get_results()[HeaderConventions.turnover_column].iloc[0], 0.2, places=3)
+        self.assertLess(frontier.performance[2], unconstrained.performance[2])
+        frontier = PyPortfolioOptFrontier(mu, cov, "Mean", "Sample", self.current_dir, self.data)
+        frontier.set_turnover_control(TurnoverControl(equal_weights, turnover_penalty=100.0))
+        frontier.calculate_efficient_frontier()
+        self.assertAlmostEqual(frontier.get_turnover(frontier.cleaned_weights), 0, places=3)
+        optimizer = MVRiskFolioOptimizer(mu, cov, "Mean", "Sample", self.current_dir, self.data)
+        optimizer.set_turnover_control(TurnoverControl(equal_weights, max_asset_turnover=0.05))
+        optimizer.calculate_efficient_frontier()
+        self.assertLessEqual(np.abs(optimizer.weights["weights"].to_numpy() - 0.25).max(), 0.05 + 1e-6)
+
+        # The batched solver converges in fewer iterations from the weights of the previous window
+        shifted_mu = mu * np.array([1.05, 1, 1, 1])
+        cold_results, cold_iterations, _ = solve_long_only_grid({"Mean": shifted_mu}, {"Sample": cov})
+        warm_results, warm_iterations, _ = solve_long_only_grid(
+            {"Mean": shifted_mu}, {"Sample": cov},
+            initial_weights_dict={("Mean", "Sample"): previous_weights[("Mean", "Sample", "PyPortfolioOptFrontier")]})
+        self.assertLess(warm_iterations[0], cold_iterations[0])
+        np.testing.assert_allclose(warm_results[("Mean", "Sample")][0], cold_results[("Mean", "Sample")][0],
+                                   atol=1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
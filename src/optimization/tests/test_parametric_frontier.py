@@ -0,0 +1,78 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import riskfolio as rp
+from pypfopt import EfficientFrontier
+
+from src.common.conventions import HeaderConventions
+from src.common.tests.mock_market_data import mock_market_data
+from src.optimization.cvarr_risk_folio_optimizer import CVaRRiskFolioOptimizer
+from src.optimization.main import calculate_efficient_frontiers
+from src.optimization.py_portfolio_opt_frontier import PyPortfolioOptFrontier
+from src.optimization.riskfolio_lib_frontier import get_window_portfolio
+
+
+class TestEfficientFrontierSweep(unittest.TestCase):
+    def setUp(self):
+        self.current_dir = Path(tempfile.mkdtemp())
+        self.data, self.expected_return_df, self.risk_return_dict = mock_market_data()
+
+    def tearDown(self):
+        shutil.rmtree(self.current_dir, ignore_errors=True)
+
+    def test_frontiers_are_recomputed_for_another_optimizer_config(self):
+        enabled_methods = ["pyPortfolioOptFrontier"]
+        with patch.object(PyPortfolioOptFrontier, "efficient_frontier", autospec=True,
+                          side_effect=PyPortfolioOptFrontier.efficient_frontier) as efficient_frontier:
+            frontiers_df = calculate_efficient_frontiers(self.data, self.expected_return_df, self.risk_return_dict,
+                                                         self.current_dir, enabled_methods, n_points=5)
+            cached_df = calculate_efficient_frontiers(self.data, self.expected_return_df, self.risk_return_dict,
+                                                      self.current_dir, enabled_methods, n_points=5)
+            self.assertEqual(efficient_frontier.call_count, 4)
+            pd.testing.assert_frame_equal(frontiers_df.astype(str), cached_df.astype(str))
+            # Another backend of the config does not read the frontiers of the previous backend
+            with patch("src.optimization.py_portfolio_opt_frontier_base.get_solver_backend", return_value="closed_form"):
+                calculate_efficient_frontiers(self.data, self.expected_return_df, self.risk_return_dict,
+                                              self.current_dir, enabled_methods, n_points=5)
+            self.assertEqual(efficient_frontier.call_count, 8)
+
+    def test_efficient_frontier_sweep(self):
+        enabled_methods = ["pyPortfolioOptFrontier", "pyPortfolioOptFrontierWithShortPosition",
+                           "CVaRRiskFolioOptimizer"]
+        frontiers_df = calculate_efficient_frontiers(self.data, self.expected_return_df, self.risk_return_dict,
+                                                     self.current_dir, enabled_methods, n_points=10)
+        self.assertEqual(len(frontiers_df), 12)
+        for _, row in frontiers_df.iterrows():
+            frontier_weights = row[HeaderConventions.frontier_weights_column]
+            self.assertEqual(frontier_weights.shape, (10, 4))
+            np.testing.assert_allclose(frontier_weights.sum(axis=1), 1, atol=1e-6)
+            self.assertTrue((np.diff(row[HeaderConventions.frontier_returns_column]) > 0).all())
+
+        # Critical line algorithm: from the min volatility to the max return portfolio
+        mu, cov_matrix = self.expected_return_df["Mean"], self.risk_return_dict["Sample"]
+        frontier_df = PyPortfolioOptFrontier(mu, cov_matrix, "Mean", "Sample", self.current_dir).efficient_frontier(5)
+        efficient_frontier = EfficientFrontier(mu, cov_matrix)
+        efficient_frontier.min_volatility()
+        frontier_weights = frontier_df[HeaderConventions.frontier_weights_column].iloc[0]
+        np.testing.assert_allclose(frontier_weights.iloc[0], efficient_frontier.weights, atol=1e-4)
+        self.assertAlmostEqual(frontier_df[HeaderConventions.frontier_returns_column].iloc[0][-1], mu.max())
+
+        # Every point of a Riskfolio frontier is the min risk portfolio of Riskfolio for its return
+        optimizer = CVaRRiskFolioOptimizer(mu, cov_matrix, "Mean", "Sample", self.current_dir, self.data)
+        frontier_weights = optimizer.efficient_frontier(5)[HeaderConventions.frontier_weights_column].iloc[0]
+        port = get_window_portfolio(optimizer.market_data_context)
+        port.mu, port.cov = optimizer.port.mu, optimizer.port.cov
+        port.lowerret = frontier_weights.iloc[2].to_numpy() @ optimizer.port.mu.to_numpy().ravel()
+        min_risk_weights = port.optimization(model='Classic', rm='CVaR', obj='MinRisk', hist=True)
+        scenarios = optimizer.port.returns.to_numpy()
+        self.assertAlmostEqual(rp.RiskFunctions.CVaR_Hist(scenarios @ frontier_weights.iloc[2].to_numpy()),
+                               rp.RiskFunctions.CVaR_Hist(scenarios @ min_risk_weights.to_numpy().ravel()), places=6)
+
+
+if __name__ == '__main__':
+    unittest.main()
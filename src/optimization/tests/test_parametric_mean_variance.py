@@ -0,0 +1,54 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+from pypfopt import EfficientFrontier
+
+from src.common.tests.mock_market_data import mock_market_data
+from src.optimization.parametric_mean_variance import MIN_VOLATILITY_OBJECTIVE, get_parametric_problem, \
+    optimize_mean_variance
+from src.optimization.py_portfolio_opt_frontier_base import PyPortfolioOptFrontierBase
+
+
+class TestParametricMeanVariance(unittest.TestCase):
+    def setUp(self):
+        self.current_dir = Path(tempfile.mkdtemp())
+        self.data, self.expected_return_df, self.risk_return_dict = mock_market_data()
+
+    def tearDown(self):
+        shutil.rmtree(self.current_dir, ignore_errors=True)
+
+    def test_parametric_backend_matches_efficient_frontier(self):
+        mu = self.expected_return_df["Mean"]
+        for weight_bounds in ((0, 1), (-1, 1)):
+            for risk_model_name, cov_matrix in self.risk_return_dict.items():
+                frontiers = [PyPortfolioOptFrontierBase(mu, cov_matrix, "Mean", risk_model_name, self.current_dir,
+                                                        weight_bounds=weight_bounds, solver_backend=solver_backend)
+                             for solver_backend in ("pypfopt", "parametric")]
+                for frontier in frontiers:
+                    frontier.calculate_efficient_frontier()
+                self.assertEqual(frontiers[0].cleaned_weights, frontiers[1].cleaned_weights)
+                np.testing.assert_allclose(frontiers[0].performance, frontiers[1].performance, rtol=1e-6)
+            # The problem is compiled once per number of assets and bounds
+            self.assertIs(get_parametric_problem("max_sharpe", 4, weight_bounds),
+                          get_parametric_problem("max_sharpe", 4, list(weight_bounds)))
+
+        weights, _, (_, volatility, _) = optimize_mean_variance(mu, self.risk_return_dict["Sample"],
+                                                                objective=MIN_VOLATILITY_OBJECTIVE)
+        efficient_frontier = EfficientFrontier(mu, self.risk_return_dict["Sample"])
+        efficient_frontier.min_volatility()
+        np.testing.assert_allclose(weights, efficient_frontier.weights, atol=1e-5)
+        self.assertAlmostEqual(volatility, efficient_frontier.portfolio_performance()[1], places=6)
+
+    def test_backends_are_cached_separately(self):
+        mu, cov_matrix = self.expected_return_df["Mean"], self.risk_return_dict["Sample"]
+        fingerprints = {PyPortfolioOptFrontierBase(mu, cov_matrix, "Mean", "Sample", self.current_dir,
+                                                   solver_backend=solver_backend).get_cache_fingerprint()
+                        for solver_backend in ("pypfopt", "parametric", "closed_form")}
+        self.assertEqual(len(fingerprints), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
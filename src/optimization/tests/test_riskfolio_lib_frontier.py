@@ -0,0 +1,45 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.common.market_data_context import MarketDataContext
+from src.common.tests.mock_market_data import mock_market_data
+from src.optimization.mv_risk_folio_optimizer import MVRiskFolioOptimizer
+from src.optimization.py_portfolio_opt_frontier import PyPortfolioOptFrontier
+from src.optimization.riskfolio_lib_frontier import get_window_portfolio
+
+
+class TestRiskFolioOptimizer(unittest.TestCase):
+    def setUp(self):
+        self.current_dir = Path(tempfile.mkdtemp())
+        self.data, self.expected_return_df, self.risk_return_dict = mock_market_data()
+
+    def tearDown(self):
+        shutil.rmtree(self.current_dir, ignore_errors=True)
+
+    def test_riskfolio_optimizers_share_the_window_portfolio_and_honor_the_inputs(self):
+        market_data_context = MarketDataContext(self.data)
+        weights = {}
+        for risk_model_name, cov_matrix in self.risk_return_dict.items():
+            optimizer = MVRiskFolioOptimizer(self.expected_return_df["Mean"], cov_matrix, "Mean", risk_model_name,
+                                             self.current_dir, self.data, market_data_context=market_data_context)
+            self.assertIsNot(optimizer.port, get_window_portfolio(market_data_context))
+            optimizer.calculate_efficient_frontier()
+            weights[risk_model_name] = optimizer.weights['weights'].to_numpy()
+
+            # Mean-variance with the pipeline statistics is the max Sharpe portfolio of pypfopt
+            frontier = PyPortfolioOptFrontier(self.expected_return_df["Mean"], cov_matrix, "Mean", risk_model_name,
+                                              self.current_dir, self.data)
+            frontier.calculate_efficient_frontier()
+            np.testing.assert_allclose(weights[risk_model_name],
+                                       pd.Series(frontier.cleaned_weights)[self.data.columns], atol=1e-3)
+        self.assertFalse(np.allclose(weights["Sample"], weights["Diagonal"], atol=1e-3))
+        self.assertIsNone(get_window_portfolio(market_data_context).mu)
+
+
+if __name__ == '__main__':
+    unittest.main()
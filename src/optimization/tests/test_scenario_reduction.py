@@ -0,0 +1,80 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+from omegaconf import OmegaConf
+
+from src.common.conventions import HeaderConventions
+from src.common.market_data_context import MarketDataContext
+from src.common.tests.mock_market_data import mock_market_data
+from src.optimization.cvarr_risk_folio_optimizer import CVaRRiskFolioOptimizer
+from src.optimization.main import calculate_optimizations
+from src.optimization.scenario_reduction import aggregate_scenarios, get_objective_gap_report, \
+    largest_remainder_counts, reduce_scenarios_with_k_medoids
+
+
+class TestScenarioReduction(unittest.TestCase):
+    def setUp(self):
+        self.current_dir = Path(tempfile.mkdtemp())
+        self.data, self.expected_return_df, self.risk_return_dict = mock_market_data()
+
+    def tearDown(self):
+        shutil.rmtree(self.current_dir, ignore_errors=True)
+
+    def test_scenario_reduction(self):
+        returns = self.data.pct_change().dropna()
+        counts = largest_remainder_counts([0.5, 0.3, 0.15, 0.05], 7)
+        self.assertEqual(counts.tolist(), [4, 2, 1, 0])
+        # Medoids of the scenarios, repeated with the probabilities of their clusters
+        reduced_returns = reduce_scenarios_with_k_medoids(returns, 50)
+        self.assertEqual(len(reduced_returns), 50)
+        self.assertTrue(reduced_returns.index.isin(returns.index).all())
+        np.testing.assert_allclose(reduced_returns.mean(), returns.mean(), atol=2e-3)
+        # Sums over blocks of 5 days, the cumulative returns of the drawdowns are kept at the block ends
+        aggregated_returns = aggregate_scenarios(returns, 50)
+        self.assertEqual(len(aggregated_returns), 50)
+        pd.testing.assert_frame_equal(aggregated_returns.cumsum(), returns.cumsum().loc[aggregated_returns.index])
+
+        reduction_cfg = OmegaConf.create({"enabled": True, "target_scenarios": 50, "kmedoids_risk_measures": ["CVaR"],
+                                          "aggregation_risk_measures": ["CDaR"], "max_iterations": 100,
+                                          "random_state": 0, "report": True})
+        with patch("src.optimization.scenario_reduction.get_scenario_reduction_config", return_value=reduction_cfg):
+            market_data_context = MarketDataContext(self.data)
+            optimizer = CVaRRiskFolioOptimizer(self.expected_return_df["Mean"], self.risk_return_dict["Sample"],
+                                               "Mean", "Sample", self.current_dir, self.data, market_data_context)
+            self.assertEqual(len(optimizer.port.returns), 50)
+            self.assertEqual(optimizer.get_cache_parameters()["scenario_reduction"]["method"], "kmedoids")
+            report_df = get_objective_gap_report(market_data_context, self.expected_return_df["Mean"],
+                                                 self.risk_return_dict["Sample"])
+        self.assertEqual(report_df[HeaderConventions.risk_measure_column].tolist(), ["CVaR", "CDaR"])
+        self.assertEqual(report_df[HeaderConventions.scenarios_column].tolist(), [249, 249])
+        self.assertEqual(report_df[HeaderConventions.reduced_scenarios_column].tolist(), [50, 50])
+        # The weights of the full scenarios are optimal on them, the reduced weights lose a little objective
+        gaps = report_df[HeaderConventions.objective_gap_column]
+        self.assertTrue(((gaps > -1e-4) & (gaps < 0.5)).all(), gaps.tolist())
+
+    def test_window_cache_covers_the_scenario_reduction(self):
+        enabled_methods = ["CVaRRiskFolioOptimizer"]
+        full_df = calculate_optimizations(self.data, self.expected_return_df, self.risk_return_dict, self.current_dir,
+                                          enabled_methods, max_workers=1)
+        fingerprints = set()
+        for target_scenarios in (50, 100):
+            reduction_cfg = OmegaConf.create({"enabled": True, "target_scenarios": target_scenarios,
+                                              "kmedoids_risk_measures": ["CVaR"], "aggregation_risk_measures": [],
+                                              "max_iterations": 100, "random_state": 0, "report": False})
+            with patch("src.optimization.scenario_reduction.get_scenario_reduction_config",
+                       return_value=reduction_cfg):
+                reduced_df = calculate_optimizations(self.data, self.expected_return_df, self.risk_return_dict,
+                                                     self.current_dir, enabled_methods, max_workers=1)
+            fingerprints.add(str(reduced_df[HeaderConventions.weights_column].tolist()))
+        # Enabling or retuning the reduction is not served from the window results
+        fingerprints.add(str(full_df[HeaderConventions.weights_column].tolist()))
+        self.assertEqual(len(fingerprints), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
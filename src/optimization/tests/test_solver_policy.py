@@ -0,0 +1,109 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+from src.common.conventions import HeaderConventions
+from src.common.market_data_context import MarketDataContext
+from src.common.tests.mock_market_data import mock_market_data
+from src.optimization.cvarr_risk_folio_optimizer import CVaRRiskFolioOptimizer
+from src.optimization.hrp_optimizer import HRPOptimizer
+from src.optimization.main import calculate_optimizations_for_risk_model
+from src.optimization.py_portfolio_opt_frontier import PyPortfolioOptFrontier
+from src.optimization.riskfolio_lib_frontier import get_window_portfolio
+from src.optimization.solver_policy import SolverPolicy, SolverTimeoutError
+
+
+class TestSolverPolicy(unittest.TestCase):
+    def setUp(self):
+        self.current_dir = Path(tempfile.mkdtemp())
+        self.data, self.expected_return_df, self.risk_return_dict = mock_market_data()
+
+    def tearDown(self):
+        shutil.rmtree(self.current_dir, ignore_errors=True)
+
+    def test_solver_policy_records_telemetry_and_enforces_the_timeout(self):
+        market_data_context = MarketDataContext(self.data)
+        optimizer = CVaRRiskFolioOptimizer(self.expected_return_df["Mean"], self.risk_return_dict["Sample"], "Mean",
+                                           "Sample", self.current_dir, self.data, market_data_context)
+        # Solvers that are not installed are skipped
+        optimizer.solver_policy = SolverPolicy(["NOT_A_SOLVER", "CLARABEL", "SCS"])
+        self.assertEqual(optimizer.solver_policy.solvers, ["CLARABEL", "SCS"])
+        optimizer.calculate_efficient_frontier()
+        results = optimizer.get_results(save_to_cache=False)
+        self.assertEqual(results[HeaderConventions.solver_column].iloc[0], "CLARABEL")
+        self.assertEqual(results[HeaderConventions.solver_status_column].iloc[0], "optimal")
+        self.assertGreater(results[HeaderConventions.solver_iterations_column].iloc[0], 0)
+        self.assertGreater(results[HeaderConventions.solve_time_column].iloc[0], 0)
+        # The shared Portfolio of the window keeps the default solvers of Riskfolio
+        self.assertEqual(get_window_portfolio(market_data_context).sol_params, {})
+
+        optimizer.solver_policy = SolverPolicy(["CLARABEL", "SCS"], timeout=0)
+        with self.assertRaises(SolverTimeoutError):
+            optimizer.calculate_efficient_frontier()
+
+        # A failed optimization keeps its solve telemetry next to the error message
+        with patch("src.optimization.riskfolio_lib_frontier.get_solver_policy",
+                   return_value=SolverPolicy(["CLARABEL"], timeout=0)):
+            optimization_df = calculate_optimizations_for_risk_model(self.expected_return_df, self.risk_return_dict,
+                                                                     self.data, self.current_dir,
+                                                                     ["CVaRRiskFolioOptimizer"], max_workers=1)
+        self.assertEqual(len(optimization_df), 4)
+        self.assertTrue(optimization_df[HeaderConventions.weights_column].str.contains("timeout=0s").all())
+        self.assertTrue(optimization_df[HeaderConventions.solve_time_column].eq(0).all())
+
+    def test_optimizers_without_solver_policy_record_their_own_solves(self):
+        market_data_context = MarketDataContext(self.data)
+        solves = {}
+        for solver_backend in ("pypfopt", "parametric", "batched"):
+            optimizer = PyPortfolioOptFrontier(self.expected_return_df["Mean"], self.risk_return_dict["Sample"], "Mean",
+                                               "Sample", self.current_dir, self.data, market_data_context)
+            optimizer.solver_backend = solver_backend
+            optimizer.calculate_efficient_frontier()
+            solves[solver_backend] = optimizer.get_solve_telemetry()
+        # Expected returns proportional to the variances of a diagonal covariance: the equal weights, within the bounds
+        diagonal_covariance = self.risk_return_dict["Diagonal"]
+        optimizer = PyPortfolioOptFrontier(pd.Series(np.diag(diagonal_covariance), index=diagonal_covariance.index),
+                                           diagonal_covariance, "Variance", "Diagonal", self.current_dir, self.data,
+                                           market_data_context)
+        optimizer.solver_backend = "closed_form"
+        optimizer.calculate_efficient_frontier()
+        solves["closed_form"] = optimizer.get_solve_telemetry()
+        optimizer = HRPOptimizer(self.expected_return_df["Mean"], self.risk_return_dict["Sample"], "Mean", "Sample",
+                                 self.current_dir, self.data, market_data_context)
+        optimizer.calculate_efficient_frontier()
+        solves["hierarchical"] = optimizer.get_solve_telemetry()
+
+        # The CVXPY problems report their solver, status and iterations
+        for solver_backend in ("pypfopt", "parametric"):
+            with self.subTest(solver_backend=solver_backend):
+                self.assertNotIn(solves[solver_backend][HeaderConventions.solver_column],
+                                 (None, "pypfopt", "parametric"))
+                self.assertEqual(solves[solver_backend][HeaderConventions.solver_status_column], "optimal")
+                self.assertGreater(solves[solver_backend][HeaderConventions.solver_iterations_column], 0)
+        # The other portfolios do not claim a solver result
+        self.assertEqual(solves["batched"][HeaderConventions.solver_status_column], "converged")
+        self.assertGreater(solves["batched"][HeaderConventions.solver_iterations_column], 0)
+        for solver_name in ("closed_form", "hierarchical"):
+            with self.subTest(solver_name=solver_name):
+                self.assertEqual(solves[solver_name][HeaderConventions.solver_column], solver_name)
+                self.assertEqual(solves[solver_name][HeaderConventions.solver_status_column], "analytic")
+                self.assertTrue(np.isnan(solves[solver_name][HeaderConventions.solver_iterations_column]))
+
+    def test_resolved_policy_is_fingerprinted(self):
+        optimizer = CVaRRiskFolioOptimizer(self.expected_return_df["Mean"], self.risk_return_dict["Sample"], "Mean",
+                                           "Sample", self.current_dir, self.data)
+        fingerprints = set()
+        for solver_policy in (SolverPolicy(["CLARABEL", "SCS"]), SolverPolicy(["SCS", "CLARABEL"]),
+                              SolverPolicy(["CLARABEL", "SCS"], timeout=10)):
+            optimizer.solver_policy = solver_policy
+            fingerprints.add(optimizer.get_cache_fingerprint())
+        self.assertEqual(len(fingerprints), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
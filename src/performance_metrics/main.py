@@ -2,6 +2,7 @@ import ast
 import logging
 
 from src.common.conventions import PklFileConventions
+from src.common.market_data_context import MarketDataContext
 from src.common.utils import load_data_from_pickle, save_data_to_pickle
 from src.performance_metrics.performance_metrics_name_convernsions import PerformanceMetricsNameConventions
 from src.performance_metrics.portfoliio_performance import PortfolioWithAllocatedWeights
@@ -12,8 +13,10 @@ from src.performance_metrics.portfolio_volatility import PortfolioVolatility
 logger = logging.getLogger(__name__)
 
 
-def calculate_performance(post_processing_df, data, start_date, end_date, current_dir):
+def calculate_performance(post_processing_df, data, start_date, end_date, current_dir, market_data_context=None):
     """Calculate and append performance_metrics metrics for portfolios based on allocation columns."""
+    if market_data_context is None:
+        market_data_context = MarketDataContext(data)
 
     logger.info(f"started calculating calculate_performance for the month {current_dir}")
     performance_pkl_filepath = current_dir / PklFileConventions.performance_pkl_filename
@@ -35,7 +38,8 @@ def calculate_performance(post_processing_df, data, start_date, end_date, curren
                     remaining_amount_col = col.replace('weight', 'remaining_amount')
                     remaining_amount = row[remaining_amount_col] if remaining_amount_col in row else 0
 
-                    portfolio = PortfolioWithAllocatedWeights(allocation_dict, data, remaining_amount)
+                    portfolio = PortfolioWithAllocatedWeights(allocation_dict, data, remaining_amount,
+                                                              market_data_context=market_data_context)
                     parameters_config = {'start_date': start_date, 'end_date': end_date}
 
                     precalculated_metrics = {
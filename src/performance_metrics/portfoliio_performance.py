@@ -1,8 +1,11 @@
 import pandas as pd
 
+from src.common.market_data_context import MarketDataContext
+
 
 class PortfolioWithAllocatedWeights:
-    def __init__(self, allocation, price_data, remaining_amount=0, total_capital=1_000_000, risk_free_rate=0.02):
+    def __init__(self, allocation, price_data, remaining_amount=0, total_capital=1_000_000, risk_free_rate=0.02,
+                 market_data_context=None):
         """
         Portfolio Class: Stores allocation, price data, and portfolio-related information.
 
@@ -11,6 +14,7 @@ class PortfolioWithAllocatedWeights:
         :param remaining_amount: The remaining unallocated capital.
         :param total_capital: Total capital available for the portfolio.
         :param risk_free_rate: The risk-free rate (default is 2%).
+        :param market_data_context: MarketDataContext of the price data, shared by all the portfolios of the window.
         """
         self.allocation = allocation if isinstance(allocation, dict) else eval(allocation)
         self.price_data = price_data
@@ -18,8 +22,10 @@ class PortfolioWithAllocatedWeights:
         self.total_capital = total_capital
         self.risk_free_rate = risk_free_rate
 
-        # Pre-compute daily returns
-        self.daily_returns = self.price_data.pct_change().dropna()
+        # Daily returns, computed once per window and shared by all the portfolios
+        if market_data_context is None:
+            market_data_context = MarketDataContext(price_data)
+        self.daily_returns = market_data_context.simple_returns
 
     def check_dates(self, start_date, end_date):
         """
@@ -15,7 +15,7 @@ from src.processing_weight.custom_transaction_cost_allocator import CustomTransa
 from src.processing_weight.custom_wighted_floor_allocator import CustomWeightedFloorAllocator
 from src.processing_weight.greedy_portfolio import GreedyPortfolio
 from src.processing_weight.lp_portfolio import LpPortfolio
-from src.common.utils import save_data_to_pickle, load_data_from_pickle
+from src.common.utils import compute_fingerprint, load_data_from_cache, save_data_to_cache
 
 logger = logging.getLogger(__name__)
 
@@ -108,11 +108,12 @@ def run_all_post_processing_weight(results_df: pd.DataFrame,
     """
     logger.info(f"Calculating processing_weight for the month {current_dir}")
     post_processing_weight_pkl_filepath = current_dir / PklFileConventions.post_processing_weight_pkl_filename
-    post_processing = load_data_from_pickle(post_processing_weight_pkl_filepath)
+    post_processing_classes = get_allocation_classes(enabled_methods)
+    fingerprint = compute_fingerprint(results_df, data, sorted(post_processing_classes), budget)
+    post_processing = load_data_from_cache(post_processing_weight_pkl_filepath, fingerprint)
     if post_processing is not None:
         return post_processing
-    post_processing_classes = get_allocation_classes(enabled_methods)
     do_process(budget, current_dir, data, post_processing_classes, results_df)
-    save_data_to_pickle(post_processing_weight_pkl_filepath, results_df)
+    save_data_to_cache(post_processing_weight_pkl_filepath, fingerprint, results_df)
     logger.info("Processing weight completed successfully for the month {}".format(current_dir))
     return results_df
@@ -1,9 +1,13 @@
 from abc import ABC, abstractmethod
 
+from src.common.market_data_context import MarketDataContext
+
 
 class BaseRiskModel(ABC):
-    def __init__(self, data):
+    def __init__(self, data, market_data_context=None):
         self.data = data
+        # Return statistics shared by all the stages of the window
+        self.market_data_context = market_data_context if market_data_context is not None else MarketDataContext(data)
 
     @abstractmethod
     def calculate_risk_matrix(self):
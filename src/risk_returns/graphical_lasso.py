@@ -10,6 +10,6 @@ class GraphicalLassoRiskModel(BaseRiskModel):
     @ExecutionTimeRecorder(module_name=__name__)  # Use __name__ t
     def calculate_risk_matrix(self, alpha=0.01):
         model = GraphicalLasso(alpha=alpha)
-        returns = self.data.pct_change().dropna()
+        returns = self.market_data_context.simple_returns
         model.fit(returns)
         return pd.DataFrame(model.covariance_, index=self.data.columns, columns=self.data.columns)
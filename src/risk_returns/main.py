@@ -7,6 +7,8 @@ import pandas as pd
 from src.common.conventions import PklFileConventions
 from src.common.execution_time_recorder import ExecutionTimeRecorder
 from src.common.hydra_config_loader import load_config
+from src.common.market_data_context import MarketDataContext
+from src.common.utils import compute_fingerprint, load_data_from_cache, save_data_to_cache
 from src.risk_returns.exponential_covariance import ExponentialCovariance
 from src.risk_returns.graphical_lasso import GraphicalLassoRiskModel
 from src.risk_returns.ledoit_wolf_constant_correlation import LedoitWolfConstantCorrelation
@@ -33,26 +35,27 @@ def get_pickle_file_path(risk_type, output_dir: str):
 
 
 # Function to check if covariance matrix pickle file exists
-def check_existing_cov_matrix(risk_type, output_dir):
+def check_existing_cov_matrix(risk_type, output_dir, fingerprint):
     """
-    Check if the covariance matrix for the given risk model already exists as a .pkl file.
+    Check if the covariance matrix for the given risk model already exists as a .pkl file
+    computed from the same inputs (fingerprint).
     """
     pkl_filepath = get_pickle_file_path(risk_type,
                                         output_dir)
-    if os.path.exists(pkl_filepath):
+    cov_matrix = load_data_from_cache(pkl_filepath, fingerprint)
+    if cov_matrix is not None:
         logger.info(f"Loading covariance matrix for {risk_type} from {pkl_filepath}...")
-        return pd.read_pickle(pkl_filepath)  # Load the matrix from pickle file
-    return None  # File doesn't exist
+    return cov_matrix
 
 
 # Function to save covariance matrix to a pickle file
-def save_cov_matrix_to_pkl(cov_matrix, risk_type, output_dir):
+def save_cov_matrix_to_pkl(cov_matrix, risk_type, output_dir, fingerprint):
     """
     Save the covariance matrix as a .pkl file for future use.
     """
     pkl_filepath = get_pickle_file_path(risk_type, output_dir)
     logger.info(f"Saving covariance matrix for {risk_type} to {pkl_filepath}...")
-    pd.DataFrame(cov_matrix).to_pickle(pkl_filepath)
+    save_data_to_cache(pkl_filepath, fingerprint, pd.DataFrame(cov_matrix))
 
 
 # Function to calculate the covariance matrix for each risk model
@@ -80,13 +83,14 @@ def process_risk_models(risk_model_calculators, output_dir, enabled_methods):
     for enabled_method in enabled_methods:
         if enabled_method in risk_model_calculators:
             calculator = risk_model_calculators[enabled_method]
-            # Check if the covariance matrix exists
-            cov_matrix = check_existing_cov_matrix(enabled_method, output_dir)
+            # Check if the covariance matrix exists for the same data
+            fingerprint = compute_fingerprint(calculator.data, enabled_method)
+            cov_matrix = check_existing_cov_matrix(enabled_method, output_dir, fingerprint)
 
             # If the file doesn't exist, calculate the covariance matrix and save it
             if cov_matrix is None:
                 cov_matrix = calculate_cov_matrix(calculator)
-                save_cov_matrix_to_pkl(cov_matrix, enabled_method, output_dir)
+                save_cov_matrix_to_pkl(cov_matrix, enabled_method, output_dir, fingerprint)
 
             # Store the covariance matrix in the dictionary
             covariance_dict[enabled_method] = pd.DataFrame(cov_matrix)
@@ -99,32 +103,34 @@ def process_risk_models(risk_model_calculators, output_dir, enabled_methods):
 
 @ExecutionTimeRecorder(module_name=__name__)  # Use __name__ t
 # Main function that orchestrates everything
-def calculate_all_risk_matrix(data: pd.DataFrame, current_dir: Path, enabled_methods=None):
+def calculate_all_risk_matrix(data: pd.DataFrame, current_dir: Path, enabled_methods=None, market_data_context=None):
     """
     Calls different risk models, calculates the covariance matrices if not already saved,
     and saves them as .pkl files for future use.
     """
     # Ensure the output directory exists
     os.makedirs(current_dir, exist_ok=True)
+    if market_data_context is None:
+        market_data_context = MarketDataContext(data)
 
     # Create a dictionary of risk model types and their corresponding classes
     risk_model_calculators = {
-        'SampleCovariance': SampleCovariance(data),
-        'SemiCovariance': SemiCovariance(data),
-        'ExponentialCovariance': ExponentialCovariance(data),
-        'LedoitWolfShrinkage': LedoitWolfShrinkage(data),
-        'LedoitWolfConstantVariance': LedoitWolfConstantVariance(data),
-        'LedoitWolfSingleFactor': LedoitWolfSingleFactor(data),
-        'LedoitWolfConstantCorrelation': LedoitWolfConstantCorrelation(data),
-        'OracleApproximatingShrinkage': OracleApproximatingShrinkage(data),
-        'GraphicalLasso': GraphicalLassoRiskModel(data),
-        'RandomForestVolatility': RandomForestVolatility(data),
-        'GaussianProcessRiskModel': GaussianProcessRiskModel(data),
-        'SVMVolatility': SVMVolatility(data),
-        'KMeansClustering': KMeansClustering(data),
-        'CopulaRiskModel': CopulaRiskModel(data),
-        'RegimeSwitchingRiskModel': RegimeSwitchingRiskModel(data),
-        # 'AutoencoderRiskModel': AutoencoderRiskModel(data),
+        'SampleCovariance': SampleCovariance(data, market_data_context),
+        'SemiCovariance': SemiCovariance(data, market_data_context),
+        'ExponentialCovariance': ExponentialCovariance(data, market_data_context),
+        'LedoitWolfShrinkage': LedoitWolfShrinkage(data, market_data_context),
+        'LedoitWolfConstantVariance': LedoitWolfConstantVariance(data, market_data_context),
+        'LedoitWolfSingleFactor': LedoitWolfSingleFactor(data, market_data_context),
+        'LedoitWolfConstantCorrelation': LedoitWolfConstantCorrelation(data, market_data_context),
+        'OracleApproximatingShrinkage': OracleApproximatingShrinkage(data, market_data_context),
+        'GraphicalLasso': GraphicalLassoRiskModel(data, market_data_context),
+        'RandomForestVolatility': RandomForestVolatility(data, market_data_context),
+        'GaussianProcessRiskModel': GaussianProcessRiskModel(data, market_data_context),
+        'SVMVolatility': SVMVolatility(data, market_data_context),
+        'KMeansClustering': KMeansClustering(data, market_data_context),
+        'CopulaRiskModel': CopulaRiskModel(data, market_data_context),
+        'RegimeSwitchingRiskModel': RegimeSwitchingRiskModel(data, market_data_context),
+        # 'AutoencoderRiskModel': AutoencoderRiskModel(data, market_data_context),
     }
 
     # Call the process function to loop through the risk models and calculate/save covariance matrices
@@ -34,8 +34,8 @@ from src.risk_returns.base_risk_model import BaseRiskModel
 class RandomForestVolatility(BaseRiskModel):
     @ExecutionTimeRecorder(module_name=__name__)  # Use __name__ t
     def calculate_risk_matrix(self):
-        # Compute percentage change in data (returns) and remove NaN values
-        X = self.data.pct_change().dropna()
+        # Daily returns (percentage change without NaN values) shared by the window
+        X = self.market_data_context.simple_returns
 
         # Calculate the standard deviation of each row (volatility)
         y = X.std(axis=1)
@@ -71,8 +71,8 @@ from sklearn.gaussian_process.kernels import RBF
 
 class GaussianProcessRiskModel(BaseRiskModel):
     def calculate_risk_matrix(self):
-        # Compute percentage change in data (returns) and remove NaN values
-        X = self.data.pct_change().dropna()
+        # Daily returns (percentage change without NaN values) shared by the window
+        X = self.market_data_context.simple_returns
 
         # Calculate the standard deviation of each row (volatility)
         y = X.std(axis=1)
@@ -107,8 +107,8 @@ from pgmpy.estimators import MaximumLikelihoodEstimator
 # Support Vector Machines (SVM) for Volatility Prediction
 class SVMVolatility(BaseRiskModel):
     def calculate_risk_matrix(self):
-        # Compute percentage change in data (returns) and remove NaN values
-        X = self.data.pct_change().dropna()
+        # Daily returns (percentage change without NaN values) shared by the window
+        X = self.market_data_context.simple_returns
 
         # Compute the volatility (standard deviation) for each asset over time (for each column)
         y = X.std(axis=0)  # Axis 0 for columns (assets)
@@ -132,8 +132,8 @@ class SVMVolatility(BaseRiskModel):
 # Clustering Techniques (e.g., K-Means)
 class KMeansClustering(BaseRiskModel):
     def calculate_risk_matrix(self):
-        # Compute percentage change in data (returns) and remove NaN values
-        returns = self.data.pct_change().dropna()
+        # Daily returns (percentage change without NaN values) shared by the window
+        returns = self.market_data_context.simple_returns
 
         # Apply KMeans clustering to the returns data
         kmeans = KMeans(n_clusters=2, random_state=42)
@@ -142,11 +142,8 @@ class KMeansClustering(BaseRiskModel):
         # Get the labels for each cluster (though we don't need them for covariance calculation here)
         clusters = kmeans.labels_
 
-        # Calculate the covariance matrix of the returns
-        covariance_matrix = np.cov(returns.T)
-
-        # Convert the covariance matrix to a pandas DataFrame with asset names as index and columns
-        return pd.DataFrame(covariance_matrix, index=self.data.columns, columns=self.data.columns)
+        # Covariance matrix of the returns, with asset names as index and columns
+        return self.market_data_context.sample_covariance.copy()
 
 
 # GARCH Model
@@ -156,8 +153,8 @@ class KMeansClustering(BaseRiskModel):
 
 class CopulaRiskModel(BaseRiskModel):
     def calculate_risk_matrix(self):
-        # Compute percentage change in data (returns) and remove NaN values
-        returns = self.data.pct_change().dropna()
+        # Daily returns (percentage change without NaN values) shared by the window
+        returns = self.market_data_context.simple_returns
 
         # Initialize and fit the Gaussian Mixture Model
         copula_model = GaussianMixture(n_components=2)
@@ -182,8 +179,8 @@ import pandas as pd
 
 class RegimeSwitchingRiskModel(BaseRiskModel):
     def calculate_risk_matrix(self):
-        # Compute percentage change in data (returns) and remove NaN values
-        returns = self.data.pct_change().dropna()
+        # Daily returns (percentage change without NaN values) shared by the window
+        returns = self.market_data_context.simple_returns
 
         # Initialize and fit the Gaussian Mixture Model
         model = GaussianMixture(n_components=2)
@@ -202,7 +199,7 @@ class RegimeSwitchingRiskModel(BaseRiskModel):
 # TO DO - NOT IMPLEMENTED
 class BayesianNetworkRiskModel(BaseRiskModel):
     def calculate_risk_matrix(self):
-        returns = self.data.pct_change().dropna()
+        returns = self.market_data_context.simple_returns
         model = pgm.BayesianModel()
         model.fit(returns, estimator=MaximumLikelihoodEstimator)
         # Returns adjacency matrix of Bayesian Network, which can be converted into covariance estimates
@@ -211,7 +208,7 @@ class BayesianNetworkRiskModel(BaseRiskModel):
 
 class GARCHRiskModel(BaseRiskModel):
     def calculate_risk_matrix(self):
-        returns = self.data.pct_change().dropna()
+        returns = self.market_data_context.simple_returns
         cov_matrix = []
         for ticker in returns.columns:
             model = arch_model(returns[ticker], vol='Garch', p=1, q=1)
@@ -223,7 +220,7 @@ class GARCHRiskModel(BaseRiskModel):
 # Neural Networks for Volatility Prediction
 class NeuralNetworkVolatility(BaseRiskModel):
     def calculate_risk_matrix(self):
-        X = self.data.pct_change().dropna()
+        X = self.market_data_context.simple_returns
         y = X.std(axis=1)
         nn_model = MLPRegressor(hidden_layer_sizes=(64, 32), max_iter=500, random_state=42)
         nn_model.fit(X, y)
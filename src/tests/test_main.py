@@ -0,0 +1,67 @@
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pandas as pd
+
+from src.common.execution_time_recorder import ExecutionTimeRecorder
+from src.main import _run_date_range_in_worker, run_optimization_pipeline
+
+
+def fake_window(start_date, end_date, **kwargs):
+    """Performance of a window, the earlier windows finish last and the April window fails."""
+    if start_date.month == 4:
+        raise ValueError("no data")
+    time.sleep(0.01 * (12 - start_date.month))
+    return pd.DataFrame({"Start": [start_date], "End": [end_date]})
+
+
+class TestRunOptimizationPipeline(unittest.TestCase):
+
+    def check_results(self, pipeline_results):
+        date_ranges = list(pipeline_results)
+        self.assertEqual(len(date_ranges), 12)
+        # Date range order, whatever the order the windows finished in
+        self.assertEqual(date_ranges, sorted(date_ranges))
+        for (start_date, end_date), performance_df in pipeline_results.items():
+            if start_date.month == 4:
+                # The failed window is recorded, the others still run
+                self.assertIn("failed with error: no data", performance_df)
+            else:
+                self.assertEqual(performance_df["Start"].iloc[0], start_date)
+
+    def test_windows_are_collected_in_order_and_isolated(self):
+        with patch("src.main.run_optimization_for_date_range", side_effect=fake_window):
+            self.check_results(run_optimization_pipeline(years=[2023], frequency="monthly", multi_period=False))
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                self.check_results(run_optimization_pipeline(years=[2023], frequency="monthly", executor=executor,
+                                                             multi_period=False))
+
+    def test_owned_pool_spawns_its_workers(self):
+        pool_arguments = {}
+
+        def make_pool(max_workers, mp_context):
+            pool_arguments.update(max_workers=max_workers, start_method=mp_context.get_start_method())
+            return ThreadPoolExecutor(max_workers=max_workers)
+
+        with patch("src.main.run_optimization_for_date_range", side_effect=fake_window), \
+                patch("src.main.ProcessPoolExecutor", side_effect=make_pool):
+            self.check_results(run_optimization_pipeline(years=[2023], frequency="monthly", max_workers=3,
+                                                         multi_period=False))
+        self.assertEqual(pool_arguments, {"max_workers": 3, "start_method": "spawn"})
+
+    def test_worker_hands_back_its_execution_times(self):
+        @ExecutionTimeRecorder(module_name=__name__)
+        def run_window(start_date, end_date, **kwargs):
+            return fake_window(start_date, end_date)
+
+        with patch("src.main.run_optimization_for_date_range", side_effect=run_window):
+            performance_df, execution_times_df = _run_date_range_in_worker(pd.Timestamp("2023-01-01"),
+                                                                           pd.Timestamp("2023-01-31"))
+        self.assertEqual(len(performance_df), 1)
+        self.assertEqual(execution_times_df["Function"].tolist(), ["run_window"])
+
+
+if __name__ == '__main__':
+    unittest.main()